@@ -1,11 +1,20 @@
-import json
-from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
-from app.utils.helpers import DateTimeEncoder
-from typing import List
-from datetime import datetime, timezone
-from .models import CarData, Driver, Interval, Lap, LeaderboardDriver, Location, Meeting, Pit, Position, RaceControl, Session, Stint, TeamRadio, Weather  # Import our Pydantic model
-from ..utils.helpers import safe_to_float, time_string_to_seconds
+import asyncio
+import functools
+import inspect
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import TypeAdapter
+from typing import List, Optional
+from datetime import datetime
+from .models import CarData, Driver, Interval, Lap, LapPace, LeaderboardDriver, Location, Meeting, Pit, Position, RaceControl, SectorBest, Session, Stint, StintDegradation, TeamRadio, TheoreticalBest, Weather  # Import our Pydantic model
+from ..utils.helpers import json_dumps, json_loads, parse_date_filters
+from ..ws.broadcaster import PROTOCOL_DELTA, PROTOCOL_LEGACY
+from ..ws.subscriptions import Subscription
+from ..utils.wire import (
+    ENCODING_JSON, ENCODING_MSGPACK, CAR_DATA_COLUMNS, LOCATION_COLUMNS,
+    msgpack_dumps, negotiate_accept, negotiate_websocket, pack_columns,
+)
+from ..state.telemetry_store import epoch_to_iso, iso_to_epoch
 
 # This is a placeholder for our StateManager dependency
 # We will "inject" the real one when we run the app
@@ -14,8 +23,80 @@ def get_state_manager():
     # dependency injection system. For now, this is a placeholder.
     pass 
 
+# Placeholder for the ReplayEngine; only overridden when running in REPLAY mode
+def get_replay_engine():
+    return None
+
+# Placeholder for the IngestPipeline; overridden in main.py when it is enabled
+def get_ingest_pipeline():
+    return None
+
+# Placeholder for the SamplingProfiler; overridden in main.py when profiling is enabled (PROFILER=on)
+def get_profiler():
+    return None
+
 app = FastAPI()
 
+def cached_response(*feed_names, columns=None):
+    """
+    Serves an endpoint from the state manager's response cache.
+    The endpoint's result is validated against its `response_model`, serialized
+    to JSON bytes and stored together with the versions of `feed_names`. It is
+    only rebuilt when one of those feeds changed. Requests whose
+    `If-None-Match` matches the cached ETag get an empty 304.
+
+    Clients sending `Accept: application/msgpack` get msgpack instead (when it
+    is installed). Telemetry endpoints pass `columns`, so their samples are
+    packed into fixed-width numeric columns in that format.
+    """
+    def decorator(handler):
+        signature = inspect.signature(handler)
+        handler_wants_request = "request" in signature.parameters
+        adapters = {}
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            request = kwargs["request"] if handler_wants_request else kwargs.pop("request")
+            state_manager = kwargs["state_manager"]
+
+            encoding = negotiate_accept(request.headers.get("accept"))
+            cache_key = (request.url.path, str(request.query_params), encoding)
+            version_key = state_manager.get_versions(feed_names)
+            entry = state_manager.response_cache.get(cache_key, version_key)
+
+            if entry is None:
+                result = await handler(*args, **kwargs)
+                if isinstance(result, Response):
+                    return result
+                # Look the route's response_model up once, on first use
+                if "adapter" not in adapters:
+                    route = request.scope.get("route")
+                    adapters["adapter"] = TypeAdapter(route.response_model) if route and route.response_model else None
+                adapter = adapters["adapter"]
+                if encoding == ENCODING_MSGPACK:
+                    data = adapter.dump_python(adapter.validate_python(result), mode="json") if adapter else result
+                    body = msgpack_dumps(pack_columns(data, columns) if columns else data)
+                else:
+                    body = adapter.dump_json(adapter.validate_python(result)) if adapter else json_dumps(result).encode()
+                entry = state_manager.response_cache.put(cache_key, version_key, body)
+
+            headers = {"ETag": entry.etag, "Vary": "Accept"}
+            if request.headers.get("if-none-match") == entry.etag:
+                return Response(status_code=304, headers=headers)
+            media_type = "application/msgpack" if encoding == ENCODING_MSGPACK else "application/json"
+            return Response(content=entry.body, media_type=media_type, headers=headers)
+
+        # Expose `request` to FastAPI's dependency injection even if the handler doesn't take it
+        if not handler_wants_request:
+            request_parameter = inspect.Parameter("request", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=Request)
+            wrapper.__signature__ = signature.replace(parameters=[request_parameter, *signature.parameters.values()])
+        return wrapper
+    return decorator
+
+# Telemetry range queries return at most this many samples per driver
+DEFAULT_TELEMETRY_POINTS = 1000
+MAX_TELEMETRY_POINTS = 10000
+
 @app.get("/ping")
 @app.head("/ping")
 async def ping():
@@ -24,6 +105,7 @@ async def ping():
     return JSONResponse(content={"status": "ok"})
 
 @app.get("/api/drivers", response_model=List[Driver])
+@cached_response("DriverList")
 async def get_drivers(state_manager = Depends(get_state_manager)):
     """
     Gets the driver list from our internal state and transforms
@@ -42,40 +124,78 @@ async def get_drivers(state_manager = Depends(get_state_manager)):
 
     return drivers_transformed
 
+def _telemetry_window(request, max_points):
+    """
+    Turns the `date>=`/`date<=`/`max_points` query parameters into the
+    (start_time, end_time, max_points) arguments of a telemetry query.
+    Returns None when none of them were given, i.e. only the latest sample is wanted.
+    """
+    lower, upper = parse_date_filters(request.query_params)
+    if lower is None and upper is None and max_points is None:
+        return None
+
+    bounds = []
+    for raw_date in (lower, upper):
+        if raw_date is None:
+            bounds.append(None)
+            continue
+        timestamp = iso_to_epoch(raw_date)
+        if timestamp is None:
+            raise HTTPException(status_code=400, detail=f"Invalid date filter: {raw_date}")
+        bounds.append(timestamp)
+
+    return bounds[0], bounds[1], max_points or DEFAULT_TELEMETRY_POINTS
+
+def _flatten_samples(samples_by_driver):
+    """Yields (driver_number, sample) ordered by driver, then by time."""
+    for driver_number in sorted(samples_by_driver):
+        for sample in samples_by_driver[driver_number]:
+            yield driver_number, sample
+
 @app.get("/api/cardata", response_model=List[CarData])
-async def get_cardata(state_manager=Depends(get_state_manager)):
+@cached_response("CarData", "SessionInfo", columns=CAR_DATA_COLUMNS)
+async def get_cardata(
+    request: Request,
+    driver_number: Optional[int] = None,
+    max_points: Optional[int] = Query(default=None, ge=1, le=MAX_TELEMETRY_POINTS),
+    state_manager=Depends(get_state_manager),
+):
     """
-    Gets the latest car telemetry data, combines it with session info,
+    Gets car telemetry data, combines it with session info,
     and transforms it into the structure the frontend expects.
+    Without `date>=`/`date<=`/`max_points` only the latest sample per car is returned.
+    With them, every sample in the window is returned, downsampled (LTTB on speed)
+    to at most `max_points` per driver.
     """
-    # 1. Get the data feeds we need from the state
-    car_data_feed = state_manager.state.get("CarData", {})
+    # 1. Get the session info from the state
     session_info = state_manager.state.get("SessionInfo", {})
 
     # 2. Extract the session and meeting keys once
     session_key = session_info.get("Key")
     meeting_key = session_info.get("Meeting", {}).get("Key")
     
-    # 3. Extract the most recent telemetry snapshot
-    if not car_data_feed or not car_data_feed.get("Entries"):
-        return []
-
-    latest_snapshot = car_data_feed["Entries"][-1]
+    # 3. Read either the newest sample of each car (O(1) per car) or a time window
+    window = _telemetry_window(request, max_points)
+    if window:
+        samples_by_driver = state_manager.telemetry.query_car_data(driver_number, *window)
+    else:
+        samples_by_driver = {
+            driver: [sample] for driver, sample in state_manager.telemetry.latest_car_data().items()
+            if driver_number is None or driver == driver_number
+        }
     
     # 4. Loop through each car and transform the data
     cardata_transformed = []
-    for driver_number, telemetry in latest_snapshot["Cars"].items():
-        channels = telemetry.get("Channels", {})
-        
+    for driver_number, sample in _flatten_samples(samples_by_driver):
         transformed_entry = CarData(
-            date=latest_snapshot["Utc"],
-            driver_number=int(driver_number),
-            rpm=channels.get("0", 0),
-            speed=channels.get("2", 0),
-            n_gear=channels.get("3", 0),
-            throttle=channels.get("4", 0),
-            brake=100 if channels.get("5", 0) == 1 else 0,
-            drs=channels.get("45", 0),
+            date=epoch_to_iso(sample["timestamp"]),
+            driver_number=driver_number,
+            rpm=sample["rpm"],
+            speed=sample["speed"],
+            n_gear=sample["gear"],
+            throttle=sample["throttle"],
+            brake=100 if sample["brake"] == 1 else 0,
+            drs=sample["drs"],
             # --- ADD THE NEW KEYS TO THE RESPONSE ---
             session_key=session_key,
             meeting_key=meeting_key
@@ -85,75 +205,140 @@ async def get_cardata(state_manager=Depends(get_state_manager)):
     return cardata_transformed
 
 @app.get("/api/intervals", response_model=List[Interval])
+@cached_response("TimingData", "SessionInfo")
 async def get_intervals(state_manager=Depends(get_state_manager)):
     """
     Gets the latest interval and gap data for all drivers.
     """
     # 1. Get the data feeds we need from the state
-    timing_data = state_manager.state.get("TimingData", {})
     session_info = state_manager.state.get("SessionInfo", {})
 
     # 2. Extract session and meeting keys
     session_key = session_info.get("Key")
     meeting_key = session_info.get("Meeting", {}).get("Key")
     
-    # 3. Loop through each driver in TimingData and transform
+    # 3. Transform each driver's timing (gaps are parsed to floats at ingest).
+    # The date is that of the last TimingData message, so the cached body stays true.
+    date = state_manager.get_feed_time("TimingData")
     intervals_transformed = []
-    if "Lines" in timing_data:
-        for driver_number, driver_data in timing_data["Lines"].items():
-            
-            # Use our helper to safely convert string gaps to floats
-            gap_to_leader_str = driver_data.get("GapToLeader")
-            interval_str = driver_data.get("IntervalToPositionAhead", {}).get("Value")
-
-            transformed_entry = Interval(
-                date=datetime.now().isoformat(), # Use current time for the 'live' interval
-                driver_number=int(driver_number),
-                gap_to_leader=safe_to_float(gap_to_leader_str),
-                interval=safe_to_float(interval_str),
-                meeting_key=meeting_key,
-                session_key=session_key
-            )
-            intervals_transformed.append(transformed_entry)
+    for driver in state_manager.driver_timing.values():
+        transformed_entry = Interval(
+            date=date,
+            driver_number=driver.driver_number,
+            gap_to_leader=driver.gap_to_leader,
+            interval=driver.interval,
+            meeting_key=meeting_key,
+            session_key=session_key
+        )
+        intervals_transformed.append(transformed_entry)
 
     return intervals_transformed
 
 @app.get("/api/laps", response_model=List[Lap])
-async def get_laps(state_manager=Depends(get_state_manager)):
+@cached_response("LapHistory")
+async def get_laps(
+    driver_number: Optional[int] = None,
+    lap_number: Optional[int] = None,
+    state_manager=Depends(get_state_manager),
+):
     """
-    Returns the historical list of all completed laps.
+    Returns the historical list of completed laps, optionally filtered by
+    driver and/or lap number. Filtered lookups go through the lap index.
     """
     # This is simple because our processor now does the hard work of building the history
+    lap_index = state_manager.lap_index
+    if driver_number is not None and lap_number is not None:
+        lap = lap_index.get_lap(driver_number, lap_number)
+        return [lap] if lap else []
+    if driver_number is not None:
+        return lap_index.get_driver_laps(driver_number)
+
     lap_history = state_manager.state.get("LapHistory", [])
+    if lap_number is not None:
+        return [lap for lap in lap_history if lap.get("lap_number") == lap_number]
     return lap_history
 
+@app.get("/api/laps/fastest", response_model=List[Lap])
+@cached_response("LapHistory")
+async def get_fastest_lap(driver_number: Optional[int] = None, state_manager=Depends(get_state_manager)):
+    """
+    Returns the fastest lap of the session, or of one driver if `driver_number` is given.
+    """
+    lap = state_manager.lap_index.get_fastest_lap(driver_number)
+    return [lap] if lap else []
+
+# --- Analytics ---
+# Computed from the lap columns kept by state_manager.lap_analytics, which are
+# updated as each lap is recorded; responses are cached until the next lap.
+
+@app.get("/api/analytics/pace", response_model=List[LapPace])
+@cached_response("LapHistory")
+async def get_pace(
+    driver_number: Optional[int] = None,
+    window: int = Query(5, ge=1, le=50),
+    state_manager=Depends(get_state_manager),
+):
+    """Every lap with the driver's rolling average pace over the last `window` laps (pit-out laps excluded)."""
+    return state_manager.lap_analytics.get_pace(window, driver_number)
+
+@app.get("/api/analytics/degradation", response_model=List[StintDegradation])
+@cached_response("LapHistory", "TimingAppData")
+async def get_degradation(driver_number: Optional[int] = None, state_manager=Depends(get_state_manager)):
+    """Tyre degradation per stint: the least-squares lap time trend in seconds per lap."""
+    return state_manager.lap_analytics.get_degradation(driver_number)
+
+@app.get("/api/analytics/sectors", response_model=List[SectorBest])
+@cached_response("LapHistory")
+async def get_sector_bests(driver_number: Optional[int] = None, state_manager=Depends(get_state_manager)):
+    """Personal best sector times, flagged where they are the overall best."""
+    return state_manager.lap_analytics.get_sector_bests(driver_number)
+
+@app.get("/api/analytics/theoretical-best", response_model=List[TheoreticalBest])
+@cached_response("LapHistory")
+async def get_theoretical_best(driver_number: Optional[int] = None, state_manager=Depends(get_state_manager)):
+    """Each driver's best lap against the sum of their best sectors, fastest theoretical lap first."""
+    return state_manager.lap_analytics.get_theoretical_best(driver_number)
+
 @app.get("/api/location", response_model=List[Location])
-async def get_locations(state_manager=Depends(get_state_manager)):
+@cached_response("Position", "SessionInfo", columns=LOCATION_COLUMNS)
+async def get_locations(
+    request: Request,
+    driver_number: Optional[int] = None,
+    max_points: Optional[int] = Query(default=None, ge=1, le=MAX_TELEMETRY_POINTS),
+    state_manager=Depends(get_state_manager),
+):
     """
-    Gets the latest location data for all drivers.
+    Gets location data for all drivers.
+    Without `date>=`/`date<=`/`max_points` only the latest position per car is returned.
+    With them, every position in the window is returned, thinned out evenly
+    to at most `max_points` per driver.
     """
-    # 1. Get the data from the state
-    position_data = state_manager.state.get("Position", {})
+    # 1. Get the session info from the state
     session_info = state_manager.state.get("SessionInfo", {})
 
     # 2. Get session and meeting keys
     session_key = session_info.get("Key")
     meeting_key = session_info.get("Meeting", {}).get("Key")
 
-    # 3. Get the most recent position snapshot
-    if not position_data or not position_data.get("Position"):
-        return []
-    latest_snapshot = position_data["Position"][-1]
+    # 3. Read either the newest position of each car or a time window
+    window = _telemetry_window(request, max_points)
+    if window:
+        samples_by_driver = state_manager.telemetry.query_positions(driver_number, *window)
+    else:
+        samples_by_driver = {
+            driver: [sample] for driver, sample in state_manager.telemetry.latest_positions().items()
+            if driver_number is None or driver == driver_number
+        }
     
     # 4. Loop through cars and transform data
     locations_transformed = []
-    for driver_number, driver_pos_data in latest_snapshot["Entries"].items():
+    for driver_number, sample in _flatten_samples(samples_by_driver):
         transformed_entry = Location(
-            date=latest_snapshot["Timestamp"],
-            driver_number=int(driver_number),
-            x=driver_pos_data["X"],
-            y=driver_pos_data["Y"],
-            z=driver_pos_data["Z"],
+            date=epoch_to_iso(sample["timestamp"]),
+            driver_number=driver_number,
+            x=sample["x"],
+            y=sample["y"],
+            z=sample["z"],
             session_key=session_key,
             meeting_key=meeting_key
         )
@@ -162,6 +347,7 @@ async def get_locations(state_manager=Depends(get_state_manager)):
     return locations_transformed
 
 @app.get("/api/meetings", response_model=List[Meeting])
+@cached_response("SessionInfo")
 async def get_meeting(state_manager=Depends(get_state_manager)):
     """
     Gets the current meeting info from the SessionInfo state
@@ -195,6 +381,7 @@ async def get_meeting(state_manager=Depends(get_state_manager)):
     return [transformed_meeting]
 
 @app.get("/api/pit", response_model=List[Pit])
+@cached_response("PitHistory")
 async def get_pit_stops(state_manager=Depends(get_state_manager)):
     """
     Returns the historical list of all completed pit stops.
@@ -202,34 +389,34 @@ async def get_pit_stops(state_manager=Depends(get_state_manager)):
     return state_manager.state.get("PitHistory", [])
 
 @app.get("/api/position", response_model=List[Position])
+@cached_response("TimingData", "SessionInfo")
 async def get_positions(state_manager=Depends(get_state_manager)):
     """
     Gets the current race position for all drivers.
     """
-    timing_data = state_manager.state.get("TimingData", {})
     session_info = state_manager.state.get("SessionInfo", {})
 
     session_key = session_info.get("Key")
     meeting_key = session_info.get("Meeting", {}).get("Key")
 
+    date = state_manager.get_feed_time("TimingData")
     positions_transformed = []
-    if "Lines" in timing_data:
-        for driver_number, driver_data in timing_data["Lines"].items():
-            current_position = driver_data.get("Position")
-            if not current_position: continue
-
-            transformed_entry = Position(
-                date=datetime.now(timezone.utc).isoformat(),
-                driver_number=int(driver_number),
-                position=int(current_position),
-                meeting_key=meeting_key,
-                session_key=session_key
-            )
-            positions_transformed.append(transformed_entry)
+    for driver in state_manager.driver_timing.values():
+        if not driver.position: continue
+
+        transformed_entry = Position(
+            date=date,
+            driver_number=driver.driver_number,
+            position=driver.position,
+            meeting_key=meeting_key,
+            session_key=session_key
+        )
+        positions_transformed.append(transformed_entry)
             
     return sorted(positions_transformed, key=lambda p: p.position)
 
 @app.get("/api/racecontrol", response_model=List[RaceControl])
+@cached_response("RaceControlMessages", "SessionInfo")
 async def get_race_control(state_manager=Depends(get_state_manager)):
     """Returns the list of all race control messages."""
     messages = state_manager.state.get("RaceControlMessages", [])
@@ -250,6 +437,7 @@ async def get_race_control(state_manager=Depends(get_state_manager)):
     return transformed_messages
 
 @app.get("/api/sessions", response_model=List[Session])
+@cached_response("SessionInfo")
 async def get_sessions(state_manager=Depends(get_state_manager)):
     """Returns the current session info."""
     session_info = state_manager.state.get("SessionInfo", {})
@@ -279,8 +467,20 @@ async def get_sessions(state_manager=Depends(get_state_manager)):
     )
     return [transformed_session]
 
+@app.get("/api/sessions/{session_key}/state")
+async def get_session_state(session_key: int, state_manager=Depends(get_state_manager)):
+    """
+    Returns the final state of a closed session (e.g. qualifying, once the race
+    has started), read back from SESSION_ARCHIVE_DIR if it was spilled to disk.
+    """
+    state = await asyncio.to_thread(state_manager.retention.get_session_state, session_key)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"No closed session with key {session_key}")
+    return Response(json_dumps(state), media_type="application/json")
+
 # There should be another one called Stints and this is will be done later
 @app.get("/api/stints", response_model=List[Stint])
+@cached_response("TimingAppData", "SessionInfo")
 async def get_stints(state_manager=Depends(get_state_manager)):
     """
     Gets the list of all tyre stints for all drivers.
@@ -323,6 +523,7 @@ async def get_stints(state_manager=Depends(get_state_manager)):
     return stints_transformed
 
 @app.get("/api/teamradio", response_model=List[TeamRadio])
+@cached_response("TeamRadio", "SessionInfo")
 async def get_team_radio(state_manager=Depends(get_state_manager)):
     """Returns the list of all captured team radio messages."""
     radio_captures = state_manager.state.get("TeamRadio", [])
@@ -353,6 +554,7 @@ async def get_team_radio(state_manager=Depends(get_state_manager)):
     return transformed_radios
 
 @app.get("/api/weather", response_model=List[Weather])
+@cached_response("WeatherData", "SessionInfo")
 async def get_weather(state_manager=Depends(get_state_manager)):
     """Returns the latest weather data."""
     weather_data = state_manager.state.get("WeatherData", {})
@@ -363,98 +565,199 @@ async def get_weather(state_manager=Depends(get_state_manager)):
     # Add the missing keys to the weather data before validating
     weather_data["session_key"] = session_info.get("Key")
     weather_data["meeting_key"] = session_info.get("Meeting", {}).get("Key")
-    weather_data["date"] = datetime.now(timezone.utc).isoformat()
+    weather_data["date"] = state_manager.get_feed_time("WeatherData")
     
     transformed_weather = Weather.model_validate(weather_data)
     
     return [transformed_weather]
 
 @app.get("/api/leaderboard", response_model=List[LeaderboardDriver])
+@cached_response("Leaderboard")
 async def get_leaderboard(state_manager=Depends(get_state_manager)):
     """
-    Combines data from multiple feeds to construct a full leaderboard object.
-    This is the final, corrected version.
+    Returns the materialized leaderboard. The processor keeps it up to date
+    row by row as TimingData, TimingAppData, DriverList and new laps arrive,
+    so nothing is rejoined or re-sorted here.
     """
-    timing_data = state_manager.state.get("TimingData", {}).get("Lines", {})
-    app_data = state_manager.state.get("TimingAppData", {}).get("Lines", {})
-    driver_list = state_manager.state.get("DriverList", {})
-    lap_history = state_manager.state.get("LapHistory", [])
+    return state_manager.leaderboard.get_rows()
+
+def _require_replay_engine(replay_engine):
+    if replay_engine is None:
+        raise HTTPException(status_code=404, detail="Not running in REPLAY mode")
+    return replay_engine
+
+@app.get("/api/replay")
+async def get_replay_status(replay_engine=Depends(get_replay_engine)):
+    """Returns the replay position, speed and the laps available for seeking."""
+    return _require_replay_engine(replay_engine).get_status()
+
+@app.post("/api/replay/pause")
+async def pause_replay(replay_engine=Depends(get_replay_engine)):
+    _require_replay_engine(replay_engine).pause()
+    return replay_engine.get_status()
+
+@app.post("/api/replay/resume")
+async def resume_replay(replay_engine=Depends(get_replay_engine)):
+    _require_replay_engine(replay_engine).resume()
+    return replay_engine.get_status()
+
+@app.post("/api/replay/speed")
+async def set_replay_speed(value: float, replay_engine=Depends(get_replay_engine)):
+    """Changes the replay speed. 1 is real time; 0 replays as fast as possible."""
+    _require_replay_engine(replay_engine).set_speed(value)
+    return replay_engine.get_status()
+
+@app.post("/api/replay/seek")
+async def seek_replay(
+    date: Optional[str] = None,
+    lap: Optional[int] = None,
+    replay_engine=Depends(get_replay_engine),
+):
+    """Jumps to a point in time (`date`, ISO 8601) or to the start of a `lap`."""
+    _require_replay_engine(replay_engine)
+    if lap is not None:
+        try:
+            replay_engine.seek_to_lap(lap)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif date is not None:
+        timestamp = iso_to_epoch(date)
+        if timestamp is None:
+            raise HTTPException(status_code=400, detail=f"Invalid date: {date}")
+        replay_engine.seek_to_time(timestamp)
+    else:
+        raise HTTPException(status_code=400, detail="Provide either 'date' or 'lap'")
+    return replay_engine.get_status()
+
+@app.get("/api/ws/stats")
+async def get_websocket_stats(state_manager=Depends(get_state_manager)):
+    """
+    Returns fan-out counters for every connected WebSocket client:
+    queue depth, dropped messages and send latency.
+    """
+    return state_manager.get_client_stats()
 
-    if not timing_data or not driver_list:
-        return []
+@app.get("/metrics")
+async def get_metrics(state_manager=Depends(get_state_manager)):
+    """
+    Per-stage latency histograms (receive, decode, merge, derive, serialize,
+    send) and glass-to-glass latency by feed, in the Prometheus text format.
+    """
+    return PlainTextResponse(state_manager.metrics.render(), media_type="text/plain; version=0.0.4")
 
-    leaderboard_entries = []
-    for driver_number_str, driver_timing in timing_data.items():
-        driver_info = driver_list.get(driver_number_str, {})
-        driver_app_data = app_data.get(driver_number_str, {})
-        driver_number = int(driver_number_str)
+@app.get("/api/memory")
+async def get_memory(state_manager=Depends(get_state_manager)):
+    """
+    Reports memory use: process RSS, the size of every feed, telemetry
+    buffers, caches, and the retention policy with its closed sessions.
+    """
+    return state_manager.get_memory_stats()
 
-        # 1. Get Last Lap Time from History
-        last_lap_for_driver = next((lap for lap in reversed(lap_history) if lap.get("driver_number") == driver_number), None)
-        last_lap_time_val = last_lap_for_driver.get("lap_duration") if last_lap_for_driver else None
-        
-        # 2. Get Interval and set to null for the leader
-        interval_val = driver_timing.get("IntervalToPositionAhead", {}).get("Value")
-        if driver_timing.get("Position") == "1":
-            interval_val = None # This ensures the leader has no interval
-
-        # 3. Get Tyre and Sector data
-        current_tyre = None
-        stints = driver_app_data.get("Stints")
-        if isinstance(stints, list) and stints:
-            current_tyre = stints[-1].get("Compound")
-        elif isinstance(stints, dict) and stints:
-            last_stint_key = sorted(stints.keys(), key=int)[-1]
-            current_tyre = stints[last_stint_key].get("Compound")
-
-        sector_times = [None, None, None]
-        sectors = driver_timing.get("Sectors", {})
-        if isinstance(sectors, dict):
-            sector_times[0] = time_string_to_seconds(sectors.get("0", {}).get("Value"))
-            sector_times[1] = time_string_to_seconds(sectors.get("1", {}).get("Value"))
-            sector_times[2] = time_string_to_seconds(sectors.get("2", {}).get("Value"))
-        elif isinstance(sectors, list):
-            if len(sectors) > 0: sector_times[0] = time_string_to_seconds(sectors[0].get("Value"))
-            if len(sectors) > 1: sector_times[1] = time_string_to_seconds(sectors[1].get("Value"))
-            if len(sectors) > 2: sector_times[2] = time_string_to_seconds(sectors[2].get("Value"))
-
-        # 4. Assemble the final object
-        entry = LeaderboardDriver(
-            position=int(driver_timing.get("Position", 99)),
-            name=driver_info.get("FullName", "Unknown"),
-            shortName=driver_info.get("Tla", "N/A"),
-            driverNumber=driver_number,
-            team=driver_info.get("TeamName", "N/A"),
-            teamColor=driver_info.get("TeamColour"),
-            headshotUrl=driver_info.get("HeadshotUrl"),
-            lastLapTime=last_lap_time_val,
-            gapToLeader=driver_timing.get("GapToLeader"),
-            interval=interval_val,
-            tyre=current_tyre,
-            sectorTimes=sector_times,
+@app.get("/api/pipeline/stats")
+async def get_pipeline_stats(pipeline=Depends(get_ingest_pipeline)):
+    """
+    Returns queue depth, wait/processing latency and drop counters for each
+    stage of the ingest pipeline (reader -> process -> publish).
+    """
+    if pipeline is None:
+        raise HTTPException(status_code=404, detail="The ingest pipeline is not enabled")
+    return pipeline.get_stats()
+
+def _require_profiler(profiler):
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    return profiler
+
+@app.post("/api/admin/profile")
+async def record_profile(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    all_threads: bool = False,
+    include_idle: bool = False,
+    profiler=Depends(get_profiler),
+):
+    """
+    Samples the event loop (ingest, state merges, API handlers, WebSocket
+    senders) for `seconds` and returns the stacks. `format=collapsed` is the
+    flamegraph input format (`flamegraph.pl`, speedscope); `json` adds the
+    busiest functions by inclusive samples. `all_threads` also samples the
+    decode pool and other threads. Time waiting for I/O is left out unless
+    `include_idle`. With API_WORKERS, this profiles the process it reaches.
+    """
+    try:
+        profile = await _require_profiler(profiler).profile(
+            seconds, interval=interval_ms / 1000, all_threads=all_threads, include_idle=include_idle
         )
-        leaderboard_entries.append(entry)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "json":
+        return profile.to_dict()
+    return PlainTextResponse(profile.collapsed())
 
-    leaderboard_entries.sort(key=lambda d: d.position)
-    return leaderboard_entries
+@app.get("/api/admin/profile")
+async def get_profiler_status(profiler=Depends(get_profiler)):
+    """Whether a profile is being recorded, and a summary of the last one."""
+    return _require_profiler(profiler).get_stats()
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket, state_manager=Depends(get_state_manager)):
-    await websocket.accept()
-    state_manager.add_client(websocket)
-
-    # --- THIS IS THE CRITICAL FIX ---
-    # Immediately send the complete current state to the newly connected client.
-    # This ensures the app is instantly up-to-date.
-    print("Client connected. Sending full initial state...")
-    full_state = state_manager.get_full_state()
-    await websocket.send_text(json.dumps(full_state, cls=DateTimeEncoder))
-    # --------------------------------
+    # Clients opt into the delta protocol with `/ws?protocol=2`, and can pass
+    # `since=<seq>` on reconnect to receive only the deltas they missed.
+    protocol = PROTOCOL_DELTA if websocket.query_params.get("protocol") == str(PROTOCOL_DELTA) else PROTOCOL_LEGACY
+
+    # The encoding is negotiated through the subprotocol ("f1.msgpack+deflate")
+    # or `?encoding=msgpack&deflate=1`. Deltas are kept serialized as JSON for
+    # resuming, so delta clients can only choose deflate.
+    encodings = (ENCODING_JSON,) if protocol == PROTOCOL_DELTA else (ENCODING_JSON, ENCODING_MSGPACK)
+    wire_format, subprotocol = negotiate_websocket(websocket.headers, websocket.query_params, encodings)
+    await websocket.accept(subprotocol=subprotocol)
+
+    last_seq = websocket.query_params.get("since")
+    last_seq = int(last_seq) if last_seq and last_seq.isdigit() else None
+    # `feeds=TimingData,RaceControlMessages&drivers=1,44` limits what is pushed and
+    # `max_rate=2` conflates it to two updates per second (legacy protocol only);
+    # both can be changed later with a {"type": "subscribe"} message.
+    params = websocket.query_params
+    subscription = Subscription(params.get("feeds"), params.get("drivers"), params.get("max_rate"))
+
+    if protocol == PROTOCOL_DELTA:
+        print(f"Delta client connected (since={last_seq}).")
+        await state_manager.add_client(websocket, protocol=protocol, last_seq=last_seq,
+                                       subscription=subscription, wire_format=wire_format)
+    else:
+        # --- THIS IS THE CRITICAL FIX ---
+        # Immediately send the complete current state to the newly connected client.
+        # This ensures the app is instantly up-to-date. The broadcaster sends it
+        # from the client's own sender task, ahead of any queued broadcast.
+        print("Client connected. Sending full initial state...")
+        await state_manager.add_client(websocket, send_full_state=True,
+                                       subscription=subscription, wire_format=wire_format)
+        # --------------------------------
 
     try:
         while True:
-            # Keep the connection alive
-            await websocket.receive_text()
+            # Client messages keep the connection alive; subscribe requests (JSON,
+            # in a text or binary frame) are acknowledged (or rejected) through
+            # the client's queue, after anything already sent.
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+            try:
+                message = json_loads(received.get("text") or received.get("bytes") or "")
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get("type") == "subscribe":
+                try:
+                    subscription = state_manager.set_subscription(
+                        websocket, message.get("feeds"), message.get("drivers"), message.get("max_rate")
+                    )
+                except ValueError as e:
+                    # A malformed request leaves the current subscription in place
+                    state_manager.broadcaster.send_to(websocket, {"type": "subscribe_error", "detail": str(e)})
+                    continue
+                state_manager.broadcaster.send_to(websocket, {"type": "subscribed", **subscription.to_dict()})
     except WebSocketDisconnect:
+        print("Client disconnected.")
+    finally:
         state_manager.remove_client(websocket)
-        print("Client disconnected.")
\ No newline at end of file
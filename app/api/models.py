@@ -217,6 +217,42 @@ class LeaderboardDriver(BaseModel):
     lastLapTime: Optional[float] = None
     gapToLeader: Optional[str] = None # Can be a time string or "LAP X"
     interval: Optional[str] = None
-    hasFastestLap: bool = False # We will default this to False for now
+    hasFastestLap: bool = False # True for the holder of the session's fastest lap
     tyre: Optional[str] = None
-    sectorTimes: List[Optional[float]] = []
\ No newline at end of file
+    sectorTimes: List[Optional[float]] = []
+
+class LapPace(BaseModel):
+    """Defines the structure for the /api/analytics/pace endpoint."""
+    driver_number: int
+    lap_number: int
+    lap_duration: Optional[float] = None
+    is_pit_out_lap: bool = False
+    rolling_pace: Optional[float] = None # Mean of the clean laps in the window ending at this lap
+
+class StintDegradation(BaseModel):
+    """Defines the structure for the /api/analytics/degradation endpoint."""
+    driver_number: int
+    stint_number: int
+    compound: Optional[str] = None
+    lap_start: int
+    lap_end: Optional[int] = None
+    laps_used: int # Clean laps the trend was fitted to
+    degradation_per_lap: Optional[float] = None # Seconds lost per lap; needs 3 clean laps
+    mean_lap_duration: Optional[float] = None
+
+class SectorBest(BaseModel):
+    """Defines the structure for the /api/analytics/sectors endpoint."""
+    driver_number: int
+    sector: int
+    duration: float
+    lap_number: int
+    is_overall_best: bool
+    gap_to_overall_best: float
+
+class TheoreticalBest(BaseModel):
+    """Defines the structure for the /api/analytics/theoretical-best endpoint."""
+    driver_number: int
+    best_lap_duration: Optional[float] = None
+    theoretical_best: Optional[float] = None # Sum of the driver's best sectors
+    time_lost: Optional[float] = None
+    overall_theoretical_best: Optional[float] = None # Sum of the best sectors of anyone
\ No newline at end of file
@@ -0,0 +1,81 @@
+# /app/api/worker.py
+"""
+Read-only API worker, for running `/api/*` on several cores:
+
+    SHARED_SNAPSHOT_PATH=/dev/shm/f1-state.snapshot \
+        uvicorn app.api.worker:app --workers 4 --port 8000
+
+Each worker keeps its own StateManager in sync with the snapshot that the
+ingest process (main.py with API_WORKERS set) publishes into shared memory.
+Telemetry endpoints only see the latest CarData/Position samples, so range
+and downsampling queries (`date>=`/`date<=`/`max_points` on /api/cardata and
+/api/location) are answered by the ingest process as well.
+
+The port split with API_WORKERS set:
+  - port 8000 (these workers): the read-only `/api/*` endpoints.
+  - INGEST_PORT (default 8001, main.py): live pushes (/ws), the replay and
+    admin controls, closed sessions (/api/sessions/{key}/state), telemetry
+    range queries and the ingest process's own stats (/metrics, /api/ws/stats, /api/pipeline/stats,
+    /api/memory).
+A worker only has a copy of the state, so it can't serve the latter. Asking
+it for one of them gets a 404 (or, for /ws, a close with code 4004) whose
+reason names the ingest port, rather than an empty answer or a silent socket.
+"""
+import os
+
+from fastapi import HTTPException, Request, WebSocket
+from fastapi.responses import JSONResponse
+
+from app.api.main import app, get_state_manager
+from app.utils.helpers import parse_date_filters
+from app.state.state_manager import StateManager
+from app.state.shared_snapshot import SnapshotFollower, SnapshotReader
+
+INGEST_PORT = int(os.getenv("INGEST_PORT", "8001"))
+INGEST_ONLY_PATHS = ("/ws", "/metrics", "/api/ws/stats", "/api/pipeline/stats", "/api/memory",
+                     "/api/sessions/{session_key}/state")
+INGEST_ONLY_PREFIXES = ("/api/replay", "/api/admin/")
+TELEMETRY_PATHS = ("/api/cardata", "/api/location")
+WRONG_PORT_CLOSE_CODE = 4004
+
+state_manager = StateManager()
+follower = SnapshotFollower(SnapshotReader(os.environ["SHARED_SNAPSHOT_PATH"]), state_manager)
+
+async def get_snapshot_state_manager():
+    # Async, so the reload runs on the event loop between handlers instead of on a
+    # threadpool thread that would swap the state while another request serializes it
+    follower.refresh()
+    return state_manager
+
+app.dependency_overrides[get_state_manager] = get_snapshot_state_manager
+
+def _is_ingest_only(path):
+    return path in INGEST_ONLY_PATHS or path.startswith(INGEST_ONLY_PREFIXES)
+
+ingest_only_routes = [route for route in app.router.routes if _is_ingest_only(getattr(route, "path", ""))]
+app.router.routes[:] = [route for route in app.router.routes if route not in ingest_only_routes]
+
+async def served_by_ingest_process():
+    raise HTTPException(status_code=404, detail=f"Served by the ingest process on port {INGEST_PORT}")
+
+def _is_telemetry_window(request):
+    lower, upper = parse_date_filters(request.query_params)
+    return lower is not None or upper is not None or "max_points" in request.query_params
+
+@app.middleware("http")
+async def telemetry_windows_on_ingest_process(request: Request, call_next):
+    # The snapshot only carries the latest sample of each car; a window would come back near-empty
+    if request.url.path in TELEMETRY_PATHS and _is_telemetry_window(request):
+        return JSONResponse(status_code=404, content={
+            "detail": f"Telemetry range queries are served by the ingest process on port {INGEST_PORT}"
+        })
+    return await call_next(request)
+
+@app.websocket("/ws")
+async def websocket_on_wrong_port(websocket: WebSocket):
+    await websocket.accept()
+    await websocket.close(code=WRONG_PORT_CLOSE_CODE, reason=f"Live updates are served on port {INGEST_PORT}")
+
+for route in ingest_only_routes:
+    if route.path != "/ws":
+        app.add_api_route(route.path, served_by_ingest_process, methods=list(route.methods), include_in_schema=False)
@@ -0,0 +1,146 @@
+from app.utils.helpers import safe_to_float, time_string_to_seconds
+
+# Top-level fields of a TimingData line that DriverTiming parses
+PARSED_FIELDS = {
+    "Position", "GapToLeader", "IntervalToPositionAhead", "LastLapTime", "BestLapTime",
+    "Sectors", "Speeds", "NumberOfLaps", "InPit", "PitOut", "Retired", "Stopped",
+}
+
+def _value(line, field):
+    """Returns line[field]["Value"], or None."""
+    entry = line.get(field)
+    return entry.get("Value") if isinstance(entry, dict) else None
+
+def _sector_value(sectors, index):
+    """Sectors are a list in the snapshot but a {"0": ...} dict in updates."""
+    if isinstance(sectors, dict):
+        sector = sectors.get(str(index))
+    elif isinstance(sectors, list) and index < len(sectors):
+        sector = sectors[index]
+    else:
+        sector = None
+    return sector.get("Value") if isinstance(sector, dict) else None
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class DriverTiming:
+    """
+    One driver's timing line, parsed once when it changes: positions as ints
+    and lap, sector, gap and interval times as float seconds. Readers (the
+    leaderboard, /api/intervals, /api/position) use these instead of walking
+    the nested TimingData dict and re-parsing its strings on every request.
+    The raw gap/interval strings are kept as well, since they can be "1 LAP".
+    """
+    __slots__ = (
+        "driver_number", "position", "number_of_laps",
+        "gap_to_leader", "gap_to_leader_text", "interval", "interval_text",
+        "last_lap_time", "best_lap_time", "sector_times",
+        "i1_speed", "i2_speed", "st_speed",
+        "in_pit", "pit_out", "retired", "stopped",
+    )
+
+    def __init__(self, driver_number):
+        self.driver_number = driver_number
+        self.position = None
+        self.number_of_laps = None
+        self.gap_to_leader = None
+        self.gap_to_leader_text = None
+        self.interval = None
+        self.interval_text = None
+        self.last_lap_time = None
+        self.best_lap_time = None
+        self.sector_times = (None, None, None)
+        self.i1_speed = None
+        self.i2_speed = None
+        self.st_speed = None
+        self.in_pit = False
+        self.pit_out = False
+        self.retired = False
+        self.stopped = False
+
+    def update(self, line, fields=None):
+        """
+        Re-parses the given top-level `fields` of the merged TimingData
+        `line` (all parsed fields if None).
+        """
+        if fields is None:
+            fields = PARSED_FIELDS
+
+        if "Position" in fields:
+            self.position = _int_or_none(line.get("Position"))
+        if "NumberOfLaps" in fields:
+            self.number_of_laps = _int_or_none(line.get("NumberOfLaps"))
+        if "GapToLeader" in fields:
+            self.gap_to_leader_text = line.get("GapToLeader")
+            self.gap_to_leader = safe_to_float(self.gap_to_leader_text)
+        if "IntervalToPositionAhead" in fields:
+            self.interval_text = _value(line, "IntervalToPositionAhead")
+            self.interval = safe_to_float(self.interval_text)
+        if "LastLapTime" in fields:
+            self.last_lap_time = time_string_to_seconds(_value(line, "LastLapTime"))
+        if "BestLapTime" in fields:
+            self.best_lap_time = time_string_to_seconds(_value(line, "BestLapTime"))
+        if "Sectors" in fields:
+            sectors = line.get("Sectors")
+            self.sector_times = tuple(time_string_to_seconds(_sector_value(sectors, i)) for i in range(3))
+        if "Speeds" in fields:
+            speeds = line.get("Speeds")
+            speeds = speeds if isinstance(speeds, dict) else {}
+            self.i1_speed = _int_or_none(_value(speeds, "I1"))
+            self.i2_speed = _int_or_none(_value(speeds, "I2"))
+            self.st_speed = _int_or_none(_value(speeds, "ST"))
+        if "InPit" in fields:
+            self.in_pit = bool(line.get("InPit"))
+        if "PitOut" in fields:
+            self.pit_out = bool(line.get("PitOut"))
+        if "Retired" in fields:
+            self.retired = bool(line.get("Retired"))
+        if "Stopped" in fields:
+            self.stopped = bool(line.get("Stopped"))
+
+
+class DriverTimingIndex:
+    """
+    Keeps a DriverTiming per driver in sync with `TimingData["Lines"]`.
+    It is fed the change set of every TimingData merge, so only the fields
+    that an update touched are parsed again.
+    """
+    def __init__(self):
+        self.drivers = {}  # driver number (str) -> DriverTiming
+
+    def rebuild(self, lines):
+        """Parses every line from scratch, e.g. after loading a checkpoint."""
+        self.drivers = {}
+        for driver_number_str, line in lines.items():
+            if isinstance(line, dict) and driver_number_str.isdigit():
+                self._get_or_create(driver_number_str).update(line)
+
+    def apply_changes(self, lines, changes):
+        """Re-parses the fields touched by a TimingData change set."""
+        touched = {}
+        for path, _, _ in changes:
+            if len(path) > 1 and path[0] == "Lines":
+                fields = touched.setdefault(path[1], set())
+                if len(path) > 2 and path[2] in PARSED_FIELDS:
+                    fields.add(path[2])
+        for driver_number_str, fields in touched.items():
+            line = lines.get(driver_number_str)
+            if isinstance(line, dict) and driver_number_str.isdigit():
+                self._get_or_create(driver_number_str).update(line, fields)
+
+    def _get_or_create(self, driver_number_str):
+        driver = self.drivers.get(driver_number_str)
+        if driver is None:
+            driver = self.drivers[driver_number_str] = DriverTiming(int(driver_number_str))
+        return driver
+
+    def get(self, driver_number):
+        return self.drivers.get(str(driver_number))
+
+    def values(self):
+        return self.drivers.values()
@@ -0,0 +1,243 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+SECTOR_FIELDS = ("duration_sector_1", "duration_sector_2", "duration_sector_3")
+NAN = float("nan")
+
+def _stint_list(stints):
+    """TimingAppData stints arrive as a list, or as a dict keyed "0", "1", ... after partial updates."""
+    if isinstance(stints, list):
+        return [s for s in stints if isinstance(s, dict)]
+    if isinstance(stints, dict):
+        return [stints[key] for key in sorted(stints, key=int) if isinstance(stints[key], dict)]
+    return []
+
+def _int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class DriverLaps:
+    """
+    One driver's laps as columns (`array`s, in arrival order), plus prefix
+    sums over the clean laps: timed and not a pit-out lap. Entry i of a
+    prefix column covers laps [0, i), so any lap range's count, mean or
+    least-squares fit is the difference of two entries, O(1) however long
+    the range is. Appending a lap is O(1).
+    """
+    __slots__ = ("lap_numbers", "durations", "pit_out", "sectors", "best_lap", "best_sectors",
+                 "clean_count", "sum_x", "sum_y", "sum_xx", "sum_xy")
+
+    def __init__(self):
+        self.lap_numbers = array("l")
+        self.durations = array("d")  # NaN when the lap has no time
+        self.pit_out = array("b")
+        self.sectors = (array("d"), array("d"), array("d"))
+        self.best_lap = None
+        self.best_sectors = [None, None, None]  # (seconds, lap number) per sector
+        self.clean_count = array("l", [0])
+        self.sum_x = array("d", [0.0])   # lap numbers
+        self.sum_y = array("d", [0.0])   # lap durations
+        self.sum_xx = array("d", [0.0])
+        self.sum_xy = array("d", [0.0])
+
+    def __len__(self):
+        return len(self.lap_numbers)
+
+    def add(self, lap_number, duration, pit_out, sectors):
+        self.lap_numbers.append(lap_number)
+        self.durations.append(NAN if duration is None else duration)
+        self.pit_out.append(1 if pit_out else 0)
+        if duration is not None and (self.best_lap is None or duration < self.best_lap):
+            self.best_lap = duration
+        for index, seconds in enumerate(sectors):
+            self.sectors[index].append(NAN if seconds is None else seconds)
+            best = self.best_sectors[index]
+            if seconds is not None and (best is None or seconds < best[0]):
+                self.best_sectors[index] = (seconds, lap_number)
+
+        clean = duration is not None and not pit_out
+        x, y = (lap_number, duration) if clean else (0, 0.0)
+        self.clean_count.append(self.clean_count[-1] + clean)
+        self.sum_x.append(self.sum_x[-1] + x)
+        self.sum_y.append(self.sum_y[-1] + y)
+        self.sum_xx.append(self.sum_xx[-1] + x * x)
+        self.sum_xy.append(self.sum_xy[-1] + x * y)
+
+    def range_of_laps(self, first_lap, last_lap):
+        """Positions [start, stop) of the laps numbered first_lap..last_lap (lap numbers only ever grow)."""
+        return bisect_left(self.lap_numbers, first_lap), bisect_right(self.lap_numbers, last_lap)
+
+    def rolling_pace(self, window):
+        """Mean of the clean laps among the last `window` laps, at every lap (None if there are none)."""
+        count, total = self.clean_count, self.sum_y
+        result = []
+        for stop in range(1, len(self.lap_numbers) + 1):
+            start = max(0, stop - window)
+            n = count[stop] - count[start]
+            result.append((total[stop] - total[start]) / n if n else None)
+        return result
+
+    def fit(self, start, stop):
+        """
+        Least-squares line of lap time against lap number over the clean laps
+        in positions [start, stop). Returns (laps used, slope, mean lap time).
+        """
+        n = self.clean_count[stop] - self.clean_count[start]
+        if n == 0:
+            return 0, None, None
+        sx = self.sum_x[stop] - self.sum_x[start]
+        sy = self.sum_y[stop] - self.sum_y[start]
+        sxx = self.sum_xx[stop] - self.sum_xx[start]
+        sxy = self.sum_xy[stop] - self.sum_xy[start]
+        denominator = n * sxx - sx * sx
+        slope = (n * sxy - sx * sy) / denominator if n >= 3 and denominator else None
+        return n, slope, sy / n
+
+
+class LapAnalytics:
+    """
+    Race analytics over `LapHistory`, kept as per-driver column arrays and
+    updated as each lap is recorded (see DriverLaps), so every computation
+    is a pass over numbers rather than over lap dicts:
+      - rolling pace per driver,
+      - tyre degradation per stint (laps joined with TimingAppData stints),
+      - personal and overall sector bests,
+      - theoretical best laps.
+    Like the lap index, it only reads the lap dicts; `LapHistory` stays the
+    source of truth and the analytics are rebuilt whenever it is replaced.
+    """
+    ROLLING_WINDOW = 5
+
+    def __init__(self, state_manager, laps=None):
+        self.state_manager = state_manager
+        self.rebuild(laps or [])
+
+    def rebuild(self, laps):
+        """Recomputes everything from a list of lap records."""
+        self.drivers = {}  # driver number (int) -> DriverLaps
+        self.overall_sectors = [None, None, None]  # (seconds, driver number, lap number) per sector
+        for lap in laps:
+            self.add(lap)
+
+    def add(self, lap):
+        """Adds one newly recorded lap. O(1)."""
+        driver_number = lap.get("driver_number")
+        lap_number = lap.get("lap_number")
+        if driver_number is None or lap_number is None:
+            return
+        driver = self.drivers.get(driver_number)
+        if driver is None:
+            driver = self.drivers[driver_number] = DriverLaps()
+        sectors = [lap.get(field) for field in SECTOR_FIELDS]
+        driver.add(lap_number, lap.get("lap_duration"), lap.get("is_pit_out_lap"), sectors)
+
+        for index, seconds in enumerate(sectors):
+            best = self.overall_sectors[index]
+            if seconds is not None and (best is None or seconds < best[0]):
+                self.overall_sectors[index] = (seconds, driver_number, lap_number)
+
+    def _selected(self, driver_number):
+        if driver_number is None:
+            return sorted(self.drivers.items())
+        driver = self.drivers.get(driver_number)
+        return [(driver_number, driver)] if driver else []
+
+    def get_pace(self, window=None, driver_number=None):
+        """Every lap with the driver's rolling average pace over the last `window` laps."""
+        window = window or self.ROLLING_WINDOW
+        rows = []
+        for number, driver in self._selected(driver_number):
+            pace = driver.rolling_pace(window)
+            for index, lap_number in enumerate(driver.lap_numbers):
+                duration = driver.durations[index]
+                rows.append({
+                    "driver_number": number,
+                    "lap_number": lap_number,
+                    "lap_duration": None if duration != duration else duration,
+                    "is_pit_out_lap": bool(driver.pit_out[index]),
+                    "rolling_pace": round(pace[index], 3) if pace[index] is not None else None,
+                })
+        return rows
+
+    def get_degradation(self, driver_number=None):
+        """
+        The lap time trend of every stint, in seconds per lap. A stint's laps
+        follow from TimingAppData: it covers TotalLaps - StartLaps laps after
+        the previous stint, and the current one runs to the latest lap. Its
+        first lap (the start or the out-lap) and, once it is over, its last
+        lap (the in-lap) are left out of the fit.
+        """
+        app_lines = self.state_manager.state.get("TimingAppData", {}).get("Lines", {})
+        rows = []
+        for number, driver in self._selected(driver_number):
+            stints = _stint_list(app_lines.get(str(number), {}).get("Stints"))
+            first_lap = 1
+            for stint_number, stint in enumerate(stints, 1):
+                laps_on_stint = max(0, _int(stint.get("TotalLaps")) - _int(stint.get("StartLaps")))
+                last_lap = first_lap + laps_on_stint - 1
+                if stint_number == len(stints):
+                    # The current stint runs up to the latest lap, even if TotalLaps lags behind
+                    if driver.lap_numbers and driver.lap_numbers[-1] > last_lap:
+                        last_lap = driver.lap_numbers[-1]
+                    start, stop = driver.range_of_laps(first_lap + 1, last_lap)
+                else:
+                    start, stop = driver.range_of_laps(first_lap + 1, last_lap - 1)
+                laps_used, slope, mean = driver.fit(start, max(start, stop))
+                rows.append({
+                    "driver_number": number,
+                    "stint_number": stint_number,
+                    "compound": stint.get("Compound"),
+                    "lap_start": first_lap,
+                    "lap_end": last_lap if last_lap >= first_lap else None,
+                    "laps_used": laps_used,
+                    "degradation_per_lap": round(slope, 4) if slope is not None else None,
+                    "mean_lap_duration": round(mean, 3) if mean is not None else None,
+                })
+                first_lap = last_lap + 1
+        return rows
+
+    def get_sector_bests(self, driver_number=None):
+        """Each driver's best time in each sector, and how far it is off the overall best."""
+        rows = []
+        for number, driver in self._selected(driver_number):
+            for index, best in enumerate(driver.best_sectors):
+                if best is None:
+                    continue
+                overall = self.overall_sectors[index]
+                rows.append({
+                    "driver_number": number,
+                    "sector": index + 1,
+                    "duration": best[0],
+                    "lap_number": best[1],
+                    "is_overall_best": overall[1] == number and overall[0] == best[0],
+                    "gap_to_overall_best": round(best[0] - overall[0], 3),
+                })
+        return rows
+
+    def get_theoretical_best(self, driver_number=None):
+        """
+        Each driver's best lap next to the sum of their best sectors, fastest
+        theoretical lap first. The overall theoretical best (best sectors of
+        anyone) is repeated on every row for comparison.
+        """
+        overall = None
+        if all(self.overall_sectors):
+            overall = round(sum(best[0] for best in self.overall_sectors), 3)
+        rows = []
+        for number, driver in self._selected(driver_number):
+            best_lap = driver.best_lap
+            theoretical = None
+            if all(driver.best_sectors):
+                theoretical = round(sum(best[0] for best in driver.best_sectors), 3)
+            rows.append({
+                "driver_number": number,
+                "best_lap_duration": best_lap,
+                "theoretical_best": theoretical,
+                "time_lost": round(best_lap - theoretical, 3) if best_lap is not None and theoretical is not None else None,
+                "overall_theoretical_best": overall,
+            })
+        rows.sort(key=lambda row: (row["theoretical_best"] is None, row["theoretical_best"] or 0))
+        return rows
@@ -0,0 +1,56 @@
+class LapHistoryIndex:
+    """
+    Indexes the flat `LapHistory` list so per-driver lookups don't have to
+    scan every lap of the race. It is updated on every insert and keeps:
+      - each driver's laps in the order they were recorded,
+      - a pointer to each driver's last lap,
+      - a (driver_number, lap_number) -> lap map,
+      - each driver's fastest lap and the overall fastest lap.
+    The list in the state stays the source of truth; the index only holds
+    references to the same lap dicts.
+    """
+    def __init__(self, laps=None):
+        self.rebuild(laps or [])
+
+    def rebuild(self, laps):
+        """Recomputes the whole index from a list of lap records."""
+        self.by_driver = {}
+        self.by_lap = {}
+        self.last_lap = {}
+        self.fastest_by_driver = {}
+        self.fastest_lap = None
+        for lap in laps:
+            self.add(lap)
+
+    def add(self, lap):
+        """Indexes one newly recorded lap. O(1)."""
+        driver_number = lap.get("driver_number")
+        lap_number = lap.get("lap_number")
+
+        self.by_driver.setdefault(driver_number, []).append(lap)
+        self.by_lap[(driver_number, lap_number)] = lap
+        self.last_lap[driver_number] = lap
+
+        duration = lap.get("lap_duration")
+        if duration is None:
+            return
+        driver_best = self.fastest_by_driver.get(driver_number)
+        if driver_best is None or duration < driver_best["lap_duration"]:
+            self.fastest_by_driver[driver_number] = lap
+        if self.fastest_lap is None or duration < self.fastest_lap["lap_duration"]:
+            self.fastest_lap = lap
+
+    def get_last_lap(self, driver_number):
+        return self.last_lap.get(driver_number)
+
+    def get_lap(self, driver_number, lap_number):
+        return self.by_lap.get((driver_number, lap_number))
+
+    def get_driver_laps(self, driver_number):
+        return self.by_driver.get(driver_number, [])
+
+    def get_fastest_lap(self, driver_number=None):
+        """The fastest lap of one driver, or of the whole session if no driver is given."""
+        if driver_number is None:
+            return self.fastest_lap
+        return self.fastest_by_driver.get(driver_number)
@@ -0,0 +1,108 @@
+class Leaderboard:
+    """
+    A materialized leaderboard that is patched row by row as feeds arrive,
+    instead of rejoining TimingData, TimingAppData, DriverList and LapHistory
+    on every request. Only the drivers named in an update are rebuilt, and
+    the sort order is only recomputed when a position actually changes.
+    """
+    def __init__(self, state_manager):
+        self.state_manager = state_manager
+        self.rows = {}  # driver number (str) -> row dict shaped like LeaderboardDriver
+        self.fastest_lap_holder = None
+        self._order = None  # Cached driver numbers sorted by position
+
+    def _build_row(self, driver_number_str):
+        """Builds one driver's row from the current state."""
+        state = self.state_manager.state
+        timing = self.state_manager.driver_timing.get(driver_number_str)
+        driver_app_data = state.get("TimingAppData", {}).get("Lines", {}).get(driver_number_str, {})
+        driver_info = state.get("DriverList", {}).get(driver_number_str, {})
+        driver_number = int(driver_number_str)
+
+        # 1. Get Last Lap Time from the lap index (O(1) per driver)
+        last_lap_for_driver = self.state_manager.lap_index.get_last_lap(driver_number)
+        last_lap_time_val = last_lap_for_driver.get("lap_duration") if last_lap_for_driver else None
+
+        # 2. Get Interval and set to null for the leader
+        interval_val = timing.interval_text if timing else None
+        if timing and timing.position == 1:
+            interval_val = None # This ensures the leader has no interval
+
+        # 3. Get Tyre data (sector times are parsed once at ingest)
+        current_tyre = None
+        stints = driver_app_data.get("Stints")
+        if isinstance(stints, list) and stints:
+            current_tyre = stints[-1].get("Compound")
+        elif isinstance(stints, dict) and stints:
+            last_stint_key = sorted(stints.keys(), key=int)[-1]
+            current_tyre = stints[last_stint_key].get("Compound")
+
+        # 4. Assemble the row
+        return {
+            "position": timing.position if timing and timing.position is not None else 99,
+            "name": driver_info.get("FullName", "Unknown"),
+            "shortName": driver_info.get("Tla", "N/A"),
+            "driverNumber": driver_number,
+            "team": driver_info.get("TeamName", "N/A"),
+            "teamColor": driver_info.get("TeamColour"),
+            "headshotUrl": driver_info.get("HeadshotUrl"),
+            "lastLapTime": last_lap_time_val,
+            "gapToLeader": timing.gap_to_leader_text if timing else None,
+            "interval": interval_val,
+            "hasFastestLap": self.fastest_lap_holder == driver_number,
+            "tyre": current_tyre,
+            "sectorTimes": list(timing.sector_times) if timing else [None, None, None],
+        }
+
+    def update(self, driver_numbers):
+        """
+        Rebuilds the rows of the given drivers (plus the previous and new
+        fastest-lap holders if that changed) and returns {driver: row} for
+        the rows whose content actually changed.
+        """
+        state = self.state_manager.state
+        timing_lines = state.get("TimingData", {}).get("Lines", {})
+        if not timing_lines or not state.get("DriverList"):
+            return {}
+
+        drivers_to_update = {str(d) for d in driver_numbers if str(d) in timing_lines}
+
+        fastest_lap = self.state_manager.lap_index.get_fastest_lap()
+        fastest_lap_holder = fastest_lap.get("driver_number") if fastest_lap else None
+        if fastest_lap_holder != self.fastest_lap_holder:
+            for holder in (self.fastest_lap_holder, fastest_lap_holder):
+                if holder is not None and str(holder) in timing_lines:
+                    drivers_to_update.add(str(holder))
+            self.fastest_lap_holder = fastest_lap_holder
+
+        changed = {}
+        for driver_number_str in drivers_to_update:
+            row = self._build_row(driver_number_str)
+            previous = self.rows.get(driver_number_str)
+            if row == previous:
+                continue
+            if previous is None or previous["position"] != row["position"]:
+                self._order = None
+            self.rows[driver_number_str] = row
+            changed[driver_number_str] = row
+
+        if changed:
+            self.state_manager.bump_version("Leaderboard")
+        return changed
+
+    def rebuild(self):
+        """Rebuilds every row, e.g. after a full snapshot. Returns the changed rows."""
+        timing_lines = self.state_manager.state.get("TimingData", {}).get("Lines", {})
+        for driver_number_str in list(self.rows):
+            if driver_number_str not in timing_lines:
+                del self.rows[driver_number_str]
+                self._order = None
+        return self.update(timing_lines.keys())
+
+    def get_rows(self):
+        """Returns the leaderboard sorted by position."""
+        if not self.rows:
+            self.rebuild()
+        if self._order is None:
+            self._order = sorted(self.rows, key=lambda d: self.rows[d]["position"])
+        return [self.rows[driver_number_str] for driver_number_str in self._order]
@@ -0,0 +1,214 @@
+import asyncio
+import base64
+import json
+import os
+import time
+from datetime import datetime
+
+from app.utils.helpers import DateTimeEncoder
+
+class StatePersistence:
+    """
+    Crash recovery for the StateManager.
+
+    Every raw feed frame is appended to a journal segment
+    (`journal-000001.jsonl`, in the same `{"timestamp", "type", "data"}`
+    format as replay files). Every N seconds or M frames the whole state is
+    written as a compact snapshot and a new journal segment is started, so
+    the older segments can be deleted. On startup the snapshot is loaded and
+    only the journal written after it is replayed.
+    """
+    SNAPSHOT_FILE = "snapshot.json"
+    SNAPSHOT_VERSION = 1
+    SNAPSHOT_INTERVAL = 30.0        # Seconds between snapshots
+    SNAPSHOT_EVERY_MESSAGES = 5000  # ...or frames between snapshots, whichever comes first
+
+    def __init__(self, state_manager, directory, snapshot_interval=None, snapshot_every_messages=None):
+        self.state_manager = state_manager
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval or self.SNAPSHOT_INTERVAL
+        self.snapshot_every_messages = snapshot_every_messages or self.SNAPSHOT_EVERY_MESSAGES
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_FILE)
+
+        self.segment = None
+        self._journal = None
+        self._snapshot_in_progress = False
+        self.last_snapshot_time = time.monotonic()
+        self.messages_since_snapshot = 0
+        self.frames_failed_on_restore = 0
+
+    # ------------------------------------------------------------------
+    # Journal
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"journal-{segment:06d}.jsonl")
+
+    def _existing_segments(self):
+        segments = []
+        for filename in os.listdir(self.directory):
+            if filename.startswith("journal-") and filename.endswith(".jsonl"):
+                try:
+                    segments.append(int(filename[len("journal-"):-len(".jsonl")]))
+                except ValueError:
+                    continue
+        return sorted(segments)
+
+    def _open_segment(self, segment):
+        if self._journal:
+            self._journal.close()
+        self.segment = segment
+        self._journal = open(self._segment_path(segment), "a")
+
+    def open(self):
+        """Starts a fresh journal segment after any existing ones."""
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self._existing_segments()
+        self._open_segment((existing[-1] if existing else 0) + 1)
+
+    def record_frame(self, message_type, data, received_time):
+        """Appends one raw frame ("text" JSON string or "binary" bytes) to the journal."""
+        if self._journal is None:
+            return
+        if isinstance(data, bytes):
+            data = base64.b64encode(data).decode("ascii")
+        self._journal.write(json.dumps({
+            "timestamp": received_time.isoformat(),
+            "type": message_type,
+            "data": data,
+        }) + "\n")
+        self._journal.flush()
+        self.messages_since_snapshot += 1
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+
+    def snapshot_due(self):
+        return (self.messages_since_snapshot >= self.snapshot_every_messages
+                or time.monotonic() - self.last_snapshot_time >= self.snapshot_interval)
+
+    def _prepare_snapshot(self):
+        """
+        Serializes the state and switches to a new journal segment in one
+        step, so every frame lands either in the snapshot or in the new segment.
+        Returns the snapshot body and the segments it makes obsolete.
+        """
+        obsolete_segments = [s for s in self._existing_segments() if s <= self.segment]
+        next_segment = self.segment + 1
+        body = json.dumps({
+            "version": self.SNAPSHOT_VERSION,
+            "created": time.time(),
+            "journal_segment": next_segment,
+            "state": self.state_manager.get_full_state(),
+        }, cls=DateTimeEncoder, separators=(",", ":"))
+        self._open_segment(next_segment)
+        self.messages_since_snapshot = 0
+        self.last_snapshot_time = time.monotonic()
+        return body, obsolete_segments
+
+    def _write_snapshot(self, body, obsolete_segments):
+        """Atomically replaces the snapshot file, then deletes the journal it covers."""
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        for segment in obsolete_segments:
+            try:
+                os.remove(self._segment_path(segment))
+            except OSError:
+                pass
+
+    async def snapshot(self):
+        """Takes a snapshot; the file is written off the event loop."""
+        if self._journal is None or self._snapshot_in_progress:
+            return
+        self._snapshot_in_progress = True
+        try:
+            body, obsolete_segments = self._prepare_snapshot()
+            await asyncio.to_thread(self._write_snapshot, body, obsolete_segments)
+        except Exception as e:
+            print(f"Warning: could not write state snapshot: {e}")
+        finally:
+            self._snapshot_in_progress = False
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+
+    async def restore(self, processor):
+        """
+        Loads the last snapshot and replays the journal written after it
+        through `processor`, with broadcasts muted. Returns True if any
+        state was recovered. Only a torn last line of the newest segment is
+        expected; any other line that fails is logged and counted in
+        `frames_failed_on_restore`.
+        """
+        if not os.path.isdir(self.directory):
+            return False
+
+        started = time.perf_counter()
+        first_segment = 1
+        restored = False
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r") as f:
+                    snapshot = json.load(f)
+                self.state_manager.load_state(snapshot["state"])
+                first_segment = snapshot["journal_segment"]
+                restored = True
+            except (OSError, json.JSONDecodeError, KeyError) as e:
+                print(f"Warning: ignoring unreadable state snapshot: {e}")
+
+        replayed = failed = 0
+        torn_tail = False
+        segments = [segment for segment in self._existing_segments() if segment >= first_segment]
+        self.state_manager.muted = True
+        try:
+            for segment in segments:
+                with open(self._segment_path(segment), "r") as f:
+                    lines = f.readlines()
+                for line_number, line in enumerate(lines, 1):
+                    try:
+                        log_entry = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        if segment == segments[-1] and line_number == len(lines):
+                            # A torn last line from the crash; everything before it is applied
+                            torn_tail = True
+                        else:
+                            failed += 1
+                            print(f"Warning: unreadable journal line {segment}:{line_number}: {e}")
+                        continue
+                    try:
+                        message_time = datetime.fromisoformat(log_entry["timestamp"])
+                        await processor._process_log_entry(log_entry, message_time)
+                        replayed += 1
+                    except Exception as e:
+                        failed += 1
+                        print(f"Warning: could not replay journal line {segment}:{line_number}: {e}")
+        finally:
+            self.state_manager.muted = False
+
+        if restored or replayed or failed:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            details = f"{replayed} journal frames"
+            if failed:
+                details += f", {failed} failed (the state may differ from before the crash)"
+            if torn_tail:
+                details += ", torn last line skipped"
+            print(f"Restored state from '{self.directory}' ({details}) in {elapsed_ms:.0f} ms.")
+        self.frames_failed_on_restore = failed
+        return restored or replayed > 0
+
+    def close(self):
+        """Writes a final snapshot synchronously and closes the journal."""
+        if self._journal is None:
+            return
+        try:
+            self._write_snapshot(*self._prepare_snapshot())
+        except Exception as e:
+            print(f"Warning: could not write final state snapshot: {e}")
+        self._journal.close()
+        self._journal = None
@@ -0,0 +1,53 @@
+import collections
+import hashlib
+
+class CachedResponse:
+    """A serialized response body, its ETag and the feed versions it was built from."""
+    __slots__ = ("version_key", "body", "etag")
+
+    def __init__(self, version_key, body):
+        self.version_key = version_key
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class ResponseCache:
+    """
+    Holds the serialized JSON of each API response together with the feed
+    versions it was computed from. An entry is valid for as long as none of
+    those feeds changed, so each response is built at most once per change.
+    Entries are kept in LRU order so varying query strings can't grow it forever.
+    """
+    MAX_ENTRIES = 512
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self.entries = collections.OrderedDict()  # request key -> CachedResponse
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version_key):
+        """Returns the cached response for `key` if it is still current, else None."""
+        entry = self.entries.get(key)
+        if entry is None or entry.version_key != version_key:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, version_key, body):
+        entry = CachedResponse(version_key, body)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    def get_stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": sum(len(entry.body) for entry in self.entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,185 @@
+import collections
+import gzip
+import os
+import threading
+import time
+
+from app.utils.helpers import json_dumps, json_loads
+
+def parse_limits(value):
+    """Parses "LapHistory=5000,TeamRadio=200" into {"LapHistory": 5000, "TeamRadio": 200}."""
+    limits = {}
+    for part in (value or "").split(","):
+        feed_name, _, limit = part.partition("=")
+        if feed_name.strip() and limit.strip().isdigit():
+            limits[feed_name.strip()] = int(limit)
+    return limits
+
+def process_rss_bytes():
+    """Current resident set size from /proc, or the peak RSS where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource  # Unix only, like the peak RSS it reports
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ClosedSession:
+    """One finished session: its final state, in memory or spilled to `path`."""
+    __slots__ = ("key", "name", "closed_at", "state", "path", "size_bytes")
+
+    def __init__(self, key, name, state):
+        self.key = key
+        self.name = name
+        self.closed_at = time.time()
+        self.state = state
+        self.path = None
+        self.size_bytes = None
+
+    def to_dict(self):
+        return {
+            "key": self.key,
+            "name": self.name,
+            "closed_at": self.closed_at,
+            "in_memory": self.state is not None,
+            "path": self.path,
+            "size_bytes": self.size_bytes,
+        }
+
+
+class RetentionManager:
+    """
+    Keeps a long-running process (a whole race weekend) from growing forever.
+
+    - Append-only feeds are capped per feed. Once a list exceeds its cap the
+      oldest tenth is evicted in one go, so trimming stays cheap per append.
+    - The state is partitioned by `SessionInfo.Key`: when a different session
+      starts, the current state is closed as a whole and the live state starts
+      empty. Telemetry is already bounded by the TelemetryStore ring buffers.
+    - Closed sessions are spilled to `archive_dir` as gzipped JSON (off the
+      event loop), and at most `sessions_in_memory` of them stay in memory.
+    """
+    LIMITS = {
+        "RaceControlMessages": 2000,
+        "TeamRadio": 1000,
+        "LapHistory": 10000,
+        "PitHistory": 2000,
+    }
+    SESSIONS_IN_MEMORY = 1
+
+    def __init__(self, state_manager, limits=None, archive_dir=None, sessions_in_memory=None):
+        self.state_manager = state_manager
+        self.limits = {**self.LIMITS, **(limits or {})}
+        self.archive_dir = archive_dir
+        self.sessions_in_memory = self.SESSIONS_IN_MEMORY if sessions_in_memory is None else sessions_in_memory
+        self.closed_sessions = collections.OrderedDict()  # session key -> ClosedSession
+        self.evicted = collections.Counter()  # feed name -> items evicted by the cap
+        self.sessions_dropped = 0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Per-feed caps
+    # ------------------------------------------------------------------
+
+    def enforce(self, feed_name):
+        """Trims an append-only feed back under its cap. Returns the number of items evicted."""
+        items = self.state_manager.state.get(feed_name)
+        limit = self.limits.get(feed_name)
+        if not limit or not isinstance(items, list) or len(items) <= limit:
+            return 0
+        excess = len(items) - (limit - limit // 10)
+        del items[:excess]
+        self.evicted[feed_name] += excess
+        if feed_name == "LapHistory":
+            self.state_manager.lap_index.rebuild(items)
+            self.state_manager.lap_analytics.rebuild(items)
+        return excess
+
+    # ------------------------------------------------------------------
+    # Session partitions
+    # ------------------------------------------------------------------
+
+    def begin_session(self, session_info):
+        """
+        Called before `session_info` is applied. If it belongs to a different
+        session than the live state, that session is closed and the live
+        state is reset. Returns True if a session was closed.
+        """
+        new_key = session_info.get("Key") if isinstance(session_info, dict) else None
+        current_key = self.state_manager.state.get("SessionInfo", {}).get("Key")
+        if new_key is None or current_key is None or new_key == current_key:
+            return False
+        self.close_session()
+        return True
+
+    def close_session(self):
+        """Moves the live state into a ClosedSession and starts from an empty state."""
+        state = self.state_manager.state
+        session_info = state.get("SessionInfo", {})
+        session = ClosedSession(session_info.get("Key"), session_info.get("Name"), state)
+        with self._lock:
+            self.closed_sessions[session.key] = session
+        print(f"Closed session {session.key} ({session.name}).")
+
+        # The closed state is never mutated again, so it can be serialized on another thread
+        self.state_manager.load_state({})
+        if self.archive_dir:
+            threading.Thread(target=self._spill, args=(session,), daemon=True).start()
+        else:
+            self._evict_sessions()
+        return session
+
+    def _session_path(self, key):
+        return os.path.join(self.archive_dir, f"session-{key}.json.gz")
+
+    def _spill(self, session):
+        try:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            path = self._session_path(session.key)
+            body = json_dumps(session.state).encode("utf-8")
+            with gzip.open(path + ".tmp", "wb", compresslevel=6) as f:
+                f.write(body)
+            os.replace(path + ".tmp", path)
+            session.path = path
+            session.size_bytes = os.path.getsize(path)
+        except Exception as e:
+            print(f"Failed to spill session {session.key}: {e}")
+        self._evict_sessions()
+
+    def _evict_sessions(self):
+        """Keeps at most `sessions_in_memory` closed states in memory, oldest out first."""
+        with self._lock:
+            in_memory = [s for s in self.closed_sessions.values() if s.state is not None]
+            for session in in_memory[:max(0, len(in_memory) - self.sessions_in_memory)]:
+                session.state = None
+                if session.path is None:
+                    # Nowhere to spill it to: forget it entirely
+                    del self.closed_sessions[session.key]
+                    self.sessions_dropped += 1
+
+    def get_session_state(self, key):
+        """Returns a closed session's final state, reading it back from disk if needed."""
+        session = self.closed_sessions.get(key)
+        if session is None:
+            return None
+        if session.state is not None:
+            return session.state
+        if session.path:
+            with gzip.open(session.path, "rb") as f:
+                return json_loads(f.read())
+        return None
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def get_stats(self):
+        return {
+            "limits": self.limits,
+            "evicted": dict(self.evicted),
+            "archive_dir": self.archive_dir,
+            "sessions_in_memory": self.sessions_in_memory,
+            "sessions_dropped": self.sessions_dropped,
+            "closed_sessions": [s.to_dict() for s in list(self.closed_sessions.values())],
+        }
@@ -0,0 +1,214 @@
+import asyncio
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+
+from app.utils.helpers import json_dumps, json_loads
+
+# File layout: a fixed header followed by the serialized snapshot.
+#   magic (4 bytes) | padding (4) | sequence (u64) | body length (u64)
+# The sequence works as a seqlock: it is odd while the writer is copying a
+# new body in and even once the body is complete.
+MAGIC = b"F1SS"
+HEADER = struct.Struct("<4s4xQQ")
+SEQUENCE_OFFSET = 8
+LENGTH_OFFSET = 16
+HEADER_SIZE = 64
+
+def default_snapshot_path():
+    """A tmpfs-backed path when available, so the snapshot never touches the disk."""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else "/tmp"
+    return os.path.join(directory, f"f1-state-{os.getpid()}.snapshot")
+
+
+class SnapshotWriter:
+    """
+    Publishes serialized snapshots into a memory-mapped file that any number
+    of reader processes map as well. Only one process may write.
+    """
+    INITIAL_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, path, initial_size=None):
+        self.path = path
+        self.sequence = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._map = None
+        self._resize(initial_size or self.INITIAL_SIZE)
+        HEADER.pack_into(self._map, 0, MAGIC, 0, 0)
+
+    def _resize(self, size):
+        if self._map is not None:
+            self._map.close()
+        os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def publish(self, body):
+        """Writes one snapshot body (bytes). Readers never see a half-written body."""
+        needed = HEADER_SIZE + len(body)
+        if needed > len(self._map):
+            # Grow geometrically; readers remap when the length exceeds their mapping
+            self._resize(max(needed, len(self._map) * 2))
+
+        self.sequence += 1  # Odd: write in progress
+        struct.pack_into("<Q", self._map, SEQUENCE_OFFSET, self.sequence)
+        self._map[HEADER_SIZE:needed] = body
+        struct.pack_into("<Q", self._map, LENGTH_OFFSET, len(body))
+        self.sequence += 1  # Even: body complete
+        struct.pack_into("<Q", self._map, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self, unlink=True):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            os.close(self._fd)
+        if unlink:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class SnapshotReader:
+    """
+    Reads the latest complete snapshot published by a SnapshotWriter.
+    Reads never wait for the writer: they run on a worker's event loop.
+    """
+    MAX_ATTEMPTS = 3  # Immediate re-reads (e.g. after the file grew), no sleeping
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._map = None
+
+    def _ensure_mapped(self):
+        """(Re)maps the file if it appeared or grew since the last read."""
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_RDONLY)
+            except FileNotFoundError:
+                return False
+        size = os.fstat(self._fd).st_size
+        if size < HEADER_SIZE:
+            return False
+        if self._map is None or len(self._map) != size:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+        return True
+
+    def sequence(self):
+        """The sequence of the current snapshot (0 if none yet). Cheap enough to call per request."""
+        if not self._ensure_mapped():
+            return 0
+        return struct.unpack_from("<Q", self._map, SEQUENCE_OFFSET)[0]
+
+    def read(self):
+        """
+        Returns (sequence, body) of the latest complete snapshot, or None if
+        nothing has been published yet or a write is in progress. Callers
+        keep what they loaded last and try again later.
+        """
+        for _ in range(self.MAX_ATTEMPTS):
+            if not self._ensure_mapped():
+                return None
+            magic, sequence, length = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or sequence == 0 or sequence % 2:
+                return None
+            if HEADER_SIZE + length > len(self._map):
+                # The writer grew the file; remap on the next attempt
+                continue
+            body = self._map[HEADER_SIZE:HEADER_SIZE + length]
+            if struct.unpack_from("<Q", self._map, SEQUENCE_OFFSET)[0] == sequence:
+                return sequence, body
+            # Torn: a new write started while copying; try the next one
+        return None
+
+
+class SnapshotPublisher:
+    """
+    Runs in the ingest process: whenever any feed version changed, serializes
+    the state together with the feed versions and times and publishes it through a
+    SnapshotWriter, at most once per `interval`.
+    """
+    INTERVAL = 0.1  # Seconds between checks for changes
+
+    def __init__(self, state_manager, writer, interval=None):
+        self.state_manager = state_manager
+        self.writer = writer
+        self.interval = interval or self.INTERVAL
+        self.snapshots_published = 0
+        self.last_body_size = 0
+        self.last_publish_ms = 0.0
+        self._published_versions = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def _run(self):
+        try:
+            while True:
+                self.publish_if_changed()
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            pass
+
+    def publish_if_changed(self):
+        versions = dict(self.state_manager.versions)
+        if versions == self._published_versions:
+            return False
+        started = time.perf_counter()
+        state = self.state_manager.get_full_state()
+        body = json_dumps({
+            "versions": versions,
+            "feed_times": self.state_manager.feed_times,
+            # Includes the latest decoded CarData/Position, for /api/cardata and /api/location
+            "state": state,
+        }).encode("utf-8")
+        self.writer.publish(body)
+        self._published_versions = versions
+        self.snapshots_published += 1
+        self.last_body_size = len(body)
+        self.last_publish_ms = (time.perf_counter() - started) * 1000
+        return True
+
+
+class SnapshotFollower:
+    """
+    Runs in an API worker: keeps a local, read-only StateManager in sync with
+    the shared snapshot. `refresh()` is cheap when nothing changed (one read
+    of the sequence number), so it is called on every request. While a write
+    is in progress it keeps the current state and picks the new one up on a
+    later request.
+    """
+    def __init__(self, reader, state_manager):
+        self.reader = reader
+        self.state_manager = state_manager
+        self.sequence = 0
+
+    def refresh(self):
+        if self.reader.sequence() == self.sequence:
+            return False
+        result = self.reader.read()
+        if result is None:
+            return False
+        sequence, body = result
+        snapshot = json_loads(body)
+        self.state_manager.load_state(snapshot["state"])
+        # Adopt the ingest process's feed versions and times, so cached responses for
+        # feeds that didn't change survive the reload (and bodies and ETags match
+        # across workers); load_state stamped every feed with the local reload time
+        self.state_manager.versions = snapshot["versions"]
+        self.state_manager.feed_times = {
+            feed_name: datetime.fromisoformat(feed_time)
+            for feed_name, feed_time in snapshot.get("feed_times", {}).items()
+        }
+        self.sequence = sequence
+        return True
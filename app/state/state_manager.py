@@ -1,42 +1,110 @@
-from app.utils.helpers import deep_merge
-import json
+import time
+from datetime import datetime, timezone
+
+from app.utils.helpers import deep_merge_changes, effective_changes, json_dumps
+from app.ws.broadcaster import Broadcaster, PROTOCOL_LEGACY, PROTOCOL_DELTA
+from app.ws.delta_stream import DeltaStream
+from app.ws.subscriptions import Subscription
+from app.state.telemetry_store import TelemetryStore
+from app.state.lap_history import LapHistoryIndex
+from app.state.lap_analytics import LapAnalytics
+from app.state.driver_state import DriverTimingIndex
+from app.state.response_cache import ResponseCache
+from app.state.leaderboard import Leaderboard
+from app.state.persistence import StatePersistence
+from app.state.retention import RetentionManager, process_rss_bytes
+from app.utils.metrics import LatencyMetrics
+
+def empty_state():
+    """Returns the state of a session before any data has arrived."""
+    return {
+        "DriverList": {},
+        "TimingData": {},
+        "TimingStats": {},
+        "TimingAppData": {},
+        "CarData": {},
+        "PositionData": {},
+        "RaceControlMessages": [],
+        "TeamRadio": [],
+        "SessionInfo": {},
+        "TrackStatus": {},
+        "WeatherData": {},
+        "LapCount": {"CurrentLap": 0, "TotalLaps": 0},
+        "LapHistory": [],
+        "PitHistory": [],
+        "DriversInPits": {}
+    }
 
 class StateManager:
     """
     Manages the live state of the application.
     This is the single source of truth for all F1 data.
     """
-    def __init__(self):
-        self.state = {
-            "DriverList": {},
-            "TimingData": {},
-            "TimingStats": {},
-            "TimingAppData": {},
-            "CarData": {},
-            "PositionData": {},
-            "RaceControlMessages": [],
-            "TeamRadio": [],
-            "SessionInfo": {},
-            "TrackStatus": {},
-            "WeatherData": {},
-            "LapCount": {"CurrentLap": 0, "TotalLaps": 0},
-            "LapHistory": [],
-            "PitHistory": [],
-            "DriversInPits": {}
-        }
-        self.clients = []
+    def __init__(self, delta_tick_interval=None):
+        self.state = empty_state()
+        # While muted (e.g. fast-forwarding a replay) nothing is broadcast
+        self.muted = False
+        # Per-feed change counters. Anything derived from a feed (e.g. cached
+        # API responses) is valid for as long as that feed's version is unchanged.
+        self.versions = {}
+        # Feed time of the message that last changed each feed, so cached responses
+        # can carry a date that stays true for as long as they are served
+        self.feed_times = {}
+        # Feed time of the message being applied (set by the processor)
+        self.message_time = None
+        self.response_cache = ResponseCache()
+        self.telemetry = TelemetryStore()
+        self.lap_index = LapHistoryIndex(self.state["LapHistory"])
+        self.lap_analytics = LapAnalytics(self, self.state["LapHistory"])
+        # Parsed per-driver timing, kept in sync with TimingData["Lines"]
+        self.driver_timing = DriverTimingIndex()
+        self.leaderboard = Leaderboard(self)
+        # Per-stage latency histograms, exported on /metrics
+        self.metrics = LatencyMetrics()
+        # Epoch time the live frame being processed arrived (None outside live frames)
+        self.frame_received_at = None
+        self.broadcaster = Broadcaster(metrics=self.metrics)
+        self.broadcaster.resync_message = self._resync_message
+        self.delta_stream = DeltaStream(self, tick_interval=delta_tick_interval)
+        self.persistence = None
+        # Per-feed caps and per-session partitions (main.py configures it)
+        self.retention = RetentionManager(self)
+        # Set by the IngestPipeline: broadcasts are then published from their own stage
+        self.publish_stage = None
         print("State Manager initialized.")
 
+    async def enable_persistence(self, directory, processor):
+        """
+        Turns on periodic snapshots plus a raw-frame journal in `directory`.
+        Any state left there by a previous run is restored first, by loading
+        the last snapshot and replaying the journal tail through `processor`.
+        Returns True if state was recovered.
+        """
+        self.persistence = StatePersistence(self, directory)
+        restored = await self.persistence.restore(processor)
+        self.persistence.open()
+        if restored:
+            # Compact the recovered journal into a fresh snapshot right away
+            await self.persistence.snapshot()
+        return restored
+
     def update_state(self, feed_name, new_data):
         """
         Main method to update state based on the feed type.
+        For deep-merged feeds, returns the change set of the merge: a list of
+        `(path, old, new)` for every leaf the update touched (see
+        `deep_merge_changes`). Returns None for every other feed.
         """
+        changes = None
+        started = time.perf_counter()
         try:
             # --- Pattern 1: Deep Merging Feeds ---
             if feed_name in ["TimingData", "TimingAppData", "TimingStats", "TopThree", "DriverList"]:
+                changes = []
                 if isinstance(new_data, dict):
-                    # Use the corrected deep_merge from helpers
-                    self.state[feed_name] = deep_merge(self.state.get(feed_name, {}), new_data)
+                    deep_merge_changes(self.state.setdefault(feed_name, {}), new_data, changes)
+                    if feed_name == "TimingData":
+                        self.driver_timing.apply_changes(self.state[feed_name].get("Lines", {}), changes)
                 # Optional: You could log a warning here if the payload is not a dict
             
             # --- Pattern 2: Append-Only Feeds ---
@@ -72,6 +140,7 @@ class StateManager:
                     # Optional: Add logging here for skipped invalid messages for debugging
                     # else:
                     #     print(f"DEBUG: Skipping invalid RaceControlMessage format: {msg_item}")
+                self.retention.enforce(feed_name)
             
             # --- NEW: Pattern for TeamRadio (Append-Only) ---
             elif feed_name == "TeamRadio":
@@ -88,8 +157,16 @@ class StateManager:
                     captures_to_add.append(new_data)
                 
                 self.state[feed_name].extend(captures_to_add)
+                self.retention.enforce(feed_name)
 
-            # --- Pattern 3: Simple Replacement Feeds ---
+            # --- Pattern 3: Decoded Telemetry Feeds ---
+            # Every sample goes into the columnar store; the state only keeps
+            # the latest message so it never grows.
+            elif feed_name in ["CarData", "Position"]:
+                self.telemetry.add(feed_name, new_data)
+                self.state[feed_name] = new_data
+
+            # --- Pattern 4: Simple Replacement Feeds ---
             else:
                 self.state[feed_name] = new_data
         
@@ -98,27 +175,201 @@ class StateManager:
             # For production, you would want to log this error to a file.
             # print(f"Error updating state for feed '{feed_name}': {e}")
             pass
+        finally:
+            # A merge that rewrote every leaf with its current value changes nothing,
+            # so cached responses for the feed stay valid.
+            if changes is None or effective_changes(changes):
+                self.bump_version(feed_name)
+            self.metrics.observe("merge", feed_name, time.perf_counter() - started)
+        return changes
+
+    def begin_session(self, session_info):
+        """
+        Must be called before applying a SessionInfo. If it starts a new
+        session, the current one is closed (archived by the retention manager)
+        and the state starts empty. Returns True if that happened; callers
+        should then broadcast the full state.
+        """
+        return self.retention.begin_session(session_info)
+
+    def bump_version(self, feed_name):
+        """Marks a feed as changed. Call this after writing to `self.state` directly."""
+        self.versions[feed_name] = self.versions.get(feed_name, 0) + 1
+        self.feed_times[feed_name] = self.message_time or datetime.now(timezone.utc)
+
+    def get_feed_time(self, feed_name):
+        """
+        ISO time of the feed message that last changed `feed_name` (the local
+        time of the change when the message had none).
+        """
+        feed_time = self.feed_times.setdefault(feed_name, datetime.now(timezone.utc))
+        if feed_time.tzinfo is None:
+            feed_time = feed_time.replace(tzinfo=timezone.utc)
+        return feed_time.isoformat()
+
+    def get_versions(self, feed_names):
+        """Returns the current versions of the given feeds as a hashable tuple."""
+        return tuple(self.versions.get(feed_name, 0) for feed_name in feed_names)
 
     def get_full_state(self):
         """Returns the entire current state."""
         return self.state
+
+    def load_state(self, new_state):
+        """
+        Replaces the whole state (e.g. from a checkpoint) and rebuilds
+        everything derived from it: lap index, latest telemetry, leaderboard
+        and feed versions. Callers should broadcast the full state afterwards.
+        """
+        self.state = empty_state()
+        self.state.update(new_state)
+
+        # Pit entry times are datetimes in memory but strings once serialized
+        for pit_entry in self.state["DriversInPits"].values():
+            if isinstance(pit_entry.get("entry_time"), str):
+                pit_entry["entry_time"] = datetime.fromisoformat(pit_entry["entry_time"])
+
+        self.lap_index.rebuild(self.state["LapHistory"])
+        self.lap_analytics.rebuild(self.state["LapHistory"])
+        self.driver_timing.rebuild(self.state["TimingData"].get("Lines", {}))
+        self.telemetry = TelemetryStore(self.telemetry.capacity)
+        for feed_name in ["CarData", "Position"]:
+            if self.state.get(feed_name):
+                self.telemetry.add(feed_name, self.state[feed_name])
+        self.leaderboard = Leaderboard(self)
+        for feed_name in self.state:
+            self.bump_version(feed_name)
+        self.leaderboard.rebuild()
     
     def add_lap_to_history(self, lap_data):
-        """Appends a newly completed lap object to the history."""
+        """Appends a newly completed lap object to the history and indexes it."""
         self.state["LapHistory"].append(lap_data)
+        self.lap_index.add(lap_data)
+        self.lap_analytics.add(lap_data)
+        self.retention.enforce("LapHistory")
+        self.bump_version("LapHistory")
 
     def add_pit_stop_to_history(self, pit_data):
         """Appends a newly completed pit stop object to the history."""
         self.state["PitHistory"].append(pit_data)
+        self.retention.enforce("PitHistory")
+        self.bump_version("PitHistory")
     
-    def add_client(self, websocket):
-        self.clients.append(websocket)
+    @property
+    def clients(self):
+        """The currently connected WebSocket clients."""
+        return list(self.broadcaster.connections.keys())
+
+    async def add_client(self, websocket, send_full_state=False, protocol=PROTOCOL_LEGACY, last_seq=None,
+                         subscription=None, wire_format=None):
+        """
+        Registers a WebSocket client with the broadcaster.
+        Legacy clients with `send_full_state` get the full state before anything else.
+        Delta clients get a snapshot, or only the deltas after `last_seq` on reconnect.
+        The initial messages are never filtered by `subscription`, so every client
+        starts from the complete state. Everything is sent in `wire_format`.
+
+        With an ingest pipeline, messages already merged into the state may still
+        be waiting in the publish stage; they are published first, otherwise the
+        client would get them again on top of a state that already includes them.
+        """
+        if self.publish_stage is not None:
+            await self.publish_stage.drain()
+        if protocol == PROTOCOL_DELTA:
+            self.delta_stream.ensure_running()
+            initial_messages = self.delta_stream.initial_messages(last_seq)
+            if wire_format is not None:
+                initial_messages = [wire_format.encode_text(text) for text in initial_messages]
+        elif send_full_state:
+            initial_messages = [self.broadcaster.encode(self.get_full_state(), wire_format)]
+        else:
+            initial_messages = []
+        connection = self.broadcaster.add_client(websocket, initial_messages, protocol, wire_format)
+        if subscription is not None and not subscription.is_default:
+            connection.subscription = subscription
+        return connection
+
+    async def _resync_message(self, connection):
+        """
+        What a client that overflowed its queue gets instead of the messages it
+        lost: the full state (legacy) or a fresh snapshot (delta), in its wire format.
+        Pending publishes are flushed first, as in `add_client`.
+        """
+        if self.publish_stage is not None:
+            await self.publish_stage.drain()
+        if connection.protocol == PROTOCOL_DELTA:
+            snapshot = self.delta_stream.build_snapshot()
+            return snapshot if connection.wire_format.is_default else connection.wire_format.encode_text(snapshot)
+        return self.broadcaster.encode(self.get_full_state(), connection.wire_format)
+
+    def set_subscription(self, websocket, feeds=None, drivers=None, max_rate=None):
+        """
+        Restricts a client to the given feeds and drivers (None for all) and
+        optionally to `max_rate` updates per second. Returns the Subscription.
+        """
+        subscription = Subscription(feeds, drivers, max_rate)
+        self.broadcaster.set_subscription(websocket, None if subscription.is_default else subscription)
+        return subscription
 
     def remove_client(self, websocket):
-        self.clients.remove(websocket)
+        self.broadcaster.remove_client(websocket)
 
     async def broadcast(self, data):
-        # Convert dictionary to JSON string before sending
-        json_message = json.dumps(data)
-        for client in self.clients:
-            await client.send_text(json_message)
\ No newline at end of file
+        """
+        Serializes the message once and queues it for every client.
+        This never waits on a client's socket, so ingestion is never held up
+        by a slow browser. With an ingest pipeline, the message is handed to
+        its publish stage instead of being serialized here.
+        """
+        if self.muted:
+            return
+        # The arrival time travels with the message, for the glass-to-glass latency
+        received_at = self.frame_received_at
+        if self.publish_stage is not None:
+            await self.publish_stage.put(data, received_at)
+        else:
+            await self._publish(data, received_at)
+
+    async def _publish(self, data, received_at=None):
+        """
+        Typed messages are coalesced into the delta stream; an untyped
+        message is the full state and makes delta clients resync.
+        Then the message is fanned out to legacy clients.
+        """
+        self.delta_stream.ensure_running()
+        if isinstance(data, dict) and "type" in data:
+            self.delta_stream.record(data["type"], data.get("data"), received_at)
+        else:
+            self.delta_stream.resync()
+        await self.broadcaster.broadcast(data, received_at)
+
+    def get_memory_stats(self):
+        """
+        Reports what the process holds: resident memory, the size of every
+        feed (item count and serialized JSON bytes, a proxy for its footprint),
+        the telemetry buffers, caches and the retention policy.
+        """
+        feeds = {}
+        for feed_name, value in self.state.items():
+            feeds[feed_name] = {
+                "items": len(value) if isinstance(value, (list, dict)) else None,
+                "json_bytes": len(json_dumps(value)),
+            }
+        return {
+            "process_rss_bytes": process_rss_bytes(),
+            "feeds": feeds,
+            "telemetry": {
+                "bytes": self.telemetry.memory_bytes(),
+                "capacity_per_driver": self.telemetry.capacity,
+            },
+            "response_cache": self.response_cache.get_stats(),
+            "delta_history": {
+                "entries": len(self.delta_stream.history),
+                "bytes": sum(len(text) for _, text in self.delta_stream.history),
+            },
+            "retention": self.retention.get_stats(),
+        }
+
+    def get_client_stats(self):
+        """Returns queue depth, drop and send latency counters for every client."""
+        return self.broadcaster.get_stats()
\ No newline at end of file
@@ -0,0 +1,239 @@
+import re
+from array import array
+from datetime import datetime, timezone
+
+from app.utils.helpers import lttb_indices, stride_indices
+
+# CarData channel ids as sent by the F1 feed.
+CAR_CHANNELS = {"rpm": "0", "speed": "2", "gear": "3", "throttle": "4", "brake": "5", "drs": "45"}
+
+# Column layouts: (name, array typecode). Timestamps are UTC epoch seconds.
+CAR_COLUMNS = (("timestamp", "d"), ("rpm", "l"), ("speed", "l"), ("gear", "l"),
+               ("throttle", "l"), ("brake", "l"), ("drs", "l"))
+POSITION_COLUMNS = (("timestamp", "d"), ("x", "l"), ("y", "l"), ("z", "l"))
+
+# Fractional seconds of an ISO timestamp (the feed sends 7 digits)
+_FRACTION = re.compile(r"\.(\d+)")
+
+def iso_to_epoch(date_str):
+    """
+    Converts an F1 feed timestamp like '2025-05-25T13:03:21.9163742Z' to epoch seconds.
+    Timestamps without an offset are taken as UTC.
+    The string is normalized first: before Python 3.11, `fromisoformat`
+    rejects a 'Z' suffix and fractions that aren't 3 or 6 digits long.
+    """
+    try:
+        normalized = _FRACTION.sub(lambda match: "." + match.group(1)[:6].ljust(6, "0"), date_str, count=1)
+        if normalized.endswith(("Z", "z")):
+            normalized = normalized[:-1] + "+00:00"
+        parsed = datetime.fromisoformat(normalized)
+    except (ValueError, TypeError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def epoch_to_iso(timestamp):
+    """Converts epoch seconds back to an ISO 8601 UTC string for API responses."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class ColumnarRingBuffer:
+    """
+    A fixed-capacity ring buffer that stores samples column by column in
+    preallocated `array`s. Memory use is fixed at creation time; once full,
+    the oldest samples are overwritten.
+    """
+    def __init__(self, columns, capacity):
+        self.names = tuple(name for name, _ in columns)
+        self.capacity = capacity
+        self.columns = {name: array(typecode, [0]) * capacity for name, typecode in columns}
+        self.start = 0  # Physical index of the oldest sample
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, values):
+        """Appends one sample given as a tuple in column order. O(1)."""
+        index = (self.start + self.count) % self.capacity
+        for name, value in zip(self.names, values):
+            self.columns[name][index] = value
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def _physical(self, logical_index):
+        return (self.start + logical_index) % self.capacity
+
+    def row(self, logical_index):
+        """Returns the sample at a chronological index as a dict."""
+        index = self._physical(logical_index)
+        return {name: self.columns[name][index] for name in self.names}
+
+    def latest(self):
+        """Returns the newest sample, or None if the buffer is empty. O(1)."""
+        if not self.count:
+            return None
+        return self.row(self.count - 1)
+
+    def column(self, name, start=0, stop=None):
+        """
+        Returns the chronological slice [start, stop) of one column as an
+        `array`. At most two contiguous copies are made, even when wrapped.
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return array(self.columns[name].typecode)
+        data = self.columns[name]
+        first, last = self._physical(start), self._physical(stop - 1)
+        if first <= last:
+            return data[first:last + 1]
+        return data[first:] + data[:last + 1]
+
+    def bisect(self, timestamp, right=False):
+        """
+        Binary search over the timestamp column (samples arrive in time order).
+        Returns the first chronological index whose timestamp is >= `timestamp`,
+        or > `timestamp` when `right` is True.
+        """
+        timestamps = self.columns["timestamp"]
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            value = timestamps[self._physical(middle)]
+            if value < timestamp or (right and value == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def index_range(self, start_time=None, end_time=None):
+        """Returns the chronological [start, stop) indices covering a time window. O(log n)."""
+        start = self.bisect(start_time) if start_time is not None else 0
+        stop = self.bisect(end_time, right=True) if end_time is not None else self.count
+        return start, max(start, stop)
+
+    def rows(self, start=0, stop=None):
+        """Returns the chronological slice [start, stop) as a list of dicts."""
+        sliced = {name: self.column(name, start, stop) for name in self.names}
+        return [dict(zip(self.names, values)) for values in zip(*sliced.values())]
+
+    def memory_bytes(self):
+        return sum(data.itemsize * len(data) for data in self.columns.values())
+
+
+class TelemetryStore:
+    """
+    Holds decoded CarData and Position samples per driver in columnar ring
+    buffers, so the latest sample is an O(1) read and time windows are cheap
+    slices instead of ever-growing nested dicts.
+    """
+    CAPACITY = 16384  # Samples kept per driver per stream (~1 hour of CarData)
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or self.CAPACITY
+        self.car_data = {}  # driver_number (int) -> ColumnarRingBuffer
+        self.positions = {}
+
+    def _buffer(self, buffers, driver_number, columns):
+        buffer = buffers.get(driver_number)
+        if buffer is None:
+            buffer = buffers[driver_number] = ColumnarRingBuffer(columns, self.capacity)
+        return buffer
+
+    def add_car_data(self, car_data):
+        """Appends every sample of a decoded CarData message. Returns the sample count."""
+        added = 0
+        for entry in car_data.get("Entries", []) if isinstance(car_data, dict) else []:
+            timestamp = iso_to_epoch(entry.get("Utc"))
+            if timestamp is None:
+                continue
+            for driver_number, telemetry in entry.get("Cars", {}).items():
+                channels = telemetry.get("Channels", {})
+                self._buffer(self.car_data, int(driver_number), CAR_COLUMNS).append((
+                    timestamp,
+                    channels.get(CAR_CHANNELS["rpm"], 0),
+                    channels.get(CAR_CHANNELS["speed"], 0),
+                    channels.get(CAR_CHANNELS["gear"], 0),
+                    channels.get(CAR_CHANNELS["throttle"], 0),
+                    channels.get(CAR_CHANNELS["brake"], 0),
+                    channels.get(CAR_CHANNELS["drs"], 0),
+                ))
+                added += 1
+        return added
+
+    def add_positions(self, position_data):
+        """Appends every sample of a decoded Position message. Returns the sample count."""
+        added = 0
+        for snapshot in position_data.get("Position", []) if isinstance(position_data, dict) else []:
+            timestamp = iso_to_epoch(snapshot.get("Timestamp"))
+            if timestamp is None:
+                continue
+            for driver_number, location in snapshot.get("Entries", {}).items():
+                self._buffer(self.positions, int(driver_number), POSITION_COLUMNS).append((
+                    timestamp,
+                    location.get("X", 0),
+                    location.get("Y", 0),
+                    location.get("Z", 0),
+                ))
+                added += 1
+        return added
+
+    def add(self, feed_name, decoded_data):
+        """Routes a decoded `.z` feed to the right stream. Returns False for other feeds."""
+        if feed_name == "CarData":
+            self.add_car_data(decoded_data)
+        elif feed_name == "Position":
+            self.add_positions(decoded_data)
+        else:
+            return False
+        return True
+
+    def latest_car_data(self):
+        """Returns {driver_number: newest CarData sample}."""
+        return {driver: buffer.latest() for driver, buffer in self.car_data.items() if len(buffer)}
+
+    def latest_positions(self):
+        """Returns {driver_number: newest Position sample}."""
+        return {driver: buffer.latest() for driver, buffer in self.positions.items() if len(buffer)}
+
+    def query(self, buffers, driver_number=None, start_time=None, end_time=None,
+              max_points=None, downsample_by=None):
+        """
+        Returns {driver_number: [sample, ...]} for a time window.
+        The window is located by binary search, and each driver's samples are
+        reduced to at most `max_points`: with LTTB over the `downsample_by`
+        column when given, otherwise with evenly spaced picks.
+        """
+        if driver_number is not None:
+            selected = {driver_number: buffers[driver_number]} if driver_number in buffers else {}
+        else:
+            selected = buffers
+
+        results = {}
+        for driver, buffer in selected.items():
+            start, stop = buffer.index_range(start_time, end_time)
+            if max_points is not None and stop - start > max_points:
+                if downsample_by:
+                    indices = lttb_indices(buffer.column("timestamp", start, stop),
+                                           buffer.column(downsample_by, start, stop), max_points)
+                else:
+                    indices = stride_indices(stop - start, max_points)
+                results[driver] = [buffer.row(start + i) for i in indices]
+            else:
+                results[driver] = buffer.rows(start, stop)
+        return results
+
+    def query_car_data(self, driver_number=None, start_time=None, end_time=None, max_points=None):
+        """CarData samples in a window, downsampled so speed traces keep their shape."""
+        return self.query(self.car_data, driver_number, start_time, end_time, max_points, downsample_by="speed")
+
+    def query_positions(self, driver_number=None, start_time=None, end_time=None, max_points=None):
+        """Position samples in a window, downsampled with evenly spaced picks."""
+        return self.query(self.positions, driver_number, start_time, end_time, max_points)
+
+    def memory_bytes(self):
+        buffers = list(self.car_data.values()) + list(self.positions.values())
+        return sum(buffer.memory_bytes() for buffer in buffers)
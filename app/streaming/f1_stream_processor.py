@@ -1,13 +1,15 @@
 import aiohttp
 import asyncio
+import concurrent.futures
 import json
 import base64
 import zlib
 import urllib.parse
 from datetime import datetime, timedelta, timezone
 import os
+import time
 
-from app.utils.helpers import safe_to_float, time_string_to_seconds, deep_merge
+from app.utils.helpers import safe_to_float, time_string_to_seconds, json_loads, effective_changes, changes_to_patch
 
 # NEW: A dictionary mapping circuit short names to their official lap counts
 GRAND_PRIX_LAPS = {
@@ -37,23 +39,128 @@ GRAND_PRIX_LAPS = {
     "Baku": 51
 }
 
+def inflate_compressed(data_to_process):
+    """
+    Decodes and decompresses a ".z" payload to its JSON bytes, or None.
+    It robustly handles data that is either a Base64 string or raw bytes.
+    Base64 and zlib release the GIL, so this is worth running on a thread.
+    """
+    try:
+        binary_data = None
+        if isinstance(data_to_process, str):
+            # If it's a string, it needs to be decoded from Base64 first.
+            binary_data = base64.b64decode(data_to_process)
+        elif isinstance(data_to_process, bytes):
+            # If it's already bytes, we can use it directly.
+            binary_data = data_to_process
+        else:
+            return None
+
+        # Decompress the raw binary data
+        return zlib.decompress(binary_data, -zlib.MAX_WBITS)
+    except Exception:
+        # Fail silently if data is not valid for any reason
+        return None
+
+def parse_inflated(decompressed_bytes):
+    """Parses the output of `inflate_compressed`, or returns None."""
+    if decompressed_bytes is None:
+        return None
+    try:
+        return json_loads(decompressed_bytes)
+    except ValueError:
+        return None
+
+def decode_compressed(data_to_process):
+    """
+    Decodes, decompresses and parses a ".z" payload (None if it isn't valid).
+    Lives at module level so it can also run in a worker process.
+    """
+    return parse_inflated(inflate_compressed(data_to_process))
+
 class F1StreamProcessor:
     """
     Connects to the F1 SignalR feed, or replays from a file, processes the messages,
     and updates the state via the StateManager.
     """
-    F1_BASE_URL = "livetiming.formula1.com/signalr"
+    F1_BASE_URL = "https://livetiming.formula1.com/signalr"
     SIGNALR_HUB = '[{"name":"Streaming"}]'
 
     # Auto-reconnect configuration
     MAX_RETRY_DELAY = 600  # Max delay between retries in seconds (e.g., 10 minutes)
     INITIAL_RETRY_DELAY = 5 # Initial delay in seconds
 
-    def __init__(self, state_manager):
+    # Frames and ".z" payloads at least this long are handed to the decode pool,
+    # if one is set: a process pool inflates and parses them, a thread pool only
+    # inflates ".z" payloads (JSON parsing holds the GIL, so it gains nothing on a thread).
+    DECODE_OFFLOAD_THRESHOLD = 64 * 1024
+
+    def __init__(self, state_manager, base_url=None, quiet=False):
         self.state_manager = state_manager
+        self.quiet = quiet  # Skip the per-message logging (laps, pits, snapshots)
+        # Another SignalR endpoint to connect to in LIVE mode, e.g. a local fake feed
+        self.base_url = (base_url or self.F1_BASE_URL).rstrip("/")
+        if "://" not in self.base_url:
+            self.base_url = f"https://{self.base_url}"
         self.session = None
+        self.replay_engine = None
+        self.recorder = None  # Optional FeedRecorder archiving every raw frame
+        self.pipeline = None  # Optional IngestPipeline; frames are processed inline without one
+        self.publisher = None  # Optional FeedPublisher fanning raw frames out to follower nodes
+        self.decode_executor = None
+        self.decode_pool_kind = None
+        self.decode_offload_threshold = self.DECODE_OFFLOAD_THRESHOLD
         print("F1 Stream Processor initialized.")
 
+    def _log(self, message):
+        if not self.quiet:
+            print(message)
+
+    def set_decode_pool(self, kind="thread", max_workers=None, threshold=None):
+        """
+        Decodes large payloads in a worker pool instead of on the event loop.
+        `kind` is "thread" (cheap, but only inflating runs there, since zlib
+        releases the GIL and JSON parsing doesn't) or "process" (inflating and
+        parsing, without GIL contention, but results are pickled back).
+        Anything else disables it.
+        """
+        self.close_decode_pool()
+        if threshold is not None:
+            self.decode_offload_threshold = threshold
+        if kind == "thread":
+            self.decode_executor = concurrent.futures.ThreadPoolExecutor(max_workers or 2, thread_name_prefix="f1-decode")
+        elif kind == "process":
+            self.decode_executor = concurrent.futures.ProcessPoolExecutor(max_workers or 2)
+        else:
+            return
+        self.decode_pool_kind = kind
+        print(f"Decoding payloads over {self.decode_offload_threshold} bytes in a {kind} pool.")
+
+    def close_decode_pool(self):
+        if self.decode_executor is not None:
+            self.decode_executor.shutdown(wait=False)
+            self.decode_executor = None
+            self.decode_pool_kind = None
+
+    async def _offload(self, function, data, on_threads=True):
+        """
+        Runs `function(data)` in the decode pool if `data` is large enough,
+        otherwise inline. Functions that hold the GIL pass `on_threads=False`
+        and only leave the event loop for a process pool.
+        """
+        if self.decode_executor is not None and isinstance(data, (str, bytes)) \
+                and len(data) >= self.decode_offload_threshold \
+                and (on_threads or self.decode_pool_kind != "thread"):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.decode_executor, function, data)
+        return function(data)
+
+    async def _decode(self, data):
+        """`decode_compressed`, with the inflating (and in a process pool, the parsing) offloaded."""
+        if self.decode_pool_kind == "thread":
+            return parse_inflated(await self._offload(inflate_compressed, data))
+        return await self._offload(decode_compressed, data)
+
     async def connect_and_process_live(self):
         """
         Establishes a LIVE connection to the F1 SignalR feed with auto-reconnect logic.
@@ -71,7 +178,7 @@ class F1StreamProcessor:
                 self.session = aiohttp.ClientSession()
 
                 # Step 1: Negotiate
-                negotiate_url = f"https://{self.F1_BASE_URL}/negotiate?clientProtocol=1.5&connectionData={hub_encoded}"
+                negotiate_url = f"{self.base_url}/negotiate?clientProtocol=1.5&connectionData={hub_encoded}"
                 async with self.session.get(negotiate_url, headers=headers) as resp:
                     resp.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
                     data = await resp.json()
@@ -80,14 +187,17 @@ class F1StreamProcessor:
                         raise ConnectionError("Failed to get connection token during negotiation.")
 
                 # Step 2: WebSocket Connection
+                # http(s):// -> ws(s)://
                 ws_url = (
-                    f"wss://{self.F1_BASE_URL}/connect?clientProtocol=1.5&transport=webSockets&"
+                    f"ws{self.base_url[4:]}/connect?clientProtocol=1.5&transport=webSockets&"
                     f"connectionToken={urllib.parse.quote(token)}&connectionData={hub_encoded}"
                 )
 
                 async with self.session.ws_connect(ws_url, headers=headers, max_msg_size=0) as ws:
                     print("Successfully connected to F1 WebSocket. Listening for data...")
                     retry_delay = self.INITIAL_RETRY_DELAY # Reset delay on successful connection
+                    if self.recorder:
+                        self.recorder.new_segment()  # Each archive starts with this connection's "R" snapshot
                     await self._subscribe(ws)
                     await self._listen(ws) # This will block until the WebSocket closes or errors
 
@@ -108,56 +218,47 @@ class F1StreamProcessor:
     async def replay_from_file(self, filepath="monaco-race-data.jsonl", speed=1.0):
         """
         Reads data from a log file and processes it to simulate a live session.
-        A higher speed value will make the replay faster.
+        A higher speed value will make the replay faster; a speed of 0 (or less)
+        processes the file as fast as possible.
+        Returns the ReplayEngine, which can seek, pause and change speed at runtime.
         """
-        print(f"--- Starting replay from file: {filepath} ---")
-        if not os.path.exists(filepath):
-            print(f"Error: Replay file not found at '{filepath}'")
-            return
+        # Imported here because the replay engine drives this processor
+        from app.streaming.replay_engine import ReplayEngine
 
-        last_message_time = None
-        with open(filepath, 'r') as f:
-            for line in f:
-                try:
-                    log_entry = json.loads(line)
-                    
-                    # --- Simulate real-world timing ---
-                    current_message_time = datetime.fromisoformat(log_entry['timestamp'])
-                    if last_message_time:
-                        delay = (current_message_time - last_message_time).total_seconds()
-                        if delay > 0:
-                            await asyncio.sleep(delay / speed)
-                    last_message_time = current_message_time
-                    
-                    # --- Process the data based on its type ---
-                    message_type = log_entry.get("type")
-                    raw_data = log_entry.get("data")
-
-                    if message_type == "text":
-                        # For text messages, the 'data' field is a JSON string
-                        # which our processor already handles.
-                        await self._process_message(raw_data, current_message_time)
-                    elif message_type == "binary":
-                        # For binary, the 'data' is a Base64 string.
-                        decoded = self._decode_and_decompress(raw_data)
-                        if decoded:
-                            # NOTE: This part makes an assumption. We don't know the 'feed_name'
-                            # from a pure binary message, so we must infer it.
-                            # We'll assume 'CarData' for now as it's a likely candidate.
-                            self.state_manager.update_state("CarData", decoded)
-                            await self.state_manager.broadcast({
-                                "type": "CarData",
-                                "data": decoded
-                            })
-
-                    print(">", end="", flush=True)
-                except json.JSONDecodeError:
-                    print(f"\nWarning: Skipping line, could not parse as JSON: {line.strip()}")
-                except Exception as e:
-                    print(f"\nAn error occurred during replay: {e}")
+        self.replay_engine = ReplayEngine(self, filepath, speed=speed)
+        await self.replay_engine.run()
+        return self.replay_engine
 
+    async def _process_log_entry(self, log_entry, message_time):
+        """
+        Processes one `{"timestamp", "type", "data"}` entry of a replay file
+        or journal. Binary data may be a Base64 string or raw bytes.
+        """
+        message_type = log_entry.get("type")
+        raw_data = log_entry.get("data")
 
-        print("\n--- Replay finished ---")
+        # Feeds changed by this entry are stamped with its time
+        self.state_manager.message_time = message_time
+        try:
+            if message_type == "text":
+                # For text messages, the 'data' field is a JSON string
+                # which our processor already handles.
+                await self._process_message(raw_data, message_time)
+            elif message_type == "binary":
+                # For binary, the 'data' is a Base64 string.
+                with self.state_manager.metrics.timer("decode", "CarData"):
+                    decoded = await self._decode(raw_data)
+                if decoded:
+                    # NOTE: This part makes an assumption. We don't know the 'feed_name'
+                    # from a pure binary message, so we must infer it.
+                    # We'll assume 'CarData' for now as it's a likely candidate.
+                    self.state_manager.update_state("CarData", decoded)
+                    await self.state_manager.broadcast({
+                        "type": "CarData",
+                        "data": decoded
+                    })
+        finally:
+            self.state_manager.message_time = None
 
     async def _subscribe(self, ws):
         """
@@ -179,32 +280,83 @@ class F1StreamProcessor:
     async def _listen(self, ws):
         """
         Listens for incoming messages and passes them to the processor.
+        With an ingest pipeline this only timestamps, persists and queues each frame,
+        so the socket keeps being read while earlier frames are processed.
         """
         async for msg in ws:
             message_received_time = datetime.now(timezone.utc)
+            handle_frame = self.pipeline.submit_frame if self.pipeline else self._handle_raw_frame
             if msg.type == aiohttp.WSMsgType.TEXT:
-                await self._process_message(msg.data, message_received_time)
+                await handle_frame("text", msg.data, message_received_time)
             elif msg.type == aiohttp.WSMsgType.BINARY:
                 # If we get a raw binary message, we can process it directly
-                decoded = self._decode_and_decompress(msg.data)
-                if decoded:
-                    # We would need a way to know which feed this belongs to.
-                    # For now, let's assume 'CarData' as an example.
-                    self.state_manager.update_state("CarData", decoded)
-                    await self.state_manager.broadcast({
-                        "type": "CarData",
-                        "data": decoded
-                    })
+                await handle_frame("binary", msg.data, message_received_time)
             elif msg.type == aiohttp.WSMsgType.ERROR:
                 print(f"WebSocket error: {ws.exception()}")
                 break
         print("Listener stopped.")
 
+    async def _handle_raw_frame(self, message_type, raw_data, received_time):
+        """
+        Handles one raw live frame inline: persists it (see `_persist_raw_frame`),
+        then processes it (see `_process_raw_frame`).
+        """
+        await self._persist_raw_frame(message_type, raw_data, received_time)
+        await self._process_raw_frame(message_type, raw_data, received_time)
+
+    async def _wait_until_processed(self):
+        """Waits until every frame read so far has been applied to the state (immediate without a pipeline)."""
+        if self.pipeline:
+            await self.pipeline.process_stage.drain()
+
+    async def _persist_raw_frame(self, message_type, raw_data, received_time):
+        """
+        Hands a raw live frame to the session recorder, follower nodes and the
+        crash recovery journal (whichever are enabled). With an ingest pipeline
+        this runs as the frame is read, before it is queued, so a lossy
+        overflow policy never drops a frame from the archive or the journal.
+
+        Snapshots (for followers and for recovery) must hold the state right
+        before this frame, so when one is due the queued frames are processed first.
+        """
+        persistence = self.state_manager.persistence
+        publisher_snapshot_due = self.publisher is not None and self.publisher.snapshot_due()
+        persistence_snapshot_due = persistence is not None and persistence.snapshot_due()
+        if publisher_snapshot_due or persistence_snapshot_due:
+            await self._wait_until_processed()
+
+        if self.recorder:
+            self.recorder.record(message_type, raw_data, received_time)
+
+        if self.publisher:
+            if publisher_snapshot_due:
+                self.publisher.publish_snapshot(self.state_manager.get_full_state())
+            self.publisher.publish_frame(message_type, raw_data, received_time)
+
+        if persistence:
+            if persistence_snapshot_due:
+                # Every frame journaled so far is in this snapshot; this one starts the new segment
+                await persistence.snapshot()
+            persistence.record_frame(message_type, raw_data, received_time)
+
+    async def _process_raw_frame(self, message_type, raw_data, received_time):
+        """Applies a raw live frame to the state (the pipeline's process stage)."""
+        # Everything broadcast while this frame is processed is attributed to its arrival
+        received_at = received_time.timestamp()
+        self.state_manager.frame_received_at = received_at
+        self.state_manager.metrics.observe("receive", "frame", max(0.0, time.time() - received_at))
+
+        try:
+            await self._process_log_entry({"type": message_type, "data": raw_data}, received_time)
+        finally:
+            self.state_manager.frame_received_at = None
+
     async def _process_message(self, raw_data_string, timestamp=None):
         """
         Processes a raw JSON string message from the WebSocket.
         """
-        data = json.loads(raw_data_string)
+        with self.state_manager.metrics.timer("decode", "frame"):
+            data = await self._offload(json_loads, raw_data_string, on_threads=False)
 
         if "R" in data:
             await self._handle_snapshot(data["R"])
@@ -215,11 +367,13 @@ class F1StreamProcessor:
         """
         Processes the large initial state snapshot ("R" message).
         """
-        print("\nProcessing initial state snapshot...")
+        self._log("\nProcessing initial state snapshot...")
+        # A snapshot of another session (e.g. FP2 after FP1) replaces the current one
+        self.state_manager.begin_session(snapshot_data.get("SessionInfo"))
         for feed_name, feed_data in snapshot_data.items():
             if feed_name.endswith(".z"):
                 clean_feed_name = feed_name[:-2]
-                decoded_data = self._decode_and_decompress(feed_data)
+                decoded_data = await self._decode(feed_data)
                 if decoded_data:
                     # --- NEW LOGIC (for compressed data) ---
                     # If we find SessionInfo, set the total laps from our map
@@ -245,29 +399,30 @@ class F1StreamProcessor:
                 if feed_name != "LapCount":
                     self.state_manager.update_state(feed_name, feed_data)
 
+        self.state_manager.leaderboard.rebuild()
         full_state = self.state_manager.get_full_state()
         await self.state_manager.broadcast(full_state)
-        print("Initial state snapshot processed and broadcasted.")
+        self._log("Initial state snapshot processed and broadcasted.")
 
-    async def _check_and_record_laps(self, timing_data_update, message_timestamp_str):
+    async def _check_and_record_laps(self, changes, message_timestamp_str):
         """
-        Checks a TimingData update to see if any laps have been completed.
+        Checks the change set of a TimingData merge to see if any laps have been completed.
         If so, it constructs a lap record and saves it to history.
         This version correctly parses M:S.ms time strings and calculates start time.
         """
-        if "Lines" not in timing_data_update:
-            return
-
-        for driver_number, update_payload in timing_data_update["Lines"].items():
-            last_lap_time_str = update_payload.get("LastLapTime", {}).get("Value")
+        for path, _, last_lap_time_str in changes:
+            # Every LastLapTime value the update touched, even a repeated one, completes a lap
+            if len(path) != 4 or path[0] != "Lines" or path[2:] != ("LastLapTime", "Value"):
+                continue
+            driver_number = path[1]
 
             if last_lap_time_str:
                 lap_duration_seconds = time_string_to_seconds(last_lap_time_str)
                 if lap_duration_seconds is None:
                     continue
 
-                driver_state_before_update = self.state_manager.state["TimingData"].get("Lines", {}).get(driver_number, {}).copy()
-                fully_merged_driver_data = deep_merge(driver_state_before_update, update_payload)
+                # The update has already been merged into the state, so read the line in place
+                fully_merged_driver_data = self.state_manager.state["TimingData"].get("Lines", {}).get(driver_number, {})
                 
                 lap_number = fully_merged_driver_data.get("NumberOfLaps")
                 if not lap_number: continue
@@ -305,34 +460,35 @@ class F1StreamProcessor:
                 self.state_manager.add_lap_to_history(lap_record)
 
                 # --- ADD THIS DEBUG PRINT ---
-                print(f"DEBUG: Recorded Lap {lap_number} for Driver {driver_number}. Data: {lap_record}")
+                self._log(f"DEBUG: Recorded Lap {lap_number} for Driver {driver_number}. Data: {lap_record}")
 
                 await self.state_manager.broadcast({"type": "NewLap", "data": lap_record})
                 # print(f"\nLap {lap_number} for driver {driver_number} recorded...")
                 # print(f"\nLap {lap_number} for driver {driver_number} recorded with duration {lap_duration}s.")
     
-    async def _check_and_record_pits(self, timing_data_update, timestamp=None):
+    async def _check_and_record_pits(self, changes, timestamp=None):
         """
-        Checks a TimingData update for pit stop events.
+        Checks the change set of a TimingData merge for pit stop events.
         """
-        if "Lines" not in timing_data_update:
-            return
-        
         # --- FIX: Use the provided timestamp, or fall back to now() ---
         event_time = timestamp if timestamp else datetime.now(timezone.utc)
 
-        for driver_number, update in timing_data_update["Lines"].items():
+        for path, _, value in changes:
+            if len(path) != 3 or path[0] != "Lines" or value is not True:
+                continue
+            driver_number, field = path[1], path[2]
+
             # Check for a driver entering the pits
-            if update.get("InPit") is True:
+            if field == "InPit":
                 # Record the entry time and lap number
                 self.state_manager.state["DriversInPits"][driver_number] = {
                     "entry_time": datetime.now(timezone.utc),
                     "lap_number": self.state_manager.state["TimingData"]["Lines"].get(driver_number, {}).get("NumberOfLaps", 0) + 1
                 }
-                print(f"\nDriver {driver_number} entered pits.")
+                self._log(f"\nDriver {driver_number} entered pits.")
 
             # Check for a driver exiting the pits
-            if update.get("PitOut") is True:
+            if field == "PitOut":
                 if driver_number in self.state_manager.state["DriversInPits"]:
                     pit_entry_data = self.state_manager.state["DriversInPits"].pop(driver_number)
                     # Make sure both times are timezone-aware before subtracting
@@ -353,7 +509,7 @@ class F1StreamProcessor:
                     self.state_manager.add_pit_stop_to_history(pit_record)
                     await self.state_manager.broadcast({"type": "NewPitStop", "data": pit_record})
                     # print(f"\nPit stop for driver {driver_number} recorded...")
-                    print(f"\nPit stop for driver {driver_number} recorded with duration {pit_duration}s.")
+                    self._log(f"\nPit stop for driver {driver_number} recorded with duration {pit_duration}s.")
 
     async def _handle_feed_update(self, feed_updates, timestamp=None):
         """
@@ -370,41 +526,50 @@ class F1StreamProcessor:
 
                 if feed_name == "TimingData":
                     # First, update the main state with the new TimingData.
-                    self.state_manager.update_state(feed_name, payload)
+                    changes = self.state_manager.update_state(feed_name, payload)
                     
                     # 1. First, get the correct TotalLaps that we've already stored in our state.
                     #    This defines the variable and resolves the error.
                     known_total_laps = self.state_manager.state.get("LapCount", {}).get("TotalLaps", 0)
 
-                    # Next, calculate the true current lap from the driver data.
-                    all_drivers_timing = self.state_manager.state.get("TimingData", {}).get("Lines", {})
-                    max_laps_completed = 0
-                    if all_drivers_timing:
-                        for driver_data in all_drivers_timing.values():
-                            laps = driver_data.get("NumberOfLaps", 0)
-                            if laps > max_laps_completed:
-                                max_laps_completed = laps
+                    # Next, calculate the true current lap from the (pre-parsed) driver data.
+                    max_laps_completed = max(
+                        (driver.number_of_laps or 0 for driver in self.state_manager.driver_timing.values()),
+                        default=0
+                    )
                     
                     # The current lap is the highest completed lap + 1.
                     current_lap = max_laps_completed + 1 if max_laps_completed > 0 else 1
 
                      # Then we build our own, correct LapCount object and broadcast it
                     correct_lap_data = { "CurrentLap": current_lap, "TotalLaps": known_total_laps }
-                    self.state_manager.state["LapCount"] = correct_lap_data
+                    # It only changes once per lap, so don't re-send it with every TimingData update
+                    if correct_lap_data != self.state_manager.state.get("LapCount"):
+                        self.state_manager.state["LapCount"] = correct_lap_data
+                        self.state_manager.bump_version("LapCount")
 
-                    # Now, broadcast the complete, corrected LapCount object.
-                    await self.state_manager.broadcast({
-                        "type": "LapCount",
-                        "data": correct_lap_data
-                    })
+                        # Now, broadcast the complete, corrected LapCount object.
+                        await self.state_manager.broadcast({
+                            "type": "LapCount",
+                            "data": correct_lap_data
+                        })
 
                     # Pass the timestamp to both pit and lap recording functions
-                    await self._check_and_record_pits(payload, timestamp)
-                    await self._check_and_record_laps(payload, timestamp_str) # This was a missing call
-                    
-                    await self.state_manager.broadcast({"type": "TimingData", "data": payload})
+                    with self.state_manager.metrics.timer("derive", "TimingData"):
+                        await self._check_and_record_pits(changes, timestamp)
+                        await self._check_and_record_laps(changes, timestamp_str) # This was a missing call
+
+                    # Clients and the leaderboard only need the leaves that actually changed
+                    changed = effective_changes(changes)
+                    if changed:
+                        await self.state_manager.broadcast({"type": "TimingData", "data": changes_to_patch(changed)})
+                    await self._update_leaderboard({path[1] for path, _, _ in changed if path[0] == "Lines" and len(path) > 1})
                 
                 elif feed_name == "SessionInfo":
+                    # A new session starts from an empty state; the old one is archived
+                    if self.state_manager.begin_session(payload):
+                        await self.state_manager.broadcast(self.state_manager.get_full_state())
+
                     # This dedicated block for SessionInfo is correct.
                     circuit_short_name = payload.get("Meeting", {}).get("Circuit", {}).get("ShortName")
                     if circuit_short_name:
@@ -421,8 +586,18 @@ class F1StreamProcessor:
                 elif feed_name == "LapCount":
                     pass # Intentionally do nothing
 
+                # Compressed telemetry (CarData.z, Position.z) is inflated and stored
+                # under its clean name, instead of keeping the raw base64 blob, and
+                # pushed decoded (packed into numeric columns for msgpack clients).
+                elif feed_name.endswith(".z"):
+                    with self.state_manager.metrics.timer("decode", feed_name):
+                        decoded_data = await self._decode(payload)
+                    if decoded_data:
+                        self.state_manager.update_state(feed_name[:-2], decoded_data)
+                        await self.state_manager.broadcast({"type": feed_name[:-2], "data": decoded_data})
+
                 else:
-                    self.state_manager.update_state(feed_name, payload)
+                    changes = self.state_manager.update_state(feed_name, payload)
                     if feed_name == "RaceControlMessages":
                         await self.state_manager.broadcast({
                             "type": "RaceControlMessages",
@@ -442,25 +617,29 @@ class F1StreamProcessor:
                             "data": payload
                         })
 
+                    # Tyres and driver details also show up on the leaderboard
+                    if feed_name == "TimingAppData" and changes:
+                        await self._update_leaderboard({path[1] for path, _, _ in effective_changes(changes)
+                                                        if path[0] == "Lines" and len(path) > 1})
+                    elif feed_name == "DriverList" and changes:
+                        await self._update_leaderboard({path[0] for path, _, _ in effective_changes(changes)})
+
+    async def _update_leaderboard(self, driver_numbers):
+        """
+        Patches the materialized leaderboard for the drivers present in an
+        update and pushes only the rows that changed as a "Leaderboard" message.
+        """
+        with self.state_manager.metrics.timer("derive", "Leaderboard"):
+            changed_rows = self.state_manager.leaderboard.update(driver_numbers)
+        if changed_rows:
+            await self.state_manager.broadcast({
+                "type": "Leaderboard",
+                "data": changed_rows
+            })
+
     def _decode_and_decompress(self, data_to_process):
         """
-        Decodes and decompresses data.
-        It robustly handles data that is either a Base64 string or raw bytes.
+        Decodes and decompresses data on the calling thread.
+        See `decode_compressed`.
         """
-        try:
-            binary_data = None
-            if isinstance(data_to_process, str):
-                # If it's a string, it needs to be decoded from Base64 first.
-                binary_data = base64.b64decode(data_to_process)
-            elif isinstance(data_to_process, bytes):
-                # If it's already bytes, we can use it directly.
-                binary_data = data_to_process
-            else:
-                return None
-
-            # Decompress the raw binary data
-            decompressed_bytes = zlib.decompress(binary_data, -zlib.MAX_WBITS)
-            return json.loads(decompressed_bytes.decode('utf-8'))
-        except Exception:
-            # Fail silently if data is not valid for any reason
-            return None
\ No newline at end of file
+        return decode_compressed(data_to_process)
\ No newline at end of file
@@ -0,0 +1,189 @@
+import asyncio
+import time
+
+# What a stage does when a producer hands it an item and its queue is full.
+OVERFLOW_BLOCK = "block"              # Producer waits for room (lossless backpressure)
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # Oldest queued item is discarded (lossy)
+OVERFLOW_DROP_NEWEST = "drop_newest"  # Incoming item is discarded (lossy)
+OVERFLOW_POLICIES = {OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST}
+
+class PipelineStage:
+    """
+    One stage of the ingest pipeline: a bounded queue drained in order by a
+    single worker task that awaits `handler(*item)` for every item.
+
+    Tracks queue depth, how long items waited in the queue and how long the
+    handler took, so a stage that falls behind is easy to spot.
+    """
+    def __init__(self, name, handler, max_size, overflow=OVERFLOW_BLOCK):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}' (expected one of {sorted(OVERFLOW_POLICIES)})")
+        self.name = name
+        self.handler = handler
+        self.overflow = overflow
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self._task = None
+
+        # --- Counters ---
+        self.items_in = 0
+        self.items_processed = 0
+        self.items_dropped = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_service = 0.0
+        self.max_service = 0.0
+        self.producer_blocked = 0.0  # Seconds producers spent waiting for room
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=None):
+        """Waits up to `timeout` seconds for the queue to drain, then stops the worker."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Warning: pipeline stage '{self.name}' stopped with {self.queue.qsize()} items pending.")
+        self._task.cancel()
+        self._task = None
+
+    async def drain(self):
+        """Waits until every item queued so far (and any queued meanwhile) has been handled."""
+        await self.queue.join()
+
+    async def put(self, *item):
+        """Hands one item to the stage, applying the overflow policy if the queue is full."""
+        self.items_in += 1
+        if self.queue.full():
+            if self.overflow == OVERFLOW_DROP_NEWEST:
+                self.items_dropped += 1
+                return False
+            if self.overflow == OVERFLOW_DROP_OLDEST:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    self.items_dropped += 1
+                except asyncio.QueueEmpty:
+                    pass
+
+        if self.queue.full():
+            started = time.perf_counter()
+            await self.queue.put((time.perf_counter(), item))
+            self.producer_blocked += time.perf_counter() - started
+        else:
+            self.queue.put_nowait((time.perf_counter(), item))
+
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    async def _run(self):
+        try:
+            while True:
+                enqueued_at, item = await self.queue.get()
+                started = time.perf_counter()
+                wait = started - enqueued_at
+                try:
+                    await self.handler(*item)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"\nError in pipeline stage '{self.name}': {e}")
+                finally:
+                    service = time.perf_counter() - started
+                    self.items_processed += 1
+                    self.total_wait += wait
+                    self.total_service += service
+                    if wait > self.max_wait:
+                        self.max_wait = wait
+                    if service > self.max_service:
+                        self.max_service = service
+                    self.queue.task_done()
+        except asyncio.CancelledError:
+            pass
+
+    def get_stats(self):
+        processed = self.items_processed or 1
+        return {
+            "overflow_policy": self.overflow,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "queue_capacity": self.queue.maxsize,
+            "items_in": self.items_in,
+            "items_processed": self.items_processed,
+            "items_dropped": self.items_dropped,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.total_wait / processed * 1000, 3),
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "avg_service_ms": round(self.total_service / processed * 1000, 3),
+            "max_service_ms": round(self.max_service * 1000, 3),
+            "producer_blocked_ms": round(self.producer_blocked * 1000, 3),
+        }
+
+
+class IngestPipeline:
+    """
+    Decouples reading the F1 socket from everything done with its frames.
+
+        reader  --raw frames-->  process  --outgoing messages-->  publish
+
+    The reader (`F1StreamProcessor._listen`) timestamps frames, records and
+    journals them (so they are kept whatever the overflow policy) and hands
+    them to the process stage, which applies them to the state. Every message the processor broadcasts is handed to the
+    publish stage, which feeds the delta stream and serializes it for
+    clients. A burst (the "R" snapshot, a restart after a safety car) then
+    piles up in a queue instead of in the socket's receive buffer.
+
+    The process stage uses the configured overflow policy; the publish stage
+    always blocks, since dropping a published message would desync clients.
+    """
+    QUEUE_SIZE = 10000          # Raw frames waiting to be processed
+    PUBLISH_QUEUE_SIZE = 10000  # Outgoing messages waiting to be published
+
+    def __init__(self, processor, queue_size=None, publish_queue_size=None, overflow=OVERFLOW_BLOCK):
+        self.processor = processor
+        self.state_manager = processor.state_manager
+        self.process_stage = PipelineStage(
+            "process", processor._process_raw_frame, queue_size or self.QUEUE_SIZE, overflow
+        )
+        self.publish_stage = PipelineStage(
+            "publish", self.state_manager._publish, publish_queue_size or self.PUBLISH_QUEUE_SIZE
+        )
+        self.frames_read = 0
+        self.last_frame_time = None
+
+    def start(self):
+        """Starts both stages and routes the processor's reads and broadcasts through them."""
+        self.process_stage.start()
+        self.publish_stage.start()
+        self.processor.pipeline = self
+        self.state_manager.publish_stage = self.publish_stage
+        print(f"Ingest pipeline started (overflow policy: {self.process_stage.overflow}).")
+
+    async def stop(self, timeout=5.0):
+        """Drains what is queued (up to `timeout` per stage) and goes back to inline processing."""
+        self.processor.pipeline = None
+        await self.process_stage.stop(timeout)
+        self.state_manager.publish_stage = None
+        await self.publish_stage.stop(timeout)
+
+    async def submit_frame(self, message_type, raw_data, received_time):
+        """Reader stage: persists one raw frame and queues it for processing."""
+        self.frames_read += 1
+        self.last_frame_time = received_time
+        await self.processor._persist_raw_frame(message_type, raw_data, received_time)
+        await self.process_stage.put(message_type, raw_data, received_time)
+
+    def get_stats(self):
+        return {
+            "reader": {
+                "frames_read": self.frames_read,
+                "last_frame_time": self.last_frame_time.isoformat() if self.last_frame_time else None,
+            },
+            "process": self.process_stage.get_stats(),
+            "publish": self.publish_stage.get_stats(),
+        }
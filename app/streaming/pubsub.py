@@ -0,0 +1,346 @@
+import abc
+import asyncio
+import base64
+import time
+import urllib.parse
+from datetime import datetime
+
+from app.utils.helpers import json_dumps, json_loads
+
+# --- Feed events ---
+# Every event is one JSON line. Frames use the replay/journal format, so a
+# follower runs them through the same F1StreamProcessor code as the leader
+# and ends up with the same state:
+#   {"kind": "frame", "timestamp": ..., "type": "text"|"binary", "data": ...}
+#   {"kind": "snapshot", "state": {...}}
+# A snapshot replaces the follower's whole state when it (re)joins; frames after
+# it apply on top. Snapshots arriving while a follower is in sync are ignored.
+
+def encode_frame(message_type, data, received_time):
+    if isinstance(data, bytes):
+        data = base64.b64encode(data).decode("ascii")
+    return json_dumps({
+        "kind": "frame",
+        "timestamp": received_time.isoformat(),
+        "type": message_type,
+        "data": data,
+    }).encode("utf-8") + b"\n"
+
+# Snapshot lines always start with this, so the broker can spot them without parsing
+SNAPSHOT_PREFIX = b'{"kind":"snapshot","state":'
+
+def encode_snapshot(state):
+    return SNAPSHOT_PREFIX + json_dumps(state).encode("utf-8") + b"}\n"
+
+def parse_address(address):
+    """
+    Parses "tcp://host:port" or "unix:///path/to/socket" into
+    ("tcp", host, port) or ("unix", path).
+    """
+    parsed = urllib.parse.urlparse(address)
+    if parsed.scheme == "unix":
+        return "unix", parsed.path
+    if parsed.scheme == "tcp" and parsed.hostname and parsed.port is not None:
+        return "tcp", parsed.hostname, parsed.port
+    raise ValueError(f"Unsupported broker address '{address}' (use tcp://host:port or unix:///path)")
+
+async def open_connection(address):
+    kind, *target = parse_address(address)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(target[0])
+    return await asyncio.open_connection(target[0], target[1])
+
+
+class FeedPublisher(abc.ABC):
+    """
+    Interface the leader uses to publish feed events. Implementations must
+    never block the caller; `publish` only queues an encoded event.
+    """
+    SNAPSHOT_INTERVAL = 30.0  # Seconds between state snapshots for late joiners
+
+    def __init__(self, snapshot_interval=None):
+        self.snapshot_interval = snapshot_interval or self.SNAPSHOT_INTERVAL
+        self.last_snapshot_time = None
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abc.abstractmethod
+    def publish(self, event_bytes):
+        """Queues one encoded event for the followers."""
+
+    def publish_frame(self, message_type, data, received_time):
+        self.publish(encode_frame(message_type, data, received_time))
+
+    def snapshot_due(self):
+        """True when the next frame should be preceded by a snapshot (first frame, interval or reconnect)."""
+        return self.last_snapshot_time is None or time.monotonic() - self.last_snapshot_time >= self.snapshot_interval
+
+    def publish_snapshot(self, state):
+        self.publish(encode_snapshot(state))
+        self.last_snapshot_time = time.monotonic()
+
+
+class FeedSubscriber(abc.ABC):
+    """
+    Interface a follower uses to receive feed events. `events()` returns an
+    async iterator of decoded event dicts; it yields {"kind": "disconnected"}
+    whenever events may have been missed, and must resume with a snapshot.
+    """
+    @abc.abstractmethod
+    def events(self):
+        """Returns an async iterator of decoded event dicts."""
+
+
+# ----------------------------------------------------------------------
+# Local broker (TCP or Unix socket)
+# ----------------------------------------------------------------------
+
+class FeedBroker:
+    """
+    A minimal fan-out broker. The leader connects and sends "PUB", followers
+    send "SUB"; after that every line the leader sends is forwarded to every
+    follower. The broker keeps the last snapshot and the events after it,
+    so a follower that joins late starts from a consistent state.
+
+    It can run inside the leader process or on its own, and tests can start
+    it in-process on `tcp://127.0.0.1:0`.
+    """
+    MAX_QUEUE_SIZE = 10000  # Events pending per follower before it is disconnected
+    MAX_BACKLOG = 100000    # Events kept after the last snapshot
+
+    def __init__(self, address):
+        self.address = address
+        self.server = None
+        self.subscribers = set()  # asyncio.Queue per connected follower
+        self.last_snapshot = None
+        self.backlog = []
+        self.events_received = 0
+        self.subscribers_dropped = 0
+
+    async def start(self):
+        kind, *target = parse_address(self.address)
+        if kind == "unix":
+            self.server = await asyncio.start_unix_server(self._handle_connection, target[0])
+        else:
+            self.server = await asyncio.start_server(self._handle_connection, target[0], target[1])
+            if target[1] == 0:
+                # Report the port the OS picked
+                port = self.server.sockets[0].getsockname()[1]
+                self.address = f"tcp://{target[0]}:{port}"
+        print(f"Feed broker listening on {self.address}")
+        return self.address
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            role = (await reader.readline()).strip()
+            if role == b"PUB":
+                await self._read_publisher(reader)
+            elif role == b"SUB":
+                await self._serve_subscriber(writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Peer went away, or the broker is shutting down
+            pass
+        finally:
+            writer.close()
+
+    async def _read_publisher(self, reader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            self.events_received += 1
+            if line.startswith(SNAPSHOT_PREFIX):
+                self.last_snapshot = line
+                self.backlog = []
+            elif self.last_snapshot is not None:
+                if len(self.backlog) < self.MAX_BACKLOG:
+                    self.backlog.append(line)
+                else:
+                    # Late joiners can't be brought up to date any more; they wait for the next snapshot
+                    self.last_snapshot = None
+                    self.backlog = []
+            for queue in list(self.subscribers):
+                if queue.qsize() >= self.MAX_QUEUE_SIZE:
+                    # A follower this far behind can't catch up; cut it off so it resyncs
+                    self.subscribers.discard(queue)
+                    self.subscribers_dropped += 1
+                    queue.put_nowait(None)
+                else:
+                    queue.put_nowait(line)
+
+    async def _serve_subscriber(self, writer):
+        queue = asyncio.Queue()  # Bounded by _read_publisher
+        if self.last_snapshot is not None:
+            writer.write(self.last_snapshot)
+            writer.writelines(self.backlog)
+        self.subscribers.add(queue)
+        try:
+            await writer.drain()
+            while True:
+                line = await queue.get()
+                if line is None:
+                    return
+                writer.write(line)
+                await writer.drain()
+        finally:
+            self.subscribers.discard(queue)
+
+    def get_stats(self):
+        return {
+            "address": self.address,
+            "subscribers": len(self.subscribers),
+            "events_received": self.events_received,
+            "backlog": len(self.backlog),
+            "subscribers_dropped": self.subscribers_dropped,
+        }
+
+
+class BrokerPublisher(FeedPublisher):
+    """Publishes to a FeedBroker, reconnecting with backoff if it goes away."""
+    MAX_QUEUE_SIZE = 10000
+    RETRY_DELAY = 1.0
+
+    def __init__(self, address, snapshot_interval=None):
+        super().__init__(snapshot_interval)
+        self.address = address
+        self.queue = asyncio.Queue(maxsize=self.MAX_QUEUE_SIZE)
+        self.events_dropped = 0
+        self.connected = False
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, event_bytes):
+        if self.queue.full():
+            # Events are useless without their predecessors: drop everything
+            # queued and force a fresh snapshot instead
+            self._reset()
+            self.events_dropped += 1
+            return
+        self.queue.put_nowait(event_bytes)
+
+    def _reset(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.events_dropped += 1
+        self.last_snapshot_time = None
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    reader, writer = await open_connection(self.address)
+                    writer.write(b"PUB\n")
+                    self.connected = True
+                    print(f"Publishing feed events to {self.address}")
+                    while True:
+                        writer.write(await self.queue.get())
+                        await writer.drain()
+                except (OSError, ConnectionError) as e:
+                    if self.connected:
+                        print(f"Lost connection to feed broker: {e}")
+                    self.connected = False
+                    # The broker (or a new one) must start again from a snapshot
+                    self._reset()
+                    await asyncio.sleep(self.RETRY_DELAY)
+        except asyncio.CancelledError:
+            pass
+
+
+class BrokerSubscriber(FeedSubscriber):
+    """Receives events from a FeedBroker, reconnecting with backoff."""
+    RETRY_DELAY = 1.0
+
+    def __init__(self, address):
+        self.address = address
+        self.connected = False
+
+    async def events(self):
+        while True:
+            try:
+                reader, writer = await open_connection(self.address)
+                writer.write(b"SUB\n")
+                await writer.drain()
+                self.connected = True
+                print(f"Subscribed to feed events on {self.address}")
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    yield json_loads(line)
+                writer.close()
+            except (OSError, ConnectionError) as e:
+                print(f"Feed broker unavailable ({e}); retrying in {self.RETRY_DELAY}s")
+            self.connected = False
+            # Reconnect and resync from the broker's snapshot
+            yield {"kind": "disconnected"}
+            await asyncio.sleep(self.RETRY_DELAY)
+
+
+class FeedFollower:
+    """
+    Runs on a follower node instead of a SignalR connection: applies the
+    leader's events to the local StateManager through the processor, so
+    `/ws` and `/api/*` on this node behave exactly as on the leader.
+    """
+    def __init__(self, processor, subscriber):
+        self.processor = processor
+        self.state_manager = processor.state_manager
+        self.subscriber = subscriber
+        self.events_applied = 0
+        self.snapshots_skipped = 0
+        self.synced = False
+
+    async def run(self):
+        async for event in self.subscriber.events():
+            kind = event.get("kind")
+            if kind == "snapshot":
+                if self.synced:
+                    # The leader's periodic snapshots are for late joiners. A synced follower
+                    # already has that state from the frames, and reloading it would drop the
+                    # telemetry history, the response cache and every client's delta stream.
+                    self.snapshots_skipped += 1
+                    continue
+                self.state_manager.load_state(event["state"])
+                self.synced = True
+                await self.state_manager.broadcast(self.state_manager.get_full_state())
+            elif kind == "frame" and self.synced:
+                message_time = datetime.fromisoformat(event["timestamp"])
+                # Latency is measured from the leader receiving the frame (clocks must be in sync)
+                self.state_manager.frame_received_at = message_time.timestamp()
+                try:
+                    await self.processor._process_log_entry(event, message_time)
+                except Exception as e:
+                    print(f"\nError applying feed event: {e}")
+                finally:
+                    self.state_manager.frame_received_at = None
+            elif kind == "disconnected":
+                # Frames are ignored until the next snapshot
+                self.synced = False
+                continue
+            self.events_applied += 1
+
+    def get_stats(self):
+        return {
+            "connected": self.subscriber.connected if hasattr(self.subscriber, "connected") else None,
+            "synced": self.synced,
+            "events_applied": self.events_applied,
+            "snapshots_skipped": self.snapshots_skipped,
+        }
@@ -0,0 +1,212 @@
+import base64
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+# zstandard is optional; without it archives are gzip-compressed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_EXTENSIONS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst", "none": ".jsonl"}
+
+def open_archive(filepath):
+    """
+    Opens a replay file for binary line reading, transparently inflating
+    `.gz` and `.zst` session archives. Archives made of several compressed
+    frames (e.g. rotated segments concatenated with `cat`) are read to the end.
+    Compressed streams may not be seekable; check `seekable()` first.
+    """
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, "rb")
+    if filepath.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Reading .zst archives requires the 'zstandard' package")
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(filepath, "rb"), closefd=True, read_across_frames=True
+        )
+        return io.BufferedReader(reader)
+    return open(filepath, "rb")
+
+
+class FeedRecorder:
+    """
+    Records every raw frame received from the F1 feed, with its receive
+    timestamp, into compressed `{"timestamp", "type", "data"}` JSONL archives
+    that `replay_from_file` can play back.
+
+    The live path only puts a tuple on a queue; encoding, compression and
+    disk I/O happen in batches on a background writer thread. A new segment
+    is started for every connection, so each archive begins with the
+    connection's "R" snapshot and can be replayed on its own. Long sessions
+    also rotate once a segment reaches `max_segment_bytes` (uncompressed) or
+    spans `max_segment_seconds` of feed time; those segments continue the
+    previous one, and concatenating them in name order (`cat`) gives an
+    archive of the whole connection.
+    """
+    BATCH_SIZE = 512      # Frames written per batch at most
+    FLUSH_INTERVAL = 1.0  # Seconds a partial batch may wait before being written
+    MAX_SEGMENT_BYTES = 256 * 1024 * 1024  # Uncompressed bytes per segment
+    MAX_SEGMENT_SECONDS = 3600.0           # Feed time per segment
+    _ROTATE = object()
+    _STOP = object()
+
+    def __init__(self, directory, compression=None, prefix="f1-session",
+                 max_segment_bytes=None, max_segment_seconds=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_segment_bytes = max_segment_bytes or self.MAX_SEGMENT_BYTES
+        self.max_segment_seconds = max_segment_seconds or self.MAX_SEGMENT_SECONDS
+        if compression is None:
+            compression = "zstd" if zstandard is not None else "gzip"
+        if compression not in ARCHIVE_EXTENSIONS:
+            raise ValueError(f"Unknown compression '{compression}' (expected one of {sorted(ARCHIVE_EXTENSIONS)})")
+        if compression == "zstd" and zstandard is None:
+            print("Warning: 'zstandard' is not installed, recording with gzip instead.")
+            compression = "gzip"
+        self.compression = compression
+
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._file = None
+        self._segment_started = None  # Feed time of the current segment's first frame
+        self._segment_bytes = 0
+        self.current_path = None
+        self.segments_written = 0
+        self.frames_recorded = 0
+        self.frames_written = 0
+        self.bytes_written = 0
+
+    # ------------------------------------------------------------------
+    # Called from the event loop
+    # ------------------------------------------------------------------
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="feed-recorder", daemon=True)
+            self._thread.start()
+        print(f"Recording raw feed to '{self.directory}' ({self.compression}).")
+
+    def record(self, message_type, data, received_time):
+        """Queues one raw frame. Never blocks the event loop."""
+        self._queue.put((message_type, data, received_time))
+        self.frames_recorded += 1
+
+    def new_segment(self):
+        """Starts a new archive with the next frame (e.g. on reconnect)."""
+        self._queue.put(self._ROTATE)
+
+    def stop(self):
+        """Writes every queued frame, closes the archive and stops the thread."""
+        if self._thread is None:
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _open_segment(self, first_frame_time):
+        self._close_segment()
+        # Microseconds plus a counter, so two segments never share (and append to) one file
+        self.segments_written += 1
+        name = (f"{self.prefix}-{first_frame_time.strftime('%Y%m%dT%H%M%S%f')}-{self.segments_written:03d}"
+                f"{ARCHIVE_EXTENSIONS[self.compression]}")
+        self.current_path = os.path.join(self.directory, name)
+        if self.compression == "gzip":
+            self._file = gzip.open(self.current_path, "ab")
+        elif self.compression == "zstd":
+            self._file = zstandard.ZstdCompressor().stream_writer(open(self.current_path, "ab"), closefd=True)
+        else:
+            self._file = open(self.current_path, "ab")
+        self._segment_started = first_frame_time
+        self._segment_bytes = 0
+
+    def _segment_full(self, frame_time):
+        if self._segment_bytes >= self.max_segment_bytes:
+            return True
+        return frame_time is not None and \
+            (frame_time - self._segment_started).total_seconds() >= self.max_segment_seconds
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def _encode(message_type, data, received_time):
+        if isinstance(data, bytes):
+            data = base64.b64encode(data).decode("ascii")
+        return json.dumps({
+            "timestamp": received_time.isoformat(),
+            "type": message_type,
+            "data": data,
+        }).encode("utf-8") + b"\n"
+
+    def _write_batch(self, frames):
+        if not frames:
+            return
+        first_frame_time = frames[0][2] or datetime.now(timezone.utc)
+        if self._file is not None and self._segment_full(first_frame_time):
+            self._close_segment()
+        if self._file is None:
+            self._open_segment(first_frame_time)
+        payload = b"".join(self._encode(*frame) for frame in frames)
+        self._file.write(payload)
+        self._file.flush()
+        self._segment_bytes += len(payload)
+        self.frames_written += len(frames)
+        self.bytes_written += len(payload)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+
+            # Drain whatever else is already waiting, up to one batch
+            batch = []
+            while True:
+                if item is self._STOP:
+                    stopping = True
+                    break
+                if item is self._ROTATE:
+                    self._write_batch(batch)
+                    batch = []
+                    self._close_segment()
+                elif item is not None:
+                    batch.append(item)
+                if len(batch) >= self.BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"\nWarning: feed recorder failed to write {len(batch)} frames: {e}")
+        self._close_segment()
+
+    def get_stats(self):
+        return {
+            "directory": self.directory,
+            "compression": self.compression,
+            "current_file": self.current_path,
+            "segments_written": self.segments_written,
+            "frames_recorded": self.frames_recorded,
+            "frames_written": self.frames_written,
+            "bytes_written_uncompressed": self.bytes_written,
+            "queue_depth": self._queue.qsize(),
+        }
@@ -0,0 +1,362 @@
+import asyncio
+import bisect
+import json
+import os
+from datetime import datetime, timezone
+
+from app.state.state_manager import StateManager
+from app.state.telemetry_store import iso_to_epoch
+from app.streaming.recorder import open_archive
+from app.utils.helpers import DateTimeEncoder
+
+class ReplayEngine:
+    """
+    Replays a recorded `{"timestamp", "type", "data"}` JSONL session through
+    an F1StreamProcessor, with seek, pause/resume and runtime speed changes.
+    Plain `.jsonl` files and compressed `.jsonl.gz`/`.jsonl.zst` archives from
+    the FeedRecorder are both accepted; offsets refer to the decompressed stream.
+
+    On first use the file is scanned once into a sidecar index
+    (`<file>.index.json`): the byte offset and timestamp of every message,
+    the message where each lap starts, and periodic state checkpoints stored
+    in `<file>.checkpoints/`. Seeking restores the nearest checkpoint before
+    the target and fast-forwards silently from there.
+    """
+    INDEX_VERSION = 1
+    CHECKPOINT_INTERVAL = 300.0  # Seconds of session time between state checkpoints
+    YIELD_EVERY = 500            # Messages processed between yields when not sleeping
+    SKIP_CHUNK_SIZE = 1024 * 1024  # Bytes read at a time when skipping forward in a compressed stream
+
+    def __init__(self, processor, filepath, speed=1.0, checkpoint_interval=None, stay_open=False):
+        self.processor = processor
+        self.state_manager = processor.state_manager
+        self.filepath = filepath
+        self.speed = speed  # <= 0 means "as fast as possible"
+        self.stay_open = stay_open  # Keep accepting seeks after the last message
+        self.checkpoint_interval = checkpoint_interval or self.CHECKPOINT_INTERVAL
+        self.index_path = f"{filepath}.index.json"
+        self.checkpoint_dir = f"{filepath}.checkpoints"
+
+        # --- Index ---
+        self.offsets = []      # Byte offset of each message
+        self.timestamps = []   # Epoch seconds of each message
+        self.lap_lines = {}    # Lap number -> index of the message following the start of that lap
+        self.checkpoints = []  # Sorted (message index, checkpoint filename)
+
+        # --- Playback ---
+        self.position = 0      # Index of the next message to process
+        self.paused = False
+        self.running = False
+        self.finished = False
+        self._seek_line = None
+        self._control_changed = asyncio.Event()
+        self._file = None
+        self._offset = 0  # Position of `_file` in the decompressed stream
+
+    # ------------------------------------------------------------------
+    # Index
+    # ------------------------------------------------------------------
+
+    def _source_signature(self):
+        stat = os.stat(self.filepath)
+        return stat.st_size, stat.st_mtime
+
+    def _load_index(self):
+        """Loads the sidecar index if it exists and matches the replay file."""
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+
+        size, mtime = self._source_signature()
+        if index.get("version") != self.INDEX_VERSION or index.get("source_size") != size \
+                or index.get("source_mtime") != mtime:
+            return False
+
+        self.offsets = index["offsets"]
+        self.timestamps = index["timestamps"]
+        self.lap_lines = {int(lap): line for lap, line in index["laps"].items()}
+        self.checkpoints = [tuple(c) for c in index["checkpoints"]]
+        return True
+
+    async def build_index(self):
+        """
+        Processes the whole file once, as fast as possible, on a scratch
+        StateManager to record message offsets, lap starts and checkpoints.
+        """
+        print(f"Building replay index for '{self.filepath}'...")
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        scratch_state = StateManager()
+        scratch_state.muted = True
+        scratch_processor = type(self.processor)(scratch_state, quiet=True)
+
+        self.offsets, self.timestamps, self.lap_lines, self.checkpoints = [], [], {}, []
+        last_checkpoint_time = None
+        offset = 0
+
+        with open_archive(self.filepath) as f:
+            for raw_line in f:
+                line_offset = offset
+                offset += len(raw_line)
+                log_entry, message_time = self._parse_line(raw_line)
+                if log_entry is None:
+                    continue
+
+                line_index = len(self.offsets)
+                self.offsets.append(line_offset)
+                self.timestamps.append(iso_to_epoch(log_entry["timestamp"]))
+
+                try:
+                    await scratch_processor._process_log_entry(log_entry, message_time)
+                except Exception:
+                    pass
+
+                # Seeking to a lap resumes right after the message that started it
+                current_lap = scratch_state.state.get("LapCount", {}).get("CurrentLap", 0)
+                self.lap_lines.setdefault(current_lap, line_index + 1)
+
+                if last_checkpoint_time is None:
+                    last_checkpoint_time = self.timestamps[line_index]
+                elif self.timestamps[line_index] - last_checkpoint_time >= self.checkpoint_interval:
+                    # The checkpoint holds the state *after* this message
+                    filename = f"{line_index + 1}.json"
+                    with open(os.path.join(self.checkpoint_dir, filename), "w") as checkpoint_file:
+                        json.dump(scratch_state.get_full_state(), checkpoint_file, cls=DateTimeEncoder)
+                    self.checkpoints.append((line_index + 1, filename))
+                    last_checkpoint_time = self.timestamps[line_index]
+
+                if line_index % self.YIELD_EVERY == 0:
+                    await asyncio.sleep(0)  # Keep the API responsive
+
+        size, mtime = self._source_signature()
+        with open(self.index_path, "w") as f:
+            json.dump({
+                "version": self.INDEX_VERSION,
+                "source_size": size,
+                "source_mtime": mtime,
+                "offsets": self.offsets,
+                "timestamps": self.timestamps,
+                "laps": self.lap_lines,
+                "checkpoints": self.checkpoints,
+            }, f)
+        print(f"Replay index built: {len(self.offsets)} messages, {len(self.lap_lines)} laps, "
+              f"{len(self.checkpoints)} checkpoints.")
+
+    async def load_or_build_index(self):
+        if not self._load_index():
+            await self.build_index()
+
+    @staticmethod
+    def _parse_line(raw_line):
+        """Returns (log_entry, message_time), or (None, None) for a line that isn't a valid entry."""
+        if not raw_line.strip():
+            return None, None
+        try:
+            log_entry = json.loads(raw_line)
+            message_time = datetime.fromisoformat(log_entry["timestamp"])
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return None, None
+        return log_entry, message_time
+
+    # ------------------------------------------------------------------
+    # Playback
+    # ------------------------------------------------------------------
+
+    async def run(self):
+        """
+        Replays the file until the end, honouring pause, seek and speed changes.
+        With `stay_open`, it then waits for further seeks instead of returning.
+        """
+        print(f"--- Starting replay from file: {self.filepath} ---")
+        if not os.path.exists(self.filepath):
+            print(f"Error: Replay file not found at '{self.filepath}'")
+            return
+
+        await self.load_or_build_index()
+        self.running = True
+        processed_since_yield = 0
+
+        self._file = open_archive(self.filepath)
+        self._offset = 0
+        try:
+            while self.position < len(self.offsets) or self._seek_line is not None or self.stay_open:
+                if self._seek_line is not None:
+                    self.finished = False
+                    await self._apply_seek()
+                    continue
+                if self.position >= len(self.offsets):
+                    if not self.finished:
+                        self.finished = True
+                        print("\n--- Replay finished, waiting for seek commands ---")
+                    await self._wait_for_control()
+                    continue
+                if self.paused:
+                    await self._wait_for_control()
+                    continue
+
+                # --- Simulate real-world timing ---
+                line_index = self.position
+                if line_index > 0 and self.speed > 0:
+                    delay = (self.timestamps[line_index] - self.timestamps[line_index - 1]) / self.speed
+                    if delay > 0 and await self._wait_for_control(delay):
+                        continue  # Paused, seeking or speed changed: re-evaluate first
+
+                await self._process_line(line_index)
+                self.position += 1
+
+                if self.speed > 0:
+                    print(">", end="", flush=True)
+                else:
+                    processed_since_yield += 1
+                    if processed_since_yield >= self.YIELD_EVERY:
+                        processed_since_yield = 0
+                        await asyncio.sleep(0)
+        finally:
+            self._file.close()
+            self._file = None
+
+        self.running = False
+        self.finished = True
+        print("\n--- Replay finished ---")
+
+    async def _wait_for_control(self, timeout=None):
+        """
+        Sleeps until `timeout` elapses or a control command arrives.
+        Returns True if woken up by a control command.
+        """
+        self._control_changed.clear()
+        try:
+            await asyncio.wait_for(self._control_changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _seek_file(self, offset):
+        """
+        Positions the replay file at `offset`. Streams that can't seek (zstd)
+        are read forward to it instead, after being reopened to go backwards.
+        """
+        if self._offset == offset:
+            return
+        if self._file.seekable():
+            self._file.seek(offset)
+        else:
+            if offset < self._offset:
+                self._file.close()
+                self._file = open_archive(self.filepath)
+                self._offset = 0
+            remaining = offset - self._offset
+            while remaining > 0:
+                chunk = self._file.read(min(remaining, self.SKIP_CHUNK_SIZE))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+        self._offset = offset
+
+    async def _process_line(self, line_index):
+        self._seek_file(self.offsets[line_index])
+        raw_line = self._file.readline()
+        self._offset += len(raw_line)
+        log_entry, message_time = self._parse_line(raw_line)
+        if log_entry is None:
+            print(f"\nWarning: Skipping line, could not parse as JSON: {raw_line.strip()}")
+            return
+        try:
+            await self.processor._process_log_entry(log_entry, message_time)
+        except Exception as e:
+            print(f"\nAn error occurred during replay: {e}")
+
+    async def _apply_seek(self):
+        """
+        Moves playback to the requested message. Restores the closest
+        checkpoint at or before it (unless moving forward from the current
+        position is cheaper), fast-forwards with broadcasts muted, then sends
+        every client the resulting full state.
+        """
+        target = self._seek_line
+        self._seek_line = None
+
+        checkpoint_lines = [line for line, _ in self.checkpoints]
+        checkpoint_index = bisect.bisect_right(checkpoint_lines, target) - 1
+        checkpoint = self.checkpoints[checkpoint_index] if checkpoint_index >= 0 else None
+
+        if target >= self.position and (checkpoint is None or checkpoint[0] <= self.position):
+            start = self.position
+        elif checkpoint is not None:
+            with open(os.path.join(self.checkpoint_dir, checkpoint[1]), "r") as checkpoint_file:
+                self.state_manager.load_state(json.load(checkpoint_file))
+            start = checkpoint[0]
+        else:
+            self.state_manager.load_state({})
+            start = 0
+
+        self.state_manager.muted = True
+        try:
+            for line_index in range(start, target):
+                await self._process_line(line_index)
+                if (line_index - start) % self.YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+        finally:
+            self.state_manager.muted = False
+
+        self.position = target
+        await self.state_manager.broadcast(self.state_manager.get_full_state())
+        print(f"\n--- Replay jumped to message {target} of {len(self.offsets)} ---")
+
+    # ------------------------------------------------------------------
+    # Controls
+    # ------------------------------------------------------------------
+
+    def _notify(self):
+        self._control_changed.set()
+
+    def pause(self):
+        self.paused = True
+        self._notify()
+
+    def resume(self):
+        self.paused = False
+        self._notify()
+
+    def set_speed(self, speed):
+        """Changes the playback speed. 0 (or less) replays as fast as possible."""
+        self.speed = speed
+        self._notify()
+
+    def seek_to_time(self, timestamp):
+        """Jumps to the first message at or after `timestamp` (epoch seconds)."""
+        self._seek_line = bisect.bisect_left(self.timestamps, timestamp)
+        self._notify()
+        return self._seek_line
+
+    def seek_to_lap(self, lap_number):
+        """Jumps to the first message of a lap. Raises ValueError for unknown laps."""
+        if lap_number not in self.lap_lines:
+            raise ValueError(f"Lap {lap_number} is not in this replay")
+        self._seek_line = self.lap_lines[lap_number]
+        self._notify()
+        return self._seek_line
+
+    def get_status(self):
+        def to_iso(timestamp):
+            return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+        current_index = min(self.position, len(self.timestamps) - 1)
+        return {
+            "file": self.filepath,
+            "running": self.running,
+            "finished": self.finished,
+            "paused": self.paused,
+            "speed": self.speed,
+            "position": self.position,
+            "total_messages": len(self.offsets),
+            "current_time": to_iso(self.timestamps[current_index]) if current_index >= 0 else None,
+            "start_time": to_iso(self.timestamps[0]) if self.timestamps else None,
+            "end_time": to_iso(self.timestamps[-1]) if self.timestamps else None,
+            "current_lap": self.state_manager.state.get("LapCount", {}).get("CurrentLap"),
+            "laps": sorted(self.lap_lines),
+            "checkpoints": len(self.checkpoints),
+        }
@@ -2,6 +2,13 @@
 import collections.abc
 from datetime import datetime
 import json
+import re
+
+# orjson is optional; it parses and serializes several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 class DateTimeEncoder(json.JSONEncoder):
     """
@@ -12,6 +19,24 @@ class DateTimeEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super().default(obj)
 
+def json_loads(data):
+    """Parses JSON from str or bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(data) -> str:
+    """
+    Serializes to a JSON string (datetimes as ISO 8601), with orjson when it
+    is installed. Falls back to json for anything orjson rejects.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(data, cls=DateTimeEncoder)
+
 def deep_merge(destination, source):
     """
     Recursively merges source dictionary into destination dictionary.
@@ -28,6 +53,49 @@ def deep_merge(destination, source):
             destination[key] = value
     return destination
 
+def deep_merge_changes(destination, source, changes, path=()):
+    """
+    Merges like `deep_merge` (in place, nothing copied) and appends one
+    `(path, old, new)` tuple to `changes` for every leaf the source touched,
+    e.g. `(("Lines", "44", "LastLapTime", "Value"), "1:32.100", "1:31.900")`.
+    `old` is None for new keys. Leaves whose value didn't change are included
+    too, since a repeated value can still be an event (two identical lap
+    times); use `effective_changes` to drop them.
+    """
+    for key, value in source.items():
+        existing = destination.get(key)
+        if isinstance(existing, dict) and isinstance(value, dict):
+            deep_merge_changes(existing, value, changes, path + (key,))
+        else:
+            destination[key] = value
+            if isinstance(value, dict):
+                # A new subtree is stored as is; report each of its leaves
+                _collect_leaves(value, path + (key,), changes)
+            else:
+                changes.append((path + (key,), existing, value))
+    return changes
+
+def _collect_leaves(tree, path, changes):
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            _collect_leaves(value, path + (key,), changes)
+        else:
+            changes.append((path + (key,), None, value))
+
+def effective_changes(changes):
+    """Filters a change set down to the leaves whose value actually changed."""
+    return [change for change in changes if change[1] != change[2]]
+
+def changes_to_patch(changes):
+    """Rebuilds a nested merge patch holding only the leaves in `changes`."""
+    patch = {}
+    for path, _, new in changes:
+        node = patch
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = new
+    return patch
+
 def safe_to_float(value: str) -> float | None:
     """
     Safely converts a string value to a float.
@@ -43,6 +111,72 @@ def safe_to_float(value: str) -> float | None:
         # Return None if the string is not a valid float (e.g., "LAP 2")
         return None
     
+# A "+HH:MM" UTC offset whose '+' was decoded to a space, right after the time
+_DECODED_PLUS_OFFSET = re.compile(r"(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?) (\d{2}:?\d{2})$")
+
+def parse_date_filters(query_params) -> tuple[str | None, str | None]:
+    """
+    Extracts OpenF1-style date bounds from a query string.
+    `?date>=X&date<=Y` arrives as the keys "date>" and "date<" (the '=' is
+    consumed as the separator); URL-encoded "date>=" / "date<=" keys are
+    accepted too. An unencoded "+00:00" offset arrives as " 00:00" and is
+    restored. Returns (lower_bound, upper_bound) as raw strings.
+    """
+    lower = query_params.get("date>=") or query_params.get("date>")
+    upper = query_params.get("date<=") or query_params.get("date<")
+    return tuple(
+        _DECODED_PLUS_OFFSET.sub(r"\1+\2", value.strip()) if value else value
+        for value in (lower, upper)
+    )
+
+def stride_indices(count: int, max_points: int) -> list[int]:
+    """
+    Picks at most `max_points` evenly spaced indices out of `count`,
+    always keeping the first and the last one.
+    """
+    if count <= max_points:
+        return list(range(count))
+    if max_points < 2:
+        return [count - 1] if max_points == 1 else []
+    step = (count - 1) / (max_points - 1)
+    return [round(i * step) for i in range(max_points)]
+
+def lttb_indices(xs, ys, max_points: int) -> list[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of at most `max_points` samples that best preserve
+    the visual shape of the (xs, ys) series, e.g. a speed trace over time.
+    The series is processed bucket by bucket over array slices, so the cost
+    is a single pass whatever the window length.
+    """
+    count = len(xs)
+    if count <= max_points or max_points < 3:
+        return stride_indices(count, max_points)
+
+    bucket_size = (count - 2) / (max_points - 2)
+    selected = [0]
+    anchor = 0
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average point of the next bucket (the last point for the final bucket)
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, count)
+        next_len = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / next_len
+        avg_y = sum(ys[next_start:next_end]) / next_len
+
+        # Keep the point forming the largest triangle with the anchor and that average
+        anchor_x, anchor_y = xs[anchor], ys[anchor]
+        dx, dy = anchor_x - avg_x, avg_y - anchor_y
+        areas = [abs(dx * (y - anchor_y) + (x - anchor_x) * dy)
+                 for x, y in zip(xs[start:end], ys[start:end])]
+        anchor = start + areas.index(max(areas))
+        selected.append(anchor)
+
+    selected.append(count - 1)
+    return selected
+
 def time_string_to_seconds(time_str: str) -> float | None:
     """
     Converts a time string like "1:44.634" or "44.634" to total seconds.
@@ -0,0 +1,96 @@
+import bisect
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from 100 µs to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    A Prometheus histogram with a fixed set of label names. Observing is a
+    bisect plus two additions, cheap enough for every frame and message.
+    """
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines)
+
+
+class LatencyMetrics:
+    """
+    Per-stage timings of the path from an F1 frame arriving to a client
+    having it, by feed. Stages:
+      receive   frame arrival -> processing starts (ingest queue wait)
+      decode    JSON parse of a frame / inflate of a .z feed
+      merge     applying an update to the state
+      derive    lap, pit and leaderboard detection after a TimingData merge
+                (including handing the resulting messages to the publish path)
+      serialize encoding a message for the clients
+      send      handing one message to a client's socket
+    `glass_to_glass` is frame arrival -> sent to a client.
+    """
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "f1_stage_latency_seconds", "Time spent in each processing stage, by feed.", ("stage", "feed")
+        )
+        self.glass_to_glass_seconds = Histogram(
+            "f1_glass_to_glass_seconds", "Time from receiving an F1 frame to sending the result to a client, by feed.",
+            ("feed",)
+        )
+
+    def observe(self, stage, feed, seconds):
+        self.stage_seconds.observe(seconds, stage, feed)
+
+    @contextmanager
+    def timer(self, stage, feed):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - started, stage, feed)
+
+    def observe_delivery(self, feed, received_at):
+        """Records glass-to-glass latency for a message whose frame arrived at epoch `received_at`."""
+        self.glass_to_glass_seconds.observe(max(0.0, time.time() - received_at), feed)
+
+    def render(self):
+        """All histograms in the Prometheus text exposition format."""
+        return "\n".join([self.stage_seconds.render(), self.glass_to_glass_seconds.render()]) + "\n"
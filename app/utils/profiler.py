@@ -0,0 +1,172 @@
+import asyncio
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+
+# Leaf frames that mean "the event loop is waiting for I/O", not doing work
+IDLE_FRAMES = ("selectors.py:EpollSelector.select", "selectors.py:KqueueSelector.select",
+               "selectors.py:PollSelector.select", "selectors.py:SelectSelector.select",
+               "threading.py:Condition.wait", "queue.py:Queue.get")
+
+
+class Profile:
+    """
+    The result of one profiling run: samples per call stack, where one
+    sample stands for about `interval` seconds on that stack.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = collections.Counter()  # "root;...;leaf" -> samples
+        self.samples = 0
+        self.idle_samples = 0
+        self.duration = 0.0
+        self.mode = None  # "signal" or "thread"
+
+    def collapsed(self):
+        """Stacks in the collapsed format read by flamegraph.pl, speedscope and inferno."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit=25):
+        """Functions by inclusive samples (time on the stack), busiest first."""
+        inclusive = collections.Counter()
+        for stack, count in self.stacks.items():
+            for function in set(stack.split(";")):
+                inclusive[function] += count
+        busy = max(1, self.samples - self.idle_samples)
+        return [
+            {"function": function, "samples": count, "fraction": round(count / busy, 4)}
+            for function, count in inclusive.most_common(limit)
+        ]
+
+    def to_dict(self, limit=25):
+        return {
+            "mode": self.mode,
+            "duration_s": round(self.duration, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "idle_samples": self.idle_samples,
+            "top_functions": self.top_functions(limit),
+            "stacks": dict(self.stacks.most_common()),
+        }
+
+
+class SamplingProfiler:
+    """
+    A statistical profiler for the running server: nothing is instrumented,
+    and the cost while it runs is one stack walk per sample. Covers
+    everything on the event loop: frame decoding, `update_state`/`deep_merge`,
+    lap and pit detection, the API handlers with their validation and JSON
+    encoding, and the WebSocket senders.
+
+    When the loop runs on the main thread (as in main.py), samples come from
+    a SIGPROF timer, which ticks on CPU time and interrupts the loop at any
+    bytecode. Otherwise, and for `all_threads`, a background thread reads
+    the stacks instead. That thread can only look when the GIL is released,
+    so it over-represents calls that release it (zlib, I/O).
+
+    Only one run at a time; it is off until `profile` is called.
+    """
+    INTERVAL = 0.005
+    MAX_SECONDS = 120
+
+    def __init__(self, interval=None, max_seconds=None):
+        self.interval = interval or self.INTERVAL
+        self.max_seconds = max_seconds or self.MAX_SECONDS
+        self.running = False
+        self.last_profile = None
+        self._labels = {}  # code object -> "file.py:Qualified.name"
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self._labels[code] = f"{os.path.basename(code.co_filename)}:{name}"
+        return label
+
+    def _stack(self, frame):
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return labels
+
+    def _record(self, profile, stack, include_idle, root=None):
+        profile.samples += 1
+        if stack and stack[-1] in IDLE_FRAMES:
+            profile.idle_samples += 1
+            if not include_idle:
+                return
+        if root is not None:
+            stack.insert(0, root)
+        profile.stacks[";".join(stack)] += 1
+
+    async def profile(self, seconds, interval=None, all_threads=False, include_idle=False):
+        """
+        Samples for `seconds` (capped at MAX_SECONDS) and returns the Profile.
+        Must be awaited on the event loop that is to be profiled.
+        Raises RuntimeError if a run is already in progress.
+        """
+        if self.running:
+            raise RuntimeError("A profile is already being recorded")
+        self.running = True
+        profile = Profile(interval or self.interval)
+        use_signal = not all_threads and hasattr(signal, "setitimer") \
+            and threading.current_thread() is threading.main_thread()
+        started = time.perf_counter()
+        try:
+            if use_signal:
+                previous = signal.signal(
+                    signal.SIGPROF, lambda signum, frame: self._record(profile, self._stack(frame), include_idle)
+                )
+                signal.setitimer(signal.ITIMER_PROF, profile.interval, profile.interval)
+                try:
+                    await asyncio.sleep(min(max(0.0, seconds), self.max_seconds))
+                finally:
+                    signal.setitimer(signal.ITIMER_PROF, 0)
+                    signal.signal(signal.SIGPROF, previous)
+            else:
+                stop = threading.Event()
+                sampler = threading.Thread(
+                    target=self._sample, args=(profile, threading.get_ident(), all_threads, include_idle, stop),
+                    name="f1-profiler", daemon=True
+                )
+                sampler.start()
+                try:
+                    await asyncio.sleep(min(max(0.0, seconds), self.max_seconds))
+                finally:
+                    stop.set()
+                    await asyncio.to_thread(sampler.join)
+        finally:
+            profile.duration = time.perf_counter() - started
+            self.running = False
+        profile.mode = "signal" if use_signal else "thread"
+        self.last_profile = profile
+        return profile
+
+    def _sample(self, profile, loop_thread_id, all_threads, include_idle, stop):
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not stop.wait(profile.interval):
+            frames = sys._current_frames()
+            if not all_threads:
+                frame = frames.get(loop_thread_id)
+                if frame is not None:
+                    self._record(profile, self._stack(frame), include_idle)
+                continue
+            if len(thread_names) != len(frames) - 1:
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in frames.items():
+                if thread_id != own_id:
+                    self._record(profile, self._stack(frame), include_idle, thread_names.get(thread_id, str(thread_id)))
+
+    def get_stats(self):
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "max_seconds": self.max_seconds,
+            "last_profile": self.last_profile.to_dict(limit=10) if self.last_profile else None,
+        }
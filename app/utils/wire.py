@@ -0,0 +1,204 @@
+import sys
+import zlib
+from array import array
+from datetime import datetime
+
+from app.state.telemetry_store import CAR_CHANNELS, iso_to_epoch
+from app.utils.helpers import json_dumps
+
+# msgpack is optional; without it every client is served JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# --- Encodings ---
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# /ws subprotocols are "f1.<encoding>" with an optional "+deflate" suffix,
+# e.g. `new WebSocket(url, ["f1.msgpack+deflate", "f1.json"])`.
+SUBPROTOCOL_PREFIX = "f1."
+DEFLATE_SUFFIX = "+deflate"
+DEFLATE_LEVEL = 6
+
+# --- Fixed numeric telemetry encoding ---
+# In msgpack, telemetry is sent column by column: one little-endian typed
+# array per field instead of a map per sample. Dates are epoch seconds.
+CAR_DATA_COLUMNS = (("date", "d"), ("driver_number", "H"), ("rpm", "H"), ("speed", "H"),
+                    ("n_gear", "B"), ("throttle", "B"), ("brake", "B"), ("drs", "B"))
+LOCATION_COLUMNS = (("date", "d"), ("driver_number", "H"), ("x", "i"), ("y", "i"), ("z", "i"))
+TYPE_NAMES = {"d": "float64", "H": "uint16", "B": "uint8", "i": "int32"}
+
+def msgpack_available():
+    return msgpack is not None
+
+def _msgpack_default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Cannot serialize {type(obj).__name__} to msgpack")
+
+def msgpack_dumps(data) -> bytes:
+    return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+def _column_value(name, typecode, row):
+    value = row.get(name)
+    if name == "date" and isinstance(value, str):
+        value = iso_to_epoch(value)
+    if typecode == "d":
+        return float(value or 0.0)
+    return int(value or 0)
+
+def pack_columns(rows, columns):
+    """
+    Packs flat sample dicts into {"count", "columns": {name: {"type", "data"}}}.
+    Fields of the first row that aren't columns (session_key, meeting_key)
+    are the same for every sample and are sent once, under "constants".
+    """
+    packed = {}
+    for name, typecode in columns:
+        values = array(typecode, (_column_value(name, typecode, row) for row in rows))
+        if sys.byteorder == "big":
+            values.byteswap()
+        packed[name] = {"type": TYPE_NAMES[typecode], "data": values.tobytes()}
+    names = {name for name, _ in columns}
+    constants = {k: v for k, v in rows[0].items() if k not in names} if rows else {}
+    return {"count": len(rows), "columns": packed, "constants": constants}
+
+def car_data_rows(car_data):
+    """Flattens a decoded CarData message into one row per car and sample."""
+    rows = []
+    for entry in car_data.get("Entries", []) if isinstance(car_data, dict) else []:
+        timestamp = iso_to_epoch(entry.get("Utc"))
+        for driver_number, telemetry in entry.get("Cars", {}).items():
+            channels = telemetry.get("Channels", {})
+            rows.append({
+                "date": timestamp,
+                "driver_number": driver_number,
+                "rpm": channels.get(CAR_CHANNELS["rpm"]),
+                "speed": channels.get(CAR_CHANNELS["speed"]),
+                "n_gear": channels.get(CAR_CHANNELS["gear"]),
+                "throttle": channels.get(CAR_CHANNELS["throttle"]),
+                "brake": channels.get(CAR_CHANNELS["brake"]),
+                "drs": channels.get(CAR_CHANNELS["drs"]),
+            })
+    return rows
+
+def position_rows(position_data):
+    """Flattens a decoded Position message into one row per car and sample."""
+    rows = []
+    for snapshot in position_data.get("Position", []) if isinstance(position_data, dict) else []:
+        timestamp = iso_to_epoch(snapshot.get("Timestamp"))
+        for driver_number, location in snapshot.get("Entries", {}).items():
+            rows.append({
+                "date": timestamp,
+                "driver_number": driver_number,
+                "x": location.get("X"),
+                "y": location.get("Y"),
+                "z": location.get("Z"),
+            })
+    return rows
+
+# Telemetry pushed on /ws: message type -> (row flattener, columns)
+TELEMETRY_MESSAGES = {
+    "CarData": (car_data_rows, CAR_DATA_COLUMNS),
+    "Position": (position_rows, LOCATION_COLUMNS),
+}
+
+
+class WireFormat:
+    """
+    How one /ws client wants its messages encoded: JSON text or msgpack
+    binary, each optionally compressed with raw deflate per message
+    (decompress with `DecompressionStream("deflate-raw")` in a browser).
+    Every message is compressed on its own, so a dropped message never
+    breaks decompression of the next one.
+    """
+    __slots__ = ("encoding", "deflate")
+
+    def __init__(self, encoding=ENCODING_JSON, deflate=False):
+        self.encoding = encoding
+        self.deflate = deflate
+
+    @property
+    def key(self):
+        """Clients with equal keys get identical bytes, so they share one encoding."""
+        return (self.encoding, self.deflate)
+
+    @property
+    def is_default(self):
+        return self.encoding == ENCODING_JSON and not self.deflate
+
+    @property
+    def subprotocol(self):
+        return SUBPROTOCOL_PREFIX + self.encoding + (DEFLATE_SUFFIX if self.deflate else "")
+
+    def to_dict(self):
+        return {"encoding": self.encoding, "deflate": self.deflate}
+
+    def encode(self, message):
+        """Encodes one message. Returns str for plain JSON, bytes otherwise."""
+        if self.encoding == ENCODING_MSGPACK:
+            if isinstance(message, dict) and message.get("type") in TELEMETRY_MESSAGES:
+                to_rows, columns = TELEMETRY_MESSAGES[message["type"]]
+                message = {**message, "data": pack_columns(to_rows(message.get("data")), columns)}
+            body = msgpack_dumps(message)
+        else:
+            body = json_dumps(message)
+        return self._compress(body)
+
+    def encode_text(self, message_text):
+        """Re-encodes an already serialized JSON message (only compression can apply)."""
+        return self._compress(message_text)
+
+    def _compress(self, body):
+        if not self.deflate:
+            return body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return compressor.compress(body) + compressor.flush()
+
+
+JSON_FORMAT = WireFormat()
+
+def parse_subprotocol(name, encodings=(ENCODING_JSON, ENCODING_MSGPACK)):
+    """Returns the WireFormat for a subprotocol like "f1.msgpack+deflate", or None if unsupported."""
+    if not name.startswith(SUBPROTOCOL_PREFIX):
+        return None
+    encoding = name[len(SUBPROTOCOL_PREFIX):]
+    deflate = encoding.endswith(DEFLATE_SUFFIX)
+    if deflate:
+        encoding = encoding[:-len(DEFLATE_SUFFIX)]
+    if encoding not in encodings or (encoding == ENCODING_MSGPACK and msgpack is None):
+        return None
+    return WireFormat(encoding, deflate)
+
+def negotiate_websocket(headers, query_params, encodings=(ENCODING_JSON, ENCODING_MSGPACK)):
+    """
+    Picks a client's WireFormat. The first supported subprotocol it offers
+    wins; otherwise `?encoding=msgpack&deflate=1` is honoured; otherwise JSON.
+    Returns (wire_format, subprotocol to accept or None).
+    """
+    offered = headers.get("sec-websocket-protocol", "")
+    for name in (part.strip() for part in offered.split(",")):
+        wire_format = parse_subprotocol(name, encodings)
+        if wire_format is not None:
+            return wire_format, name
+
+    encoding = query_params.get("encoding", ENCODING_JSON)
+    if encoding not in encodings or (encoding == ENCODING_MSGPACK and msgpack is None):
+        encoding = ENCODING_JSON
+    deflate = query_params.get("deflate") in ("1", "true")
+    return WireFormat(encoding, deflate), None
+
+def negotiate_accept(accept_header):
+    """The encoding for a REST response: msgpack if the client accepts it and it is installed."""
+    if msgpack is None or not accept_header:
+        return ENCODING_JSON
+    for part in accept_header.split(","):
+        media_type, _, params = part.strip().partition(";")
+        if media_type.strip() in MSGPACK_MEDIA_TYPES and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            return ENCODING_MSGPACK
+    return ENCODING_JSON
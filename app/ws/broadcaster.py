@@ -0,0 +1,373 @@
+import asyncio
+import time
+
+from app.utils.helpers import json_dumps
+from app.utils.wire import JSON_FORMAT
+from app.ws.conflation import Conflator
+
+# Wire protocols a /ws client can speak.
+PROTOCOL_LEGACY = 1  # Full state on connect, then every message verbatim
+PROTOCOL_DELTA = 2   # Sequence-numbered snapshot, then coalesced deltas
+
+class ClientConnection:
+    """
+    Wraps a single frontend WebSocket with its own bounded outbound queue.
+    A dedicated sender task drains the queue, so a slow client only ever
+    delays itself and never the ingest path or the other clients.
+
+    With a `resync` coroutine (connection -> encoded message), a client that
+    overflows its queue is brought back in sync with the full state instead
+    of silently missing a patch.
+    """
+    def __init__(self, websocket, max_queue_size, initial_messages=None, protocol=PROTOCOL_LEGACY,
+                 wire_format=None, metrics=None, resync=None):
+        self.websocket = websocket
+        self.metrics = metrics
+        self.resync = resync
+        self.needs_resync = False
+        self.protocol = protocol
+        self.wire_format = wire_format or JSON_FORMAT
+        self.subscription = None  # Subscription; None receives everything
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.initial_messages = list(initial_messages or [])
+        self.sender_task = None
+        self.closed = False
+
+        # --- Per-client counters ---
+        self.connected_at = time.time()
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.resyncs = 0
+        self.bytes_sent = 0
+        self.max_queue_depth = 0
+        self.last_send_latency = 0.0
+        self.max_send_latency = 0.0
+        self.total_send_latency = 0.0
+
+    def enqueue(self, message_text, feed=None, received_at=None):
+        """
+        Puts a serialized message on the queue without ever blocking.
+        If the client is lagging and its queue is full, the oldest pending
+        message is dropped to make room for the newest one. With a `resync`,
+        every pending message is dropped instead and the client is flagged to
+        get the full state before anything else: patches only carry what
+        changed, so one missing patch would leave it out of sync for good.
+        `feed` and `received_at` (epoch time the originating F1 frame arrived)
+        only feed the latency metrics.
+        Returns False if a message had to be dropped.
+        """
+        if self.closed:
+            return False
+
+        dropped = False
+        if self.queue.full():
+            if self.resync is not None:
+                self.messages_dropped += self._discard_pending()
+                if not self.needs_resync:
+                    self.needs_resync = True
+                    self.resyncs += 1
+                dropped = True
+            else:
+                try:
+                    self.queue.get_nowait()
+                    self.messages_dropped += 1
+                    dropped = True
+                except asyncio.QueueEmpty:
+                    pass
+
+        self.queue.put_nowait((message_text, feed, received_at))
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return not dropped
+
+    def _discard_pending(self):
+        """Empties the queue and returns how many messages were in it."""
+        discarded = 0
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            discarded += 1
+        return discarded
+
+    async def _send_resync(self):
+        """
+        Sends the full state to a client that lost messages. Everything queued
+        until the state was serialized is already part of it, so it is discarded.
+        """
+        message_text = await self.resync(self)
+        self.messages_dropped += self._discard_pending()
+        self.needs_resync = False
+        await self._send(message_text)
+
+    async def _send(self, message_text, feed=None, received_at=None):
+        """
+        Sends one message and records how long the socket took to accept it.
+        Encoded messages (msgpack or deflated) are bytes and go out as binary frames.
+        """
+        started = time.perf_counter()
+        if isinstance(message_text, bytes):
+            await self.websocket.send_bytes(message_text)
+        else:
+            await self.websocket.send_text(message_text)
+        latency = time.perf_counter() - started
+
+        self.messages_sent += 1
+        self.bytes_sent += len(message_text)
+        self.last_send_latency = latency
+        self.total_send_latency += latency
+        if latency > self.max_send_latency:
+            self.max_send_latency = latency
+        if self.metrics is not None and feed is not None:
+            self.metrics.observe("send", feed, latency)
+            if received_at is not None:
+                self.metrics.observe_delivery(feed, received_at)
+
+    async def run_sender(self):
+        """
+        Drains the queue until the client disconnects or the task is cancelled.
+        The initial messages (e.g. the full state) always go out first and are
+        never subject to the drop policy.
+        """
+        try:
+            while self.initial_messages:
+                await self._send(self.initial_messages.pop(0))
+
+            while True:
+                message_text, feed, received_at = await self.queue.get()
+                if self.needs_resync:
+                    # This message was queued after the drop, so the full state includes it
+                    self.messages_dropped += 1
+                    await self._send_resync()
+                    continue
+                await self._send(message_text, feed, received_at)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # The socket is gone (closed, reset, etc.). Stop sending quietly;
+            # the endpoint's disconnect handler will unregister us.
+            pass
+        finally:
+            self.closed = True
+
+    def get_stats(self):
+        """Returns a snapshot of this client's counters."""
+        average_latency = self.total_send_latency / self.messages_sent if self.messages_sent else 0.0
+        client = getattr(self.websocket, "client", None)
+        return {
+            "client": f"{client.host}:{client.port}" if client else None,
+            "protocol": self.protocol,
+            "wire_format": self.wire_format.to_dict(),
+            "subscription": self.subscription.to_dict() if self.subscription else None,
+            "connected_seconds": round(time.time() - self.connected_at, 1),
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "messages_sent": self.messages_sent,
+            "messages_dropped": self.messages_dropped,
+            "resyncs": self.resyncs,
+            "bytes_sent": self.bytes_sent,
+            "last_send_latency_ms": round(self.last_send_latency * 1000, 3),
+            "avg_send_latency_ms": round(average_latency * 1000, 3),
+            "max_send_latency_ms": round(self.max_send_latency * 1000, 3),
+        }
+
+
+class Broadcaster:
+    """
+    Fans out messages to all connected WebSocket clients.
+    Each message is serialized exactly once and then handed to every client's
+    bounded queue, so broadcasting never waits on the network.
+    """
+    MAX_QUEUE_SIZE = 256  # Pending messages per client before we start dropping
+
+    def __init__(self, max_queue_size=None, metrics=None):
+        self.max_queue_size = max_queue_size or self.MAX_QUEUE_SIZE
+        self.metrics = metrics  # LatencyMetrics, optional
+        # Coroutine (connection -> encoded full state) for clients that overflowed
+        # their queue; without it they just lose their oldest messages
+        self.resync_message = None
+        self.connections = {}  # websocket -> ClientConnection
+        self.conflators = {}   # subscription key -> Conflator, for rate-limited clients
+        self.messages_broadcast = 0
+
+    def serialize(self, data):
+        """Serializes a message once for all clients (with orjson when available)."""
+        return json_dumps(data)
+
+    def encode(self, data, wire_format=None):
+        """Serializes a message for clients using `wire_format` (JSON text by default)."""
+        if wire_format is None or wire_format.is_default:
+            return self.serialize(data)
+        return wire_format.encode(data)
+
+    def _encode_timed(self, data, wire_format, feed):
+        """`encode`, recording the time it took under the "serialize" stage."""
+        started = time.perf_counter()
+        encoded = self.encode(data, wire_format)
+        if self.metrics is not None:
+            self.metrics.observe("serialize", feed, time.perf_counter() - started)
+        return encoded
+
+    def _encode_text(self, message_text, connection, cache):
+        """Adapts an already-serialized JSON message to a client's wire format, once per format."""
+        wire_format = connection.wire_format
+        if wire_format.is_default:
+            return message_text
+        if wire_format.key not in cache:
+            cache[wire_format.key] = wire_format.encode_text(message_text)
+        return cache[wire_format.key]
+
+    def add_client(self, websocket, initial_messages=None, protocol=PROTOCOL_LEGACY, wire_format=None):
+        """
+        Registers a client and starts its sender task.
+        `initial_messages` are already-encoded messages sent before any broadcast.
+        Must be called from inside the running event loop.
+        """
+        connection = ClientConnection(
+            websocket, self.max_queue_size, initial_messages, protocol, wire_format, self.metrics,
+            self.resync_message
+        )
+        connection.sender_task = asyncio.create_task(connection.run_sender())
+        self.connections[websocket] = connection
+        return connection
+
+    def remove_client(self, websocket):
+        """Unregisters a client and stops its sender task. Safe to call twice."""
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.closed = True
+        if connection.sender_task and not connection.sender_task.done():
+            connection.sender_task.cancel()
+        self._prune_conflators()
+
+    def _prune_conflators(self):
+        """Stops the conflators of subscriptions that no client uses any more."""
+        in_use = {c.subscription.key for c in self.connections.values() if c.subscription is not None}
+        for key in [key for key in self.conflators if key not in in_use]:
+            self.conflators.pop(key).stop()
+
+    def set_subscription(self, websocket, subscription):
+        """Changes which messages a client receives from now on."""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.subscription = subscription
+            self._prune_conflators()
+        return connection
+
+    def send_to(self, websocket, data):
+        """Queues a message for one client only, in that client's wire format."""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.enqueue(self.encode(data, connection.wire_format))
+
+    def has_clients(self, protocol=PROTOCOL_LEGACY):
+        """True if at least one client speaks the given protocol."""
+        return any(c.protocol == protocol for c in self.connections.values())
+
+    def publish(self, message_text, protocol=PROTOCOL_LEGACY):
+        """Enqueues an already-serialized JSON message for every client on `protocol`."""
+        self.messages_broadcast += 1
+        encoded = {}
+        for connection in list(self.connections.values()):
+            if connection.protocol == protocol:
+                connection.enqueue(self._encode_text(message_text, connection, encoded), "Snapshot")
+
+    async def broadcast(self, data, received_at=None):
+        """
+        Fans `data` out to legacy clients without awaiting any of them.
+        Each distinct subscription gets its filtered copy, encoded once per
+        wire format; clients whose subscription filters the message out get
+        nothing. Rate-limited subscriptions go through their Conflator instead.
+        """
+        if not self.has_clients(PROTOCOL_LEGACY):
+            return
+        self.messages_broadcast += 1
+        feed = data.get("type", "FullState") if isinstance(data, dict) else "FullState"
+        messages = {}  # subscription key -> filtered message, or None to skip
+        encoded = {}   # (subscription key, wire format key) -> encoded message
+        for connection in list(self.connections.values()):
+            if connection.protocol != PROTOCOL_LEGACY:
+                continue
+            subscription = connection.subscription
+            key = subscription.key if subscription else None
+            if key not in messages:
+                message = subscription.filter_message(data) if subscription else data
+                if message is not None and subscription is not None and subscription.max_rate:
+                    self._get_conflator(subscription).record(message)
+                    message = None
+                messages[key] = message
+            if messages[key] is None:
+                continue
+            encoded_key = (key, connection.wire_format.key)
+            if encoded_key not in encoded:
+                encoded[encoded_key] = self._encode_timed(messages[key], connection.wire_format, feed)
+            connection.enqueue(encoded[encoded_key], feed, received_at)
+
+    def _get_conflator(self, subscription):
+        key = subscription.key
+        conflator = self.conflators.get(key)
+        if conflator is None:
+            conflator = self.conflators[key] = Conflator(
+                subscription.max_rate,
+                lambda messages: self._publish_conflated(key, messages),
+                subscription.to_dict(),
+            )
+        return conflator
+
+    def _publish_conflated(self, key, messages):
+        """Sends one conflation window to every legacy client with subscription `key`."""
+        connections = [
+            c for c in self.connections.values()
+            if c.protocol == PROTOCOL_LEGACY and c.subscription is not None and c.subscription.key == key
+        ]
+        for message in messages:
+            feed = message.get("type", "FullState") if isinstance(message, dict) else "FullState"
+            encoded = {}
+            for connection in connections:
+                wire_key = connection.wire_format.key
+                if wire_key not in encoded:
+                    encoded[wire_key] = self._encode_timed(message, connection.wire_format, feed)
+                connection.enqueue(encoded[wire_key], feed)
+
+    def publish_delta(self, delta, received_at=None):
+        """
+        Fans a v2 `Delta` out to delta clients, trimmed to each subscription.
+        Clients with nothing left in a delta skip it, so their `seq` can jump.
+        Returns the unfiltered serialization (what the resume history keeps).
+        Deltas are always JSON; deflate still applies per client.
+        `received_at` is when the oldest frame in the delta arrived.
+        """
+        message_text = self._encode_timed(delta, None, "Delta")
+        self.messages_broadcast += 1
+        texts = {}    # subscription key -> serialized delta, or None to skip
+        encoded = {}  # subscription key -> {wire format key: encoded delta}
+        for connection in list(self.connections.values()):
+            if connection.protocol != PROTOCOL_DELTA:
+                continue
+            subscription = connection.subscription
+            if subscription is None or subscription.is_everything:
+                # Deltas are already coalesced per tick, so max_rate doesn't apply
+                key = None
+                texts[key] = message_text
+            else:
+                key = subscription.key
+                if key not in texts:
+                    feeds = subscription.filter_feeds(delta["feeds"])
+                    texts[key] = self.serialize({**delta, "feeds": feeds}) if feeds else None
+            if texts[key] is not None:
+                encoded_delta = self._encode_text(texts[key], connection, encoded.setdefault(key, {}))
+                connection.enqueue(encoded_delta, "Delta", received_at)
+        return message_text
+
+    def get_stats(self):
+        """Returns aggregate and per-client fan-out counters."""
+        clients = [connection.get_stats() for connection in self.connections.values()]
+        return {
+            "connected_clients": len(clients),
+            "messages_broadcast": self.messages_broadcast,
+            "max_queue_size": self.max_queue_size,
+            "total_dropped": sum(c["messages_dropped"] for c in clients),
+            "total_resyncs": sum(c["resyncs"] for c in clients),
+            "conflation": [conflator.get_stats() for conflator in self.conflators.values()],
+            "clients": clients,
+        }
@@ -0,0 +1,107 @@
+import asyncio
+
+# Messages whose payloads are partial updates of a nested feed. Within one
+# window they are merged together, so a driver line touched ten times is sent once.
+MERGE_TYPES = {"TimingData", "TimingAppData", "TimingStats", "DriverList", "TopThree", "Leaderboard"}
+
+# Messages that are discrete events. Every one of them must reach the client,
+# so within one window they are batched in arrival order instead of merged.
+EVENT_TYPES = {"NewLap", "NewPitStop", "NewTeamRadio", "RaceControlMessages"}
+
+def _merge_into(destination, source):
+    """
+    Merges `source` into `destination` like `deep_merge`, but always builds
+    fresh dictionaries on the destination side. Payload dicts are shared with
+    the live state, so they must never be mutated by a coalescing buffer.
+    """
+    for key, value in source.items():
+        if isinstance(value, dict):
+            existing = destination.get(key)
+            if not isinstance(existing, dict):
+                existing = destination[key] = {}
+            _merge_into(existing, value)
+        else:
+            destination[key] = value
+    return destination
+
+def coalesce(pending, message_type, payload):
+    """
+    Folds one message into `pending` (message type -> payload): partial
+    updates are merged, events are appended to a list and anything else
+    (LapCount, WeatherData, ...) is replaced by its latest value.
+    """
+    if message_type in MERGE_TYPES and isinstance(payload, dict):
+        _merge_into(pending.setdefault(message_type, {}), payload)
+    elif message_type in EVENT_TYPES:
+        pending.setdefault(message_type, []).append(payload)
+    else:
+        pending[message_type] = payload
+
+
+class Conflator:
+    """
+    Rate limiter for the legacy /ws protocol, shared by every client with
+    the same subscription. Messages are coalesced per type and flushed at
+    most once per window as ordinary `{"type", "data"}` messages, so a client
+    on a slow link always receives the latest values instead of a backlog.
+    """
+    def __init__(self, max_rate, flush, description=None):
+        self.max_rate = max_rate
+        self.interval = 1.0 / max_rate
+        self.description = description or {}
+        self.flush_callback = flush  # Called with the list of messages of each window
+        self.pending = {}
+        self.full_state = None
+        self.messages_in = 0
+        self.messages_out = 0
+        self._task = None
+
+    def record(self, message):
+        """Coalesces one (already filtered) broadcast into the current window."""
+        self.messages_in += 1
+        if isinstance(message, dict) and "type" in message:
+            coalesce(self.pending, message["type"], message.get("data"))
+        else:
+            # The full state supersedes everything recorded before it
+            self.full_state = message
+            self.pending = {}
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def drain(self):
+        """Returns the messages of the current window and starts a new one."""
+        messages = [] if self.full_state is None else [self.full_state]
+        for message_type, payload in self.pending.items():
+            if message_type in EVENT_TYPES:
+                # Each event still goes out as its own message, in order
+                messages.extend({"type": message_type, "data": event} for event in payload)
+            else:
+                messages.append({"type": message_type, "data": payload})
+        self.pending = {}
+        self.full_state = None
+        self.messages_out += len(messages)
+        return messages
+
+    async def _run(self):
+        """Flushes one window per interval, and stops once a window was empty."""
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                messages = self.drain()
+                if not messages:
+                    return
+                self.flush_callback(messages)
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    def get_stats(self):
+        return {
+            **self.description,
+            "max_rate": self.max_rate,
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+        }
@@ -0,0 +1,133 @@
+import asyncio
+import collections
+import time
+
+from app.ws.broadcaster import PROTOCOL_DELTA
+from app.ws.conflation import coalesce
+
+# Heavy parts of the state that clients never need in a snapshot.
+# Lap history is served by /api/laps. Telemetry is pushed as CarData/Position
+# deltas as it arrives; the latest sample per car is on /api/cardata and /api/location.
+SNAPSHOT_EXCLUDED_FEEDS = {"CarData", "Position", "LapHistory"}
+
+
+class DeltaStream:
+    """
+    Implements the versioned diff protocol (v2) for /ws.
+
+    Clients first receive a sequence-numbered `Snapshot` of the state, then a
+    `Delta` message per tick holding every feed that changed in that tick,
+    coalesced per feed. The last deltas are kept in a ring buffer so that a
+    client reconnecting with a known sequence number only gets what it missed.
+    """
+    TICK_INTERVAL = 0.2   # Seconds between delta flushes
+    HISTORY_SIZE = 600    # Deltas kept for reconnects (~2 minutes at 200 ms)
+
+    def __init__(self, state_manager, tick_interval=None, history_size=None):
+        self.state_manager = state_manager
+        self.tick_interval = tick_interval or self.TICK_INTERVAL
+        self.seq = 0
+        self.history = collections.deque(maxlen=history_size or self.HISTORY_SIZE)  # (seq, text)
+        self.pending = {}
+        self.pending_received_at = None  # Arrival time of the oldest frame in `pending`
+        self._task = None
+
+    def ensure_running(self):
+        """Starts the tick loop on the running event loop if it isn't already."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.tick_interval)
+                self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    def record(self, message_type, payload, received_at=None):
+        """Coalesces one outgoing message into the current tick."""
+        coalesce(self.pending, message_type, payload)
+        if received_at is not None and (self.pending_received_at is None or received_at < self.pending_received_at):
+            self.pending_received_at = received_at
+
+    def flush(self):
+        """
+        Turns everything recorded since the last tick into one `Delta`
+        message, stores it in the ring buffer and fans it out.
+        """
+        if not self.pending:
+            return None
+
+        self.seq += 1
+        delta = {
+            "type": "Delta",
+            "v": PROTOCOL_DELTA,
+            "seq": self.seq,
+            "ts": time.time(),
+            "feeds": self.pending,
+        }
+        received_at, self.pending = self.pending_received_at, {}
+        self.pending_received_at = None
+
+        message_text = self.state_manager.broadcaster.publish_delta(delta, received_at)
+        self.history.append((self.seq, message_text))
+        return message_text
+
+    def build_snapshot(self):
+        """
+        Serializes a compact snapshot of the state tagged with the current
+        sequence number. Pending changes are flushed first so the snapshot
+        and the following deltas never overlap.
+        """
+        self.flush()
+        state = self.state_manager.get_full_state()
+        compact_state = {k: v for k, v in state.items() if k not in SNAPSHOT_EXCLUDED_FEEDS}
+        # Baseline for the "Leaderboard" row deltas
+        compact_state["Leaderboard"] = self.state_manager.leaderboard.rows
+        return self.state_manager.broadcaster.serialize({
+            "type": "Snapshot",
+            "v": PROTOCOL_DELTA,
+            "seq": self.seq,
+            "data": compact_state,
+        })
+
+    def resync(self):
+        """
+        Pushes a fresh snapshot to every v2 client, e.g. after a new "R" message
+        or a session change. The deltas before it can't be replayed on top of
+        the replaced state, so the sequence moves past them and they are
+        dropped: a client resuming from any earlier `since` gets a snapshot.
+        """
+        self.flush()
+        self.seq += 1
+        self.history.clear()
+        broadcaster = self.state_manager.broadcaster
+        if broadcaster.has_clients(PROTOCOL_DELTA):
+            broadcaster.publish(self.build_snapshot(), protocol=PROTOCOL_DELTA)
+
+    def messages_since(self, last_seq):
+        """
+        Returns the serialized deltas a client needs to catch up from
+        `last_seq`, or None if they are no longer in the ring buffer and the
+        client needs a full snapshot instead.
+        """
+        self.flush()
+        if last_seq is None or last_seq > self.seq:
+            return None
+        if last_seq == self.seq:
+            return []
+        if not self.history or self.history[0][0] > last_seq + 1:
+            return None
+        return [text for seq, text in self.history if seq > last_seq]
+
+    def initial_messages(self, last_seq=None):
+        """The messages a (re)connecting v2 client should receive first."""
+        missed = self.messages_since(last_seq)
+        if missed is not None:
+            return missed
+        return [self.build_snapshot()]
@@ -0,0 +1,137 @@
+from app.ws.conflation import EVENT_TYPES
+
+# Messages whose payload is keyed by driver number, directly or under "Lines"
+DRIVER_LINES_TYPES = {"TimingData", "TimingAppData", "TimingStats"}
+DRIVER_KEYED_TYPES = {"Leaderboard", "DriverList"}
+
+def _parse_list(value):
+    """
+    Accepts a list or a comma-separated string. Empty or missing means "everything".
+    Raises ValueError for anything else (e.g. a bare number).
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    elif not isinstance(value, list):
+        raise ValueError(f"Expected a list or a comma-separated string, got {type(value).__name__}")
+    items = {str(item).strip() for item in value if str(item).strip()}
+    return frozenset(items) or None
+
+def _parse_rate(value):
+    """A positive number of updates per second, or None for "unlimited"."""
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        return None
+    if rate <= 0 or rate != rate:
+        return None
+    return min(rate, Subscription.MAX_RATE)
+
+
+class Subscription:
+    """
+    What a /ws client wants to receive: a set of message types ("feeds") and
+    a set of driver numbers, either of which may be None for "all", and
+    optionally a maximum number of updates per second ("max_rate").
+
+    Clients send it as `{"type": "subscribe", "feeds": [...], "drivers": [...], "max_rate": 2}`
+    (or `?feeds=...&drivers=...&max_rate=...` on connect). Full-state messages are always sent.
+    Raises ValueError if `feeds` or `drivers` is neither a list nor a string.
+    """
+    __slots__ = ("feeds", "drivers", "max_rate")
+
+    MAX_RATE = 50.0  # Faster than this isn't worth a timer per subscription
+
+    def __init__(self, feeds=None, drivers=None, max_rate=None):
+        self.feeds = _parse_list(feeds)
+        self.drivers = _parse_list(drivers)
+        self.max_rate = _parse_rate(max_rate)
+
+    @property
+    def key(self):
+        """Clients with equal keys get byte-identical messages, so they share one serialization."""
+        return (self.feeds, self.drivers, self.max_rate)
+
+    @property
+    def is_everything(self):
+        """True if no message is filtered out (a rate limit may still apply)."""
+        return self.feeds is None and self.drivers is None
+
+    @property
+    def is_default(self):
+        return self.is_everything and self.max_rate is None
+
+    def to_dict(self):
+        return {
+            "feeds": sorted(self.feeds) if self.feeds is not None else None,
+            "drivers": sorted(self.drivers, key=lambda d: (len(d), d)) if self.drivers is not None else None,
+            "max_rate": self.max_rate,
+        }
+
+    # ------------------------------------------------------------------
+    # Filtering
+    # ------------------------------------------------------------------
+
+    def _driver_of(self, message_type, item):
+        if not isinstance(item, dict):
+            return None
+        if message_type == "NewTeamRadio":
+            return item.get("RacingNumber")
+        return item.get("driver_number")
+
+    def filter_payload(self, message_type, payload):
+        """
+        Returns the part of one message's payload this subscription wants,
+        or None if it wants none of it. Never mutates `payload`.
+        """
+        if self.feeds is not None and message_type not in self.feeds:
+            return None
+        if self.drivers is None or not isinstance(payload, (dict, list)):
+            return payload
+
+        if message_type in DRIVER_LINES_TYPES and isinstance(payload, dict):
+            lines = payload.get("Lines")
+            if not isinstance(lines, dict):
+                return payload
+            filtered_lines = {d: line for d, line in lines.items() if d in self.drivers}
+            if not filtered_lines and len(payload) == 1:
+                return None
+            return {**payload, "Lines": filtered_lines}
+
+        if message_type in DRIVER_KEYED_TYPES and isinstance(payload, dict):
+            filtered = {d: value for d, value in payload.items() if d in self.drivers}
+            return filtered or None
+
+        if message_type in EVENT_TYPES:
+            if isinstance(payload, list):
+                # Batched events, as in a delta
+                filtered = [item for item in payload if self._wants_event(message_type, item)]
+                return filtered or None
+            return payload if self._wants_event(message_type, payload) else None
+
+        return payload
+
+    def _wants_event(self, message_type, item):
+        driver = self._driver_of(message_type, item)
+        return driver is None or str(driver) in self.drivers
+
+    def filter_message(self, message):
+        """Filters a `{"type", "data"}` broadcast. Untyped messages (the full state) pass through."""
+        if self.is_everything or not isinstance(message, dict) or "type" not in message:
+            return message
+        data = self.filter_payload(message["type"], message.get("data"))
+        if data is None:
+            return None
+        return {**message, "data": data}
+
+    def filter_feeds(self, feeds):
+        """Filters the `feeds` dict of a v2 Delta. Returns None if nothing is left."""
+        if self.is_everything:
+            return feeds
+        filtered = {}
+        for message_type, payload in feeds.items():
+            payload = self.filter_payload(message_type, payload)
+            if payload is not None:
+                filtered[message_type] = payload
+        return filtered or None
@@ -0,0 +1,254 @@
+# /benchmarks/fake_signalr.py
+"""
+A local stand-in for livetiming.formula1.com/signalr, for stress and chaos
+testing the LIVE ingest path offline:
+
+    python -m benchmarks.fake_signalr [--port 8765] [--drivers 20] [--timing-rate 20]
+                                      [--car-data-rate 4] [--position-rate 4]
+                                      [--disconnect-every 30] [--negotiate-failure-rate 0.2]
+                                      [--snapshot-every 10]
+    F1_BASE_URL=http://localhost:8765/signalr MODE=LIVE python main.py
+
+It speaks the subset of SignalR 1.5 the processor uses: GET /negotiate
+returns a connection token, GET /connect upgrades to a WebSocket, and the
+"Subscribe" invocation is answered with an "R" snapshot. After that it
+streams TimingData, CarData.z and Position.z at the configured rates
+(messages per second), plus a heartbeat. Chaos options:
+
+  --disconnect-every S        close each connection after ~S seconds (±50%)
+  --negotiate-failure-rate P  fail that fraction of negotiations with a 503
+  --snapshot-every S          push an unsolicited "R" snapshot every S seconds
+
+GET /stats reports connections, frames sent and injected faults.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+from aiohttp import WSMsgType, web
+
+from benchmarks.synthetic import (
+    build_snapshot, car_data_payload, driver_numbers, feed_message, format_lap_time, position_payload,
+)
+
+HEARTBEAT_INTERVAL = 5.0
+
+
+class LiveSession:
+    """
+    One endless synthetic session. Lap progress follows the wall clock, so a
+    client that reconnects picks the race up where it now is.
+    """
+    def __init__(self, drivers=20, seed=2025):
+        self.rng = random.Random(seed)
+        self.numbers = driver_numbers(drivers)
+        self.started = time.monotonic()
+        self.base_lap = {number: 82.0 + i * 0.15 for i, number in enumerate(self.numbers)}
+        self.next_lap_at = {number: self.base_lap[number] for number in self.numbers}
+        self.laps_done = {number: 0 for number in self.numbers}
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def snapshot(self):
+        snapshot = build_snapshot(datetime.now(timezone.utc), self.numbers)
+        for number, line in snapshot["TimingData"]["Lines"].items():
+            line["NumberOfLaps"] = self.laps_done[number]
+        return snapshot
+
+    def timing_data(self):
+        """Gap updates for a few drivers, plus any laps completed since the last call."""
+        rng = self.rng
+        lines = {}
+        for number in rng.sample(self.numbers, min(3, len(self.numbers))):
+            position = self.numbers.index(number)
+            lines[number] = {
+                "GapToLeader": "" if position == 0 else f"+{position * 0.8 + rng.uniform(0, 0.4):.3f}",
+                "IntervalToPositionAhead": {"Value": "" if position == 0 else f"+{rng.uniform(0.2, 1.5):.3f}"},
+                "Sectors": {str(rng.randint(0, 2)): {"Value": f"{rng.uniform(26, 29):.3f}"}},
+            }
+        elapsed = self.elapsed()
+        for number in self.numbers:
+            if elapsed < self.next_lap_at[number]:
+                continue
+            lap_seconds = self.base_lap[number] + rng.uniform(-0.4, 0.6)
+            self.next_lap_at[number] += lap_seconds
+            self.laps_done[number] += 1
+            lines.setdefault(number, {}).update({
+                "NumberOfLaps": self.laps_done[number], "LastLapTime": {"Value": format_lap_time(lap_seconds)}
+            })
+        return {"Lines": lines}
+
+    def car_data(self):
+        return car_data_payload(datetime.now(timezone.utc), self.numbers, self.rng)
+
+    def position(self):
+        return position_payload(datetime.now(timezone.utc), self.numbers, self.rng)
+
+
+class FakeSignalRServer:
+    """aiohttp application serving `/signalr/negotiate`, `/signalr/connect` and `/stats`."""
+    def __init__(self, drivers=20, timing_rate=20.0, car_data_rate=4.0, position_rate=4.0,
+                 disconnect_every=None, negotiate_failure_rate=0.0, snapshot_every=None, seed=2025):
+        self.session = LiveSession(drivers, seed)
+        self.rates = {"TimingData": timing_rate, "CarData.z": car_data_rate, "Position.z": position_rate}
+        self.disconnect_every = disconnect_every
+        self.negotiate_failure_rate = negotiate_failure_rate
+        self.snapshot_every = snapshot_every
+        self.rng = random.Random(seed + 1)
+        self.tokens = set()
+        self.stats = {
+            "negotiations": 0,
+            "negotiate_failures": 0,
+            "connections": 0,
+            "active_connections": 0,
+            "disconnects_injected": 0,
+            "snapshots_sent": 0,
+            "frames_sent": 0,
+            "bytes_sent": 0,
+        }
+
+        self.app = web.Application()
+        self.app.router.add_get("/signalr/negotiate", self.negotiate)
+        self.app.router.add_get("/signalr/connect", self.connect)
+        self.app.router.add_get("/stats", self.get_stats)
+
+    def _payload(self, feed_name):
+        if feed_name == "TimingData":
+            return self.session.timing_data()
+        if feed_name == "CarData.z":
+            return self.session.car_data()
+        return self.session.position()
+
+    async def negotiate(self, request):
+        self.stats["negotiations"] += 1
+        if self.rng.random() < self.negotiate_failure_rate:
+            self.stats["negotiate_failures"] += 1
+            raise web.HTTPServiceUnavailable(text="Injected negotiation failure")
+        token = uuid.uuid4().hex
+        self.tokens.add(token)
+        return web.json_response({
+            "Url": "/signalr", "ConnectionToken": token, "ConnectionId": str(uuid.uuid4()),
+            "KeepAliveTimeout": 20.0, "DisconnectTimeout": 30.0, "TryWebSockets": True,
+            "ProtocolVersion": "1.5", "TransportConnectTimeout": 10.0, "LongPollDelay": 0.0,
+        })
+
+    async def connect(self, request):
+        token = request.query.get("connectionToken")
+        if token not in self.tokens:
+            raise web.HTTPBadRequest(text="Unknown connection token")
+        self.tokens.discard(token)
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.stats["connections"] += 1
+        self.stats["active_connections"] += 1
+        try:
+            await self._serve(ws)
+        finally:
+            self.stats["active_connections"] -= 1
+        return ws
+
+    async def _send(self, ws, message):
+        text = json.dumps(message, separators=(",", ":"))
+        await ws.send_str(text)
+        self.stats["frames_sent"] += 1
+        self.stats["bytes_sent"] += len(text)
+
+    async def _send_snapshot(self, ws, invocation_id=None):
+        message = {"R": self.session.snapshot()}
+        if invocation_id is not None:
+            message["I"] = str(invocation_id)
+        await self._send(ws, message)
+        self.stats["snapshots_sent"] += 1
+
+    async def _serve(self, ws):
+        # Nothing is streamed until the client subscribes, as on the real service
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                return
+            invocation = json.loads(msg.data)
+            if invocation.get("M") == "Subscribe":
+                await self._send_snapshot(ws, invocation.get("I"))
+                break
+
+        reader = asyncio.create_task(self._drain(ws))
+        try:
+            await self._stream(ws)
+        except ConnectionResetError:
+            pass
+        finally:
+            reader.cancel()
+
+    async def _drain(self, ws):
+        """Reads (and ignores) client frames so closes and pings are handled."""
+        async for _ in ws:
+            pass
+
+    async def _stream(self, ws):
+        now = time.monotonic()
+        intervals = {feed: 1.0 / rate for feed, rate in self.rates.items() if rate > 0}
+        due = dict.fromkeys(intervals, now)
+        heartbeat_at = now + HEARTBEAT_INTERVAL
+        snapshot_at = now + self.snapshot_every if self.snapshot_every else None
+        disconnect_at = None
+        if self.disconnect_every:
+            disconnect_at = now + self.disconnect_every * self.rng.uniform(0.5, 1.5)
+
+        while not ws.closed:
+            now = time.monotonic()
+            if disconnect_at is not None and now >= disconnect_at:
+                self.stats["disconnects_injected"] += 1
+                await ws.close(code=1011, message=b"Injected disconnect")
+                return
+            if snapshot_at is not None and now >= snapshot_at:
+                await self._send_snapshot(ws)
+                snapshot_at = now + self.snapshot_every
+
+            # Feeds that are due go out batched in one hub message, like the real server does
+            feeds = []
+            for feed_name, interval in intervals.items():
+                if now >= due[feed_name]:
+                    feeds.append((feed_name, self._payload(feed_name)))
+                    due[feed_name] = max(due[feed_name] + interval, now - interval)
+            if feeds:
+                await self._send(ws, feed_message(datetime.now(timezone.utc), *feeds))
+            if now >= heartbeat_at:
+                await self._send(ws, {})
+                heartbeat_at = now + HEARTBEAT_INTERVAL
+
+            wake_at = min([*due.values(), heartbeat_at] + [t for t in (snapshot_at, disconnect_at) if t])
+            await asyncio.sleep(max(0.0, wake_at - time.monotonic()))
+
+    async def get_stats(self, request):
+        return web.json_response({**self.stats, "laps": sum(self.session.laps_done.values())})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--timing-rate", type=float, default=20.0, help="TimingData messages per second")
+    parser.add_argument("--car-data-rate", type=float, default=4.0, help="CarData.z messages per second")
+    parser.add_argument("--position-rate", type=float, default=4.0, help="Position.z messages per second")
+    parser.add_argument("--disconnect-every", type=float, help="Seconds before a connection is dropped (±50%%)")
+    parser.add_argument("--negotiate-failure-rate", type=float, default=0.0)
+    parser.add_argument("--snapshot-every", type=float, help="Seconds between unsolicited snapshots")
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args()
+
+    server = FakeSignalRServer(
+        drivers=args.drivers, timing_rate=args.timing_rate, car_data_rate=args.car_data_rate,
+        position_rate=args.position_rate, disconnect_every=args.disconnect_every,
+        negotiate_failure_rate=args.negotiate_failure_rate, snapshot_every=args.snapshot_every, seed=args.seed,
+    )
+    print(f"Fake SignalR feed on http://{args.host}:{args.port}/signalr")
+    web.run_app(server.app, host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# /benchmarks/fanout.py
+"""
+Load tests the serving side at 10/100/1,000 simulated clients:
+
+  - /api/leaderboard: concurrent clients in-process over httpx's ASGI
+    transport (no sockets, so the numbers are the app's own cost).
+  - /ws fan-out: clients registered with the broadcaster while a replay is
+    processed; reports messages delivered per second and drops.
+
+    python -m benchmarks.fanout [--replay session.jsonl] [--clients 10,100,1000]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from app.api.main import app, get_state_manager
+from app.state.state_manager import StateManager
+from benchmarks.ingest import load_entries, percentile, process_entries
+
+CLIENT_COUNTS = (10, 100, 1000)
+LEADERBOARD_REQUESTS = 2000  # Spread over the clients of each run
+FANOUT_FRAMES = 1000         # Frames replayed per /ws run
+
+
+class _BenchSocket:
+    """A WebSocket that accepts everything instantly, so only our side is measured."""
+    __slots__ = ("messages", "bytes", "client")
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.client = None
+
+    async def send_text(self, text):
+        self.messages += 1
+        self.bytes += len(text)
+
+    async def send_bytes(self, data):
+        self.messages += 1
+        self.bytes += len(data)
+
+
+async def leaderboard_load(state_manager, clients, total_requests=LEADERBOARD_REQUESTS):
+    app.dependency_overrides[get_state_manager] = lambda: state_manager
+    requests_per_client = max(1, total_requests // clients)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def run_client():
+            for _ in range(requests_per_client):
+                started = time.perf_counter()
+                response = await client.get("/api/leaderboard")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_client() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+async def ws_fanout(entries, clients):
+    state_manager = StateManager()
+    sockets = [_BenchSocket() for _ in range(clients)]
+    for socket in sockets:
+        await state_manager.add_client(socket)
+
+    started = time.perf_counter()
+    # Yield after every frame, as reading the F1 socket would, so senders get to run
+    await process_entries(entries, state_manager, yield_every=1)
+    while any(c.queue.qsize() for c in state_manager.broadcaster.connections.values()):
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+
+    stats = state_manager.get_client_stats()
+    for socket in sockets:
+        state_manager.remove_client(socket)
+    state_manager.delta_stream.stop()
+    delivered = sum(socket.messages for socket in sockets)
+    return {
+        "clients": clients,
+        "broadcasts": stats["messages_broadcast"],
+        "delivered": delivered,
+        "delivered_per_second": round(delivered / elapsed, 1),
+        "dropped": stats["total_dropped"],
+        "elapsed_s": round(elapsed, 3),
+    }
+
+def run_fanout(entries, client_counts=CLIENT_COUNTS, fanout_frames=FANOUT_FRAMES):
+    """Returns {"leaderboard": [...], "ws": [...]}, one result per client count."""
+    state_manager = asyncio.run(process_entries(entries))
+    results = {"leaderboard": [], "ws": []}
+    for clients in client_counts:
+        results["leaderboard"].append(asyncio.run(leaderboard_load(state_manager, clients)))
+        results["ws"].append(asyncio.run(ws_fanout(entries[:fanout_frames], clients)))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replay", help="Replay archive; defaults to the synthetic session")
+    parser.add_argument("--clients", default=",".join(map(str, CLIENT_COUNTS)))
+    args = parser.parse_args()
+    client_counts = [int(count) for count in args.clients.split(",")]
+    print(json.dumps(run_fanout(load_entries(args.replay), client_counts), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# /benchmarks/ingest.py
+"""
+Ingest throughput: feeds a replay through F1StreamProcessor with no sleeps
+(what ReplayEngine does at speed "max") and reports messages/sec, per-frame
+processing time percentiles, peak RSS and allocations.
+
+    python -m benchmarks.ingest [--replay session.jsonl[.gz|.zst]]
+
+Without --replay the deterministic synthetic session is used.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from app.state.state_manager import StateManager
+from app.streaming.f1_stream_processor import F1StreamProcessor
+from app.streaming.recorder import open_archive
+from benchmarks.synthetic import generate_session
+
+def load_entries(replay=None):
+    """Reads a replay archive, or generates the synthetic session."""
+    if replay is None:
+        return generate_session()
+    with open_archive(replay) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def peak_rss_bytes():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+async def process_entries(entries, state_manager=None, timings=None, yield_every=0):
+    """
+    Runs every entry through a fresh processor. Appends each frame's
+    processing time to `timings` if given. With `yield_every`, the loop
+    yields to other tasks (e.g. WebSocket senders) every that many frames.
+    """
+    state_manager = state_manager or StateManager()
+    processor = F1StreamProcessor(state_manager, quiet=True)
+    for index, entry in enumerate(entries):
+        message_time = datetime.fromisoformat(entry["timestamp"])
+        started = time.perf_counter()
+        await processor._process_log_entry(entry, message_time)
+        if timings is not None:
+            timings.append(time.perf_counter() - started)
+        if yield_every and index % yield_every == 0:
+            await asyncio.sleep(0)
+    return state_manager
+
+def run_ingest(entries):
+    """Returns the ingest metrics for one replay."""
+    timings = []
+    started = time.perf_counter()
+    state_manager = asyncio.run(process_entries(entries, timings=timings))
+    elapsed = time.perf_counter() - started
+
+    # Allocation tracking slows everything down, so it gets a pass of its own
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    asyncio.run(process_entries(entries))
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "frames": len(entries),
+        "messages_per_second": round(len(entries) / elapsed, 1),
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 4),
+        "max_ms": round(max(timings) * 1000, 4),
+        "peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+        "traced_peak_mb": round(traced_peak / 2 ** 20, 2),
+        "retained_blocks": sys.getallocatedblocks() - blocks_before,
+        "laps_recorded": len(state_manager.state["LapHistory"]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replay", help="Replay archive; defaults to the synthetic session")
+    args = parser.parse_args()
+    print(json.dumps(run_ingest(load_entries(args.replay)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# /benchmarks/run.py
+"""
+Runs the ingest and fan-out benchmarks on one replay and compares the
+results with a stored baseline:
+
+    python -m benchmarks.run                          # synthetic session vs baselines/synthetic.json
+    python -m benchmarks.run --replay session.jsonl.gz --baseline baselines/monaco.json
+    python -m benchmarks.run --save-baseline          # record this machine's numbers as the baseline
+    python -m benchmarks.run --output results.json    # keep the full results (e.g. as a CI artifact)
+
+Everything is run --repeat times (default 5) and each metric is the
+median of the runs, since a single run is too noisy to compare. A metric
+regresses when it is worse than the baseline by more than --tolerance
+(default 20%), or --tail-tolerance (default 50%) for p99 latencies, which
+still swing widely between runs. Any regression makes the exit status 1.
+Baselines are only comparable on the same machine and the same replay;
+the replay descriptor is checked, the machine is recorded for reference.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks.fanout import CLIENT_COUNTS, run_fanout
+from benchmarks.ingest import load_entries, run_ingest
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+DEFAULT_BASELINE = os.path.join(BASELINE_DIR, "synthetic.json")
+SYNTHETIC_SEED = 2025
+REPEATS = 5
+TAIL_METRICS = {"p99_ms"}
+# A high-water mark for the whole process: later runs inherit the earlier runs' peak
+FIRST_RUN_METRICS = {"peak_rss_mb"}
+
+# Compared metrics: dotted path into the results -> True if higher is better
+HIGHER_IS_BETTER = {
+    "messages_per_second": True,
+    "requests_per_second": True,
+    "delivered_per_second": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "peak_rss_mb": False,
+    "traced_peak_mb": False,
+    "dropped": False,
+}
+
+def describe_replay(replay):
+    if replay is None:
+        return {"source": "synthetic", "seed": SYNTHETIC_SEED}
+    digest = hashlib.sha256()
+    with open(replay, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {"source": os.path.basename(replay), "sha256": digest.hexdigest()}
+
+def describe_environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+def run_all(replay=None, client_counts=CLIENT_COUNTS, repeats=REPEATS):
+    entries = load_entries(replay)
+    runs = []
+    for _ in range(max(1, repeats)):
+        runs.append({"ingest": run_ingest(entries), **run_fanout(entries, client_counts)})
+    return {
+        "replay": describe_replay(replay),
+        "environment": describe_environment(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "repeats": len(runs),
+        **median_of_runs(runs),
+    }
+
+def median_of_runs(runs):
+    """
+    The first run's results, with every compared metric replaced by its
+    median over all runs (except FIRST_RUN_METRICS, kept from the first run).
+    """
+    result = runs[0]
+    for name in result["ingest"]:
+        if name in HIGHER_IS_BETTER and name not in FIRST_RUN_METRICS:
+            result["ingest"][name] = statistics.median(run["ingest"][name] for run in runs)
+    for section in ("leaderboard", "ws"):
+        for index, entry in enumerate(result.get(section, [])):
+            for name in entry:
+                if name in HIGHER_IS_BETTER:
+                    entry[name] = statistics.median(run[section][index][name] for run in runs)
+    return result
+
+def _metrics(results):
+    """Flattens results into {"ingest.p99_ms": value, "ws.1000.dropped": value, ...} for compared metrics."""
+    flat = {}
+    for name, value in results["ingest"].items():
+        if name in HIGHER_IS_BETTER:
+            flat[f"ingest.{name}"] = value
+    for section in ("leaderboard", "ws"):
+        for run in results.get(section, []):
+            for name, value in run.items():
+                if name in HIGHER_IS_BETTER:
+                    flat[f"{section}.{run['clients']}.{name}"] = value
+    return flat
+
+def compare(results, baseline, tolerance, tail_tolerance=None):
+    """
+    Returns a list of (metric, baseline, current, change, regressed) rows.
+    Tail latencies (TAIL_METRICS) are held to `tail_tolerance` if given.
+    """
+    rows = []
+    current = _metrics(results)
+    for metric, before in _metrics(baseline).items():
+        after = current.get(metric)
+        if after is None or before is None:
+            continue
+        name = metric.rsplit(".", 1)[-1]
+        higher_is_better = HIGHER_IS_BETTER[name]
+        allowed = tail_tolerance if tail_tolerance is not None and name in TAIL_METRICS else tolerance
+        if before == 0:
+            change = 0.0 if after == 0 else float("inf")
+        else:
+            change = (after - before) / before
+        worse = -change if higher_is_better else change
+        rows.append((metric, before, after, change, worse > allowed))
+    return rows
+
+def print_comparison(rows):
+    print(f"{'metric':<36} {'baseline':>12} {'current':>12} {'change':>9}")
+    for metric, before, after, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{metric:<36} {before:>12} {after:>12} {change:>+8.1%}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replay", help="Replay archive; defaults to the synthetic session")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline and exit")
+    parser.add_argument("--output", help="Also write the full results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--tail-tolerance", type=float, default=0.5, help="Tolerance for p99 latencies")
+    parser.add_argument("--repeat", type=int, default=REPEATS, help="Runs to take the median of")
+    parser.add_argument("--clients", default=",".join(map(str, CLIENT_COUNTS)))
+    args = parser.parse_args()
+
+    results = run_all(args.replay, [int(count) for count in args.clients.split(",")], args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(json.dumps(results, indent=2))
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("replay") != results["replay"]:
+        print(f"Baseline was recorded on a different replay ({baseline.get('replay')}); not comparing.")
+        return 1
+
+    rows = compare(results, baseline, args.tolerance, args.tail_tolerance)
+    print_comparison(rows)
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed beyond the tolerance "
+              f"({args.tolerance:.0%}, {args.tail_tolerance:.0%} for p99).")
+        return 1
+    print("No regressions.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# /benchmarks/synthetic.py
+"""
+Generates a deterministic, race-like session in the replay format
+(`{"timestamp", "type", "data"}` per line), so benchmarks are reproducible
+without shipping a recorded session:
+
+    python -m benchmarks.synthetic out.jsonl [--drivers 20] [--laps 5] [--seed 2025]
+
+The mix mirrors a live race: an "R" snapshot, then TimingData updates for a
+few drivers per 250 ms tick, CarData.z and Position.z for every car, lap
+completions, a pit stop per driver, race control messages and team radio.
+"""
+import argparse
+import base64
+import json
+import random
+import zlib
+from datetime import datetime, timedelta, timezone
+
+DRIVER_NUMBERS = ["1", "4", "16", "44", "63", "81", "55", "11", "14", "18",
+                  "10", "31", "22", "27", "23", "2", "24", "77", "20", "3"]
+TICK = 0.25  # Seconds between telemetry samples
+START = datetime(2025, 5, 25, 13, 0, tzinfo=timezone.utc)
+
+def _iso(moment):
+    return moment.isoformat().replace("+00:00", "Z")
+
+def format_lap_time(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:06.3f}"
+
+def _compress(payload):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.b64encode(compressor.compress(body) + compressor.flush()).decode("ascii")
+
+def driver_numbers(count):
+    """The real grid's numbers first, then made-up ones for bigger fields."""
+    return (DRIVER_NUMBERS + [str(100 + i) for i in range(max(0, count - len(DRIVER_NUMBERS)))])[:count]
+
+def feed_message(moment, *feeds):
+    """A SignalR hub message carrying one or more (feed name, payload) updates."""
+    return {"M": [{"H": "Streaming", "M": "feed", "A": [feed_name, payload, _iso(moment)]}
+                  for feed_name, payload in feeds]}
+
+def _feed_frame(moment, feed_name, payload):
+    return {"timestamp": moment.isoformat(), "type": "text", "data": json.dumps(feed_message(moment, (feed_name, payload)))}
+
+def build_snapshot(moment, drivers):
+    """The "R" payload a client receives after subscribing."""
+    return {
+        "SessionInfo": {
+            "Key": 9999, "Name": "Race", "Type": "Race",
+            "Meeting": {"Key": 1999, "Name": "Synthetic Grand Prix", "Circuit": {"ShortName": "Monza"},
+                        "Country": {"Name": "Italy"}, "Location": "Monza"},
+            "StartDate": moment.isoformat(), "EndDate": (moment + timedelta(hours=2)).isoformat(),
+        },
+        "DriverList": {
+            number: {"RacingNumber": number, "BroadcastName": f"D {number}", "FullName": f"Driver {number}",
+                     "Tla": f"D{number:0>2}", "TeamName": f"Team {i // 2}", "TeamColour": "3671C6",
+                     "FirstName": "Driver", "LastName": number, "Line": i + 1}
+            for i, number in enumerate(drivers)
+        },
+        "TimingData": {"Lines": {
+            number: {"Position": str(i + 1), "NumberOfLaps": 0, "GapToLeader": "" if i == 0 else f"+{i * 0.8:.3f}",
+                     "IntervalToPositionAhead": {"Value": "" if i == 0 else "+0.800"},
+                     "InPit": False, "PitOut": False, "Retired": False, "Stopped": False}
+            for i, number in enumerate(drivers)
+        }},
+        "TimingAppData": {"Lines": {
+            number: {"Stints": [{"Compound": "MEDIUM", "New": "true", "TyresNotChanged": "0",
+                                 "StartLaps": 0, "TotalLaps": 0}]}
+            for number in drivers
+        }},
+        "LapCount": {"CurrentLap": 1, "TotalLaps": 53},
+        "WeatherData": {"AirTemp": "24.0", "Humidity": "50.0", "Pressure": "1013.2", "Rainfall": "0",
+                        "TrackTemp": "38.0", "WindDirection": "210", "WindSpeed": "1.4"},
+    }
+
+def _snapshot_frame(moment, drivers):
+    return {"timestamp": moment.isoformat(), "type": "text", "data": json.dumps({"R": build_snapshot(moment, drivers)})}
+
+def car_data_payload(moment, numbers, rng):
+    """A compressed CarData.z sample for every car."""
+    cars = {number: {"Channels": {"0": rng.randint(9000, 12000), "2": rng.randint(80, 330),
+                                  "3": rng.randint(2, 8), "4": rng.randint(0, 100),
+                                  "5": rng.choice([0, 0, 0, 1]), "45": rng.choice([0, 8, 12])}}
+            for number in numbers}
+    return _compress({"Entries": [{"Utc": _iso(moment), "Cars": cars}]})
+
+def position_payload(moment, numbers, rng):
+    """A compressed Position.z sample for every car."""
+    positions = {number: {"Status": "OnTrack", "X": rng.randint(-9000, 9000), "Y": rng.randint(-9000, 9000),
+                          "Z": rng.randint(0, 200)} for number in numbers}
+    return _compress({"Position": [{"Timestamp": _iso(moment), "Entries": positions}]})
+
+def generate_session(drivers=20, laps=5, seed=2025):
+    """Returns the session as a list of replay log entries."""
+    rng = random.Random(seed)
+    numbers = driver_numbers(drivers)
+    entries = [_snapshot_frame(START, numbers)]
+
+    base_lap = {number: 82.0 + i * 0.15 for i, number in enumerate(numbers)}
+    next_lap_at = {number: base_lap[number] + rng.uniform(-0.5, 0.5) for number in numbers}
+    laps_done = {number: 0 for number in numbers}
+    pit_lap = {number: rng.randint(2, max(2, laps - 1)) for number in numbers}
+    in_pit_until = {}
+
+    moment = START
+    elapsed = 0.0
+    race_control_every = 60.0
+    while min(laps_done.values()) < laps:
+        elapsed += TICK
+        moment = START + timedelta(seconds=elapsed)
+
+        # Telemetry for every car, as the F1 feed sends it
+        entries.append(_feed_frame(moment, "CarData.z", car_data_payload(moment, numbers, rng)))
+        entries.append(_feed_frame(moment, "Position.z", position_payload(moment, numbers, rng)))
+
+        # Gaps and mini-sectors for a few drivers per tick
+        lines = {}
+        for number in rng.sample(numbers, min(3, len(numbers))):
+            position = numbers.index(number)
+            lines[number] = {
+                "GapToLeader": "" if position == 0 else f"+{position * 0.8 + rng.uniform(0, 0.4):.3f}",
+                "IntervalToPositionAhead": {"Value": "" if position == 0 else f"+{rng.uniform(0.2, 1.5):.3f}"},
+                "Sectors": {str(rng.randint(0, 2)): {"Value": f"{rng.uniform(26, 29):.3f}"}},
+                "Speeds": {"ST": {"Value": str(rng.randint(300, 340))}},
+            }
+
+        # Lap completions and pit stops
+        for number in numbers:
+            if number in in_pit_until and elapsed >= in_pit_until[number]:
+                del in_pit_until[number]
+                lines.setdefault(number, {}).update({"InPit": False, "PitOut": True})
+            if elapsed < next_lap_at[number] or laps_done[number] >= laps:
+                continue
+            lap_seconds = base_lap[number] + rng.uniform(-0.4, 0.6)
+            next_lap_at[number] += lap_seconds
+            laps_done[number] += 1
+            line = lines.setdefault(number, {})
+            line.update({"NumberOfLaps": laps_done[number], "LastLapTime": {"Value": format_lap_time(lap_seconds)}})
+            if laps_done[number] == pit_lap[number]:
+                line.update({"InPit": True, "PitOut": False})
+                in_pit_until[number] = elapsed + 22.0
+                next_lap_at[number] += 22.0
+        entries.append(_feed_frame(moment, "TimingData", {"Lines": lines}))
+
+        if elapsed % race_control_every < TICK:
+            entries.append(_feed_frame(moment, "RaceControlMessages", {"Messages": [
+                {"Utc": _iso(moment), "Category": "Flag", "Flag": "CLEAR", "Message": f"TRACK CLEAR AT {elapsed:.0f}S"}
+            ]}))
+            number = rng.choice(numbers)
+            entries.append(_feed_frame(moment, "TeamRadio", {"Captures": [
+                {"Utc": _iso(moment), "RacingNumber": number, "Path": f"TeamRadio/{number}_{int(elapsed)}.mp3"}
+            ]}))
+    return entries
+
+def write_session(path, drivers=20, laps=5, seed=2025):
+    entries = generate_session(drivers, laps, seed)
+    with open(path, "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    return len(entries)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output")
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--laps", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args()
+    count = write_session(args.output, args.drivers, args.laps, args.seed)
+    print(f"Wrote {count} frames to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# /benchmarks/wire_format.py
+"""
+Compares the /ws wire formats on real messages: payload bytes and encode CPU.
+
+    python -m benchmarks.wire_format [--state final_structured_state.json] [--replay session.jsonl.gz]
+
+The message mix is the full state (what a client gets on connect), one
+CarData and one Position telemetry message taken from the state and, with --replay, every
+message the processor broadcasts while replaying the archive.
+msgpack rows are skipped unless the msgpack package is installed.
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from app.state.state_manager import StateManager
+from app.streaming.f1_stream_processor import F1StreamProcessor
+from app.streaming.recorder import open_archive
+from app.utils.wire import ENCODING_JSON, ENCODING_MSGPACK, WireFormat, msgpack_available
+
+FORMATS = [
+    WireFormat(ENCODING_JSON),
+    WireFormat(ENCODING_JSON, deflate=True),
+    WireFormat(ENCODING_MSGPACK),
+    WireFormat(ENCODING_MSGPACK, deflate=True),
+]
+
+class _CapturingSocket:
+    """Stands in for a frontend WebSocket and keeps every message (already JSON)."""
+    def __init__(self):
+        self.messages = []
+        self.client = None
+
+    async def send_text(self, text):
+        self.messages.append(text)
+
+async def replay_messages(path):
+    """Runs an archive through the processor and returns the messages it broadcast."""
+    state_manager = StateManager()
+    state_manager.broadcaster.max_queue_size = 10 ** 7
+    processor = F1StreamProcessor(state_manager, quiet=True)
+    socket = _CapturingSocket()
+    await state_manager.add_client(socket)
+    with open_archive(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            await processor._handle_raw_frame(entry["type"], entry["data"], datetime.fromisoformat(entry["timestamp"]))
+        await asyncio.sleep(0.1)
+    # The first message is the (empty) initial state
+    return [json.loads(text) for text in socket.messages[1:]]
+
+def measure(wire_format, messages, rounds):
+    """Returns (total bytes, encode CPU seconds per round) for one format."""
+    total_bytes = sum(len(wire_format.encode(message)) for message in messages)
+    started = time.process_time()
+    for _ in range(rounds):
+        for message in messages:
+            wire_format.encode(message)
+    return total_bytes, (time.process_time() - started) / rounds
+
+def run(groups, rounds):
+    print(f"{'messages':<22} {'format':<18} {'count':>6} {'bytes':>12} {'vs json':>8} {'encode ms':>10}")
+    for name, messages in groups:
+        baseline = None
+        for wire_format in FORMATS:
+            if wire_format.encoding == ENCODING_MSGPACK and not msgpack_available():
+                print(f"{name:<22} {wire_format.subprotocol:<18} {'(msgpack not installed)':>40}")
+                continue
+            total_bytes, seconds = measure(wire_format, messages, rounds)
+            baseline = baseline or total_bytes
+            print(f"{name:<22} {wire_format.subprotocol:<18} {len(messages):>6} {total_bytes:>12} "
+                  f"{total_bytes / baseline:>7.0%} {seconds * 1000:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--state", default="final_structured_state.json")
+    parser.add_argument("--replay", help="Replay archive (.jsonl, .gz or .zst) to take broadcast messages from")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.state) as f:
+        state = json.load(f)
+    groups = [("full state", [state])]
+    for feed_name in ("CarData", "Position"):
+        if isinstance(state.get(feed_name), dict):
+            groups.append((feed_name, [{"type": feed_name, "data": state[feed_name]}]))
+    if args.replay:
+        groups.append(("replay broadcasts", asyncio.run(replay_messages(args.replay))))
+    run(groups, args.rounds)
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,156 @@
 import os
+import sys
 import asyncio
 import uvicorn
 import json
 
 from app.state.state_manager import StateManager
 from app.streaming.f1_stream_processor import F1StreamProcessor
+from app.streaming.replay_engine import ReplayEngine
+from app.streaming.recorder import FeedRecorder
+from app.streaming.pipeline import IngestPipeline
+from app.state.shared_snapshot import SnapshotWriter, SnapshotPublisher, default_snapshot_path
+from app.state.retention import RetentionManager, parse_limits
+from app.streaming.pubsub import FeedBroker, BrokerPublisher, BrokerSubscriber, FeedFollower
 from app.utils.helpers import DateTimeEncoder
+from app.utils.profiler import SamplingProfiler
 
 # Import the API router
-from app.api.main import app as api_app, get_state_manager
+from app.api.main import app as api_app, get_state_manager, get_replay_engine, get_ingest_pipeline, get_profiler
 
 async def main():
     print("--- F1 Live Timing Backend Starting ---")
 
     # 1. Initialize the core components (no change here)
-    state_manager = StateManager()
+    # Tick for coalescing deltas sent to /ws?protocol=2 clients (100-250 ms works well)
+    delta_tick_ms = float(os.getenv("WS_DELTA_TICK_MS", "200"))
+    state_manager = StateManager(delta_tick_interval=delta_tick_ms / 1000)
+
+    # Bounded memory for long runs: RETENTION_LIMITS caps append-only feeds
+    # (e.g. "LapHistory=5000,TeamRadio=200"), and when a new session starts the
+    # previous one is spilled to SESSION_ARCHIVE_DIR as gzipped JSON.
+    state_manager.retention = RetentionManager(
+        state_manager,
+        limits=parse_limits(os.getenv("RETENTION_LIMITS")),
+        archive_dir=os.getenv("SESSION_ARCHIVE_DIR", "data/sessions") or None,
+        sessions_in_memory=int(os.getenv("SESSIONS_IN_MEMORY", "0")),
+    )
 
     # Override the placeholder `get_state_manager` with our actual instance
     api_app.dependency_overrides[get_state_manager] = lambda: state_manager
 
+    # PROFILER=on enables the sampling profiler at POST /api/admin/profile. It is off by
+    # default: anyone who can reach the API could otherwise tie up a thread with it.
+    if os.getenv("PROFILER", "off") == "on":
+        profiler = SamplingProfiler()
+        api_app.dependency_overrides[get_profiler] = lambda: profiler
+
     
+    # F1_BASE_URL points LIVE mode at another SignalR endpoint, e.g. the local fake feed
+    # for stress and chaos testing (python -m benchmarks.fake_signalr -> http://localhost:8765/signalr).
     f1_processor = F1StreamProcessor(
-        state_manager=state_manager
+        state_manager=state_manager,
+        base_url=os.getenv("F1_BASE_URL")
     )
+    # Decode large frames (e.g. the initial snapshot) off the event loop. DECODE_POOL is
+    # "thread" (default: inflates .z payloads off the loop, but JSON is still parsed on it),
+    # "process" (inflates and parses off the loop, so the API stays responsive) or "off".
+    f1_processor.set_decode_pool(
+        os.getenv("DECODE_POOL", "thread"),
+        threshold=int(os.getenv("DECODE_OFFLOAD_BYTES", str(F1StreamProcessor.DECODE_OFFLOAD_THRESHOLD)))
+    )
+
+    # Optional multi-core serving: with API_WORKERS=N, N read-only uvicorn workers serve
+    # /api/* on port 8000 from a state snapshot in shared memory, and this process
+    # keeps /ws, the replay and admin controls, telemetry range queries, /metrics and
+    # the ws/pipeline/memory stats on INGEST_PORT. Workers answer those with a 404 (or a 4004 close for /ws)
+    # naming INGEST_PORT; see app/api/worker.py.
+    api_workers = int(os.getenv("API_WORKERS", "0"))
+    snapshot_writer = snapshot_publisher = api_workers_process = None
+    port = 8000
+    if api_workers > 0:
+        snapshot_path = os.getenv("SHARED_SNAPSHOT_PATH") or default_snapshot_path()
+        snapshot_writer = SnapshotWriter(snapshot_path)
+        snapshot_publisher = SnapshotPublisher(
+            state_manager, snapshot_writer,
+            interval=float(os.getenv("SHARED_SNAPSHOT_INTERVAL_MS", "100")) / 1000
+        )
+        snapshot_publisher.start()
+        api_workers_process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "app.api.worker:app",
+            "--host", "0.0.0.0", "--port", "8000", "--workers", str(api_workers),
+            env={**os.environ, "SHARED_SNAPSHOT_PATH": snapshot_path}
+        )
+        port = int(os.getenv("INGEST_PORT", "8001"))
+        print(f"Serving /api/* from {api_workers} workers on port 8000 (snapshot: {snapshot_path}).")
 
     # 2. Configure the Uvicorn server to run our FastAPI app
-    config = uvicorn.Config(api_app, host="0.0.0.0", port=8000, log_level="info")
+    config = uvicorn.Config(api_app, host="0.0.0.0", port=port, log_level="info")
     api_server = uvicorn.Server(config)
     
     # --- CHOOSE YOUR MODE BASED ON THE ENVIRONMENT VARIABLE---
     mode = os.getenv("MODE", "LIVE")  # Default to "LIVE" if not set
 
+    # Several nodes can share one F1 connection: the LIVE node (leader) publishes its
+    # feed to the broker at BROKER_ADDRESS, and MODE=FOLLOWER nodes apply it locally.
+    # BROKER_LISTEN runs the broker inside this process (e.g. tcp://0.0.0.0:7070).
+    broker_address = os.getenv("BROKER_ADDRESS")
+    broker = None
+    if os.getenv("BROKER_LISTEN"):
+        broker = FeedBroker(os.getenv("BROKER_LISTEN"))
+        await broker.start()
+
     if mode == "REPLAY":
         print("--- Running in REPLAY mode ---")
         replay_file = os.getenv("REPLAY_FILE_PATH", "data/default_replay.jsonl")
-        f1_processor_task = asyncio.create_task(f1_processor.replay_from_file(
-        filepath=replay_file,
-        # Set to 1.0 for real-time, or higher for faster replay
-        speed=50
-        ))
+        # Set to 1.0 for real-time, higher for faster replay, or "max" for as fast as possible.
+        # The speed can also be changed at runtime through POST /api/replay/speed.
+        replay_speed = os.getenv("REPLAY_SPEED", "50")
+        replay_engine = ReplayEngine(
+            f1_processor,
+            filepath=replay_file,
+            speed=0 if replay_speed == "max" else float(replay_speed),
+            stay_open=True
+        )
+        api_app.dependency_overrides[get_replay_engine] = lambda: replay_engine
+        f1_processor_task = asyncio.create_task(replay_engine.run())
+    elif mode == "FOLLOWER":
+        print(f"--- Running in FOLLOWER mode (broker: {broker_address}) ---")
+        follower = FeedFollower(f1_processor, BrokerSubscriber(broker_address))
+        f1_processor_task = asyncio.create_task(follower.run())
     else:
         print("--- Running in LIVE mode ---")
+        # Crash recovery: restore the last snapshot + journal, then keep writing them.
+        # Set STATE_DIR to an empty string to disable.
+        state_dir = os.getenv("STATE_DIR", "data/state")
+        if state_dir:
+            await state_manager.enable_persistence(state_dir, f1_processor)
+        # Archive the raw feed as compressed, replayable session files (set RECORD_DIR to enable).
+        # RECORD_COMPRESSION is "zstd" (needs the zstandard package), "gzip" or "none".
+        # Segments rotate on reconnect and after RECORD_SEGMENT_MB (uncompressed) or RECORD_SEGMENT_MINUTES.
+        record_dir = os.getenv("RECORD_DIR")
+        if record_dir:
+            f1_processor.recorder = FeedRecorder(
+                record_dir,
+                compression=os.getenv("RECORD_COMPRESSION"),
+                max_segment_bytes=int(os.getenv("RECORD_SEGMENT_MB", "256")) * 1024 * 1024,
+                max_segment_seconds=float(os.getenv("RECORD_SEGMENT_MINUTES", "60")) * 60
+            )
+            f1_processor.recorder.start()
+        # Read the socket, process frames and publish to clients in separate stages.
+        # PIPELINE_OVERFLOW is "block" (lossless), "drop_oldest" or "drop_newest".
+        # Set PIPELINE=off to process every frame inline instead.
+        if os.getenv("PIPELINE", "on") != "off":
+            pipeline = IngestPipeline(
+                f1_processor,
+                queue_size=int(os.getenv("PIPELINE_QUEUE_SIZE", "10000")),
+                overflow=os.getenv("PIPELINE_OVERFLOW", "block")
+            )
+            pipeline.start()
+            api_app.dependency_overrides[get_ingest_pipeline] = lambda: pipeline
+        if broker_address:
+            f1_processor.publisher = BrokerPublisher(broker_address)
+            await f1_processor.publisher.start()
         f1_processor_task = asyncio.create_task(f1_processor.connect_and_process_live())
     
     api_task = asyncio.create_task(api_server.serve())
@@ -52,6 +162,23 @@ async def main():
         # 4. NEW: This 'finally' block will ALWAYS run, whether the
         # program finishes normally or is interrupted by Ctrl+C.
         print("\n--- Application shutting down. Saving state... ---")
+        if f1_processor.pipeline:
+            await f1_processor.pipeline.stop()
+        if state_manager.persistence:
+            state_manager.persistence.close()
+        if f1_processor.recorder:
+            f1_processor.recorder.stop()
+        f1_processor.close_decode_pool()
+        if f1_processor.publisher:
+            await f1_processor.publisher.close()
+        if broker:
+            await broker.stop()
+        if api_workers_process:
+            snapshot_publisher.stop()
+            if api_workers_process.returncode is None:
+                api_workers_process.terminate()
+                await api_workers_process.wait()
+            snapshot_writer.close()
 
         # Get the final state from the StateManager
         final_state = state_manager.get_full_state()
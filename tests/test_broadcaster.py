@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+from app.state.state_manager import StateManager
+
+class _GatedSocket:
+    """Holds the first send until `gate` is set, like a client that stalls."""
+    def __init__(self):
+        self.messages = []
+        self.client = None
+        self.gate = asyncio.Event()
+
+    async def send_text(self, text):
+        if not self.messages:
+            await self.gate.wait()
+        self.messages.append(json.loads(text))
+
+def test_client_that_overflows_its_queue_gets_the_full_state_before_more_patches():
+    async def scenario():
+        state_manager = StateManager()
+        state_manager.broadcaster.max_queue_size = 2
+        socket = _GatedSocket()
+        connection = await state_manager.add_client(socket)
+
+        for lap in range(1, 5):
+            state_manager.state["LapCount"] = {"CurrentLap": lap}
+            await state_manager.broadcast({"type": "LapCount", "data": {"CurrentLap": lap}})
+            await asyncio.sleep(0)  # The sender picks up lap 1, then stalls on the socket
+
+        assert connection.needs_resync
+        socket.gate.set()
+        await asyncio.sleep(0.01)
+        state_manager.state["LapCount"] = {"CurrentLap": 5}
+        await state_manager.broadcast({"type": "LapCount", "data": {"CurrentLap": 5}})
+        await asyncio.sleep(0.01)
+        state_manager.remove_client(socket)
+        state_manager.delta_stream.stop()
+        return socket.messages, connection.get_stats()
+
+    messages, stats = asyncio.run(scenario())
+    assert [m.get("type") for m in messages] == ["LapCount", None, "LapCount"]
+    assert messages[1]["LapCount"] == {"CurrentLap": 4}
+    assert messages[2]["data"] == {"CurrentLap": 5}
+    assert stats["messages_dropped"] == 3
+    assert stats["resyncs"] == 1
@@ -0,0 +1,103 @@
+import asyncio
+import copy
+
+import pytest
+
+from app.state.state_manager import StateManager
+from app.ws.conflation import Conflator, coalesce
+
+def _timing(driver_number, **fields):
+    return {"Lines": {driver_number: fields}}
+
+def test_partial_updates_are_merged_without_touching_the_payloads():
+    first = _timing("44", Position="2", LastLapTime={"Value": "1:32.1"})
+    second = _timing("44", LastLapTime={"Value": "1:31.9", "PersonalFastest": True})
+    third = _timing("1", Position="1")
+    originals = copy.deepcopy([first, second, third])
+
+    pending = {}
+    for payload in (first, second, third):
+        coalesce(pending, "TimingData", payload)
+
+    assert pending["TimingData"] == {"Lines": {
+        "44": {"Position": "2", "LastLapTime": {"Value": "1:31.9", "PersonalFastest": True}},
+        "1": {"Position": "1"},
+    }}
+    # Payloads are shared with the live state and the other subscribers
+    assert [first, second, third] == originals
+    assert pending["TimingData"]["Lines"]["44"] is not first["Lines"]["44"]
+
+def test_events_are_kept_in_order_and_replacements_keep_the_latest():
+    pending = {}
+    for lap_number in (7, 8):
+        coalesce(pending, "NewLap", {"driver_number": 44, "lap_number": lap_number})
+        coalesce(pending, "LapCount", {"CurrentLap": lap_number, "TotalLaps": 57})
+
+    assert pending == {
+        "NewLap": [{"driver_number": 44, "lap_number": 7}, {"driver_number": 44, "lap_number": 8}],
+        "LapCount": {"CurrentLap": 8, "TotalLaps": 57},
+    }
+
+def test_each_event_is_flushed_as_its_own_message():
+    async def scenario():
+        conflator = Conflator(max_rate=1, flush=lambda messages: None)
+        conflator.record({"type": "NewPitStop", "data": {"driver_number": 1}})
+        conflator.record({"type": "TimingData", "data": _timing("1", InPit=True)})
+        conflator.record({"type": "NewPitStop", "data": {"driver_number": 44}})
+        messages = conflator.drain()
+        conflator.stop()
+        return conflator, messages
+
+    conflator, messages = asyncio.run(scenario())
+    assert messages == [
+        {"type": "NewPitStop", "data": {"driver_number": 1}},
+        {"type": "NewPitStop", "data": {"driver_number": 44}},
+        {"type": "TimingData", "data": _timing("1", InPit=True)},
+    ]
+    assert (conflator.messages_in, conflator.messages_out) == (3, 3)
+
+def test_full_state_supersedes_the_pending_window():
+    async def scenario():
+        conflator = Conflator(max_rate=1, flush=lambda messages: None)
+        conflator.record({"type": "TimingData", "data": _timing("44", Position="3")})
+        conflator.record({"LapCount": {"CurrentLap": 9}})  # The full state
+        conflator.record({"type": "WeatherData", "data": {"AirTemp": "24.1"}})
+        messages = conflator.drain()
+        conflator.stop()
+        return conflator, messages
+
+    conflator, messages = asyncio.run(scenario())
+    assert messages == [{"LapCount": {"CurrentLap": 9}}, {"type": "WeatherData", "data": {"AirTemp": "24.1"}}]
+    assert conflator.drain() == []
+
+def test_a_window_is_flushed_once_per_interval():
+    async def scenario():
+        flushed = []
+        conflator = Conflator(max_rate=100, flush=flushed.append)
+        for position in ("3", "2", "1"):
+            conflator.record({"type": "TimingData", "data": _timing("44", Position=position)})
+        await asyncio.sleep(0.05)
+        conflator.stop()
+        return flushed
+
+    assert asyncio.run(scenario()) == [[{"type": "TimingData", "data": _timing("44", Position="1")}]]
+
+def test_unchanged_lap_count_is_not_broadcast_again():
+    pytest.importorskip("aiohttp")
+    from app.streaming.f1_stream_processor import F1StreamProcessor
+
+    async def scenario():
+        state_manager = StateManager()
+        sent = []
+
+        async def broadcast(message):
+            sent.append(message)
+        state_manager.broadcast = broadcast
+        processor = F1StreamProcessor(state_manager, quiet=True)
+        for gap in ("+1.2", "+1.3", "+1.1"):
+            await processor._handle_feed_update([{"M": "feed", "A": ["TimingData", _timing("44", NumberOfLaps=5, GapToLeader=gap)]}])
+        return state_manager, [message for message in sent if message.get("type") == "LapCount"]
+
+    state_manager, lap_counts = asyncio.run(scenario())
+    assert lap_counts == [{"type": "LapCount", "data": {"CurrentLap": 6, "TotalLaps": 0}}]
+    assert state_manager.state["LapCount"] == {"CurrentLap": 6, "TotalLaps": 0}
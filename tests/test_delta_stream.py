@@ -0,0 +1,46 @@
+import json
+
+from app.state.state_manager import StateManager
+
+def _types(messages):
+    return [json.loads(text)["type"] for text in messages]
+
+def _stream_with_deltas(count):
+    state_manager = StateManager()
+    stream = state_manager.delta_stream
+    for lap in range(1, count + 1):
+        stream.record("LapCount", {"CurrentLap": lap})
+        stream.flush()
+    return state_manager, stream
+
+def test_reconnect_within_history_gets_missed_deltas():
+    _, stream = _stream_with_deltas(3)
+    assert _types(stream.initial_messages(1)) == ["Delta", "Delta"]
+    assert stream.initial_messages(3) == []
+
+def test_reconnect_from_before_a_resync_gets_a_snapshot():
+    state_manager, stream = _stream_with_deltas(3)
+    state_manager.load_state({})  # e.g. a new session
+    stream.resync()
+    stream.record("LapCount", {"CurrentLap": 1})
+    stream.flush()
+
+    for since in (1, 3):
+        messages = stream.initial_messages(since)
+        assert _types(messages) == ["Snapshot"]
+        assert json.loads(messages[0])["seq"] == stream.seq
+    assert stream.initial_messages(stream.seq) == []
+
+def test_reconnect_right_after_a_resync_gets_a_snapshot():
+    _, stream = _stream_with_deltas(2)
+    stream.resync()
+    assert _types(stream.initial_messages(2)) == ["Snapshot"]
+
+def test_snapshots_leave_out_decoded_telemetry():
+    state_manager = StateManager()
+    state_manager.update_state("CarData", {"Entries": []})
+    state_manager.update_state("Position", {"Position": []})
+    snapshot = json.loads(state_manager.delta_stream.build_snapshot())
+    assert "CarData" not in snapshot["data"]
+    assert "Position" not in snapshot["data"]
+    assert "LapCount" in snapshot["data"]
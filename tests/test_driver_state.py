@@ -0,0 +1,46 @@
+from app.state.driver_state import DriverTimingIndex
+from app.state.state_manager import StateManager
+
+SNAPSHOT_LINE = {
+    "Position": "2",
+    "NumberOfLaps": 17,
+    "GapToLeader": "+1.482",
+    "IntervalToPositionAhead": {"Value": "+1.482", "Catching": False},
+    "LastLapTime": {"Value": "1:32.418"},
+    "BestLapTime": {"Value": "1:31.907", "Lap": 12},
+    "Sectors": [{"Value": "28.112"}, {"Value": "33.806"}, {"Value": "30.500"}],
+    "Speeds": {"I1": {"Value": "287"}, "ST": {"Value": ""}},
+    "InPit": False,
+}
+
+def test_snapshot_line_is_parsed_into_typed_slots():
+    index = DriverTimingIndex()
+    index.rebuild({"44": SNAPSHOT_LINE, "_kf": True})
+    driver = index.get(44)
+    assert (driver.driver_number, driver.position, driver.number_of_laps) == (44, 2, 17)
+    assert (driver.gap_to_leader, driver.gap_to_leader_text, driver.interval) == (1.482, "+1.482", 1.482)
+    assert (driver.last_lap_time, driver.best_lap_time) == (92.418, 91.907)
+    assert driver.sector_times == (28.112, 33.806, 30.5)
+    assert (driver.i1_speed, driver.i2_speed, driver.st_speed) == (287, None, None)
+    assert not driver.in_pit
+    assert list(index.drivers) == ["44"]
+
+def test_updates_only_reparse_the_fields_they_touch():
+    state_manager = StateManager()
+    sectors = {"0": {"Value": "28.112"}, "1": {"Value": "33.806"}, "2": {"Value": "30.500"}}
+    state_manager.update_state("TimingData", {"Lines": {"44": {**SNAPSHOT_LINE, "Sectors": sectors}}})
+    state_manager.update_state("TimingData", {"Lines": {"44": {
+        "GapToLeader": "1 L", "Sectors": {"1": {"Value": "33.1"}}, "InPit": True,
+    }}})
+
+    driver = state_manager.driver_timing.get(44)
+    assert (driver.gap_to_leader, driver.gap_to_leader_text) == (None, "1 L")
+    assert driver.sector_times == (28.112, 33.1, 30.5)
+    assert driver.in_pit
+    assert driver.position == 2
+
+def test_drivers_appear_from_partial_updates():
+    state_manager = StateManager()
+    state_manager.update_state("TimingData", {"Lines": {"1": {"Position": "1"}}})
+    assert state_manager.driver_timing.get(1).position == 1
+    assert state_manager.driver_timing.get(1).sector_times == (None, None, None)
@@ -0,0 +1,66 @@
+from app.utils.helpers import (
+    changes_to_patch, deep_merge_changes, effective_changes, lttb_indices, stride_indices,
+)
+
+def _timing():
+    return {"Lines": {"44": {"Position": "3", "LastLapTime": {"Value": "1:32.100", "PersonalFit": False}}}}
+
+def test_merge_reports_every_touched_leaf_with_its_old_value():
+    destination = _timing()
+    line = destination["Lines"]["44"]
+    changes = deep_merge_changes(destination, {"Lines": {"44": {
+        "LastLapTime": {"Value": "1:31.900"}, "Position": "3",
+    }}}, [])
+
+    assert destination["Lines"]["44"] is line  # Merged in place
+    assert line["LastLapTime"] == {"Value": "1:31.900", "PersonalFit": False}
+    assert sorted(changes) == [
+        (("Lines", "44", "LastLapTime", "Value"), "1:32.100", "1:31.900"),
+        (("Lines", "44", "Position"), "3", "3"),
+    ]
+
+def test_new_subtrees_are_reported_leaf_by_leaf():
+    destination = _timing()
+    changes = deep_merge_changes(destination, {"Lines": {"1": {"Sectors": {"0": {"Value": "28.1"}}}}}, [])
+    assert changes == [(("Lines", "1", "Sectors", "0", "Value"), None, "28.1")]
+    assert destination["Lines"]["1"] == {"Sectors": {"0": {"Value": "28.1"}}}
+
+def test_a_dict_replacing_a_scalar_is_stored_as_is():
+    destination = {"Sectors": "pending"}
+    changes = deep_merge_changes(destination, {"Sectors": {"0": {"Value": "28.1"}}}, [])
+    assert destination == {"Sectors": {"0": {"Value": "28.1"}}}
+    assert changes == [(("Sectors", "0", "Value"), None, "28.1")]
+
+def test_effective_changes_drop_rewritten_values():
+    changes = [(("Position",), "3", "3"), (("GapToLeader",), "+1.2", "+1.4"), (("InPit",), None, False)]
+    assert effective_changes(changes) == [(("GapToLeader",), "+1.2", "+1.4"), (("InPit",), None, False)]
+
+def test_patch_holds_only_the_changed_leaves():
+    destination = _timing()
+    changes = deep_merge_changes(destination, {"Lines": {"44": {
+        "LastLapTime": {"Value": "1:31.900", "PersonalFit": False}, "Position": "2",
+    }}}, [])
+    patch = changes_to_patch(effective_changes(changes))
+    assert patch == {"Lines": {"44": {"LastLapTime": {"Value": "1:31.900"}, "Position": "2"}}}
+
+    replica = _timing()
+    deep_merge_changes(replica, patch, [])
+    assert replica == destination
+
+def test_stride_keeps_the_first_and_last_index():
+    assert stride_indices(5, 10) == [0, 1, 2, 3, 4]
+    assert stride_indices(11, 3) == [0, 5, 10]
+    assert stride_indices(11, 1) == [10]
+
+def test_lttb_keeps_the_endpoints_and_the_peak():
+    xs = list(range(100))
+    ys = [0] * 100
+    ys[37] = 300  # A single spike, e.g. the top speed at the end of a straight
+    indices = lttb_indices(xs, ys, 10)
+    assert len(indices) == 10
+    assert indices[0] == 0 and indices[-1] == 99
+    assert 37 in indices
+    assert indices == sorted(set(indices))
+
+def test_lttb_returns_everything_when_under_the_limit():
+    assert lttb_indices([0, 1, 2], [5, 6, 7], 10) == [0, 1, 2]
@@ -0,0 +1,97 @@
+import pytest
+
+from app.state.lap_analytics import DriverLaps, LapAnalytics
+from app.state.retention import RetentionManager
+from app.state.state_manager import StateManager
+
+def _lap(driver_number, lap_number, duration, pit_out=False, sectors=(None, None, None)):
+    return {
+        "driver_number": driver_number, "lap_number": lap_number, "lap_duration": duration,
+        "is_pit_out_lap": pit_out, "duration_sector_1": sectors[0],
+        "duration_sector_2": sectors[1], "duration_sector_3": sectors[2],
+    }
+
+def _least_squares(points):
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / sum((x - mean_x) ** 2 for x, _ in points)
+    return slope, mean_y
+
+def test_fit_matches_a_direct_least_squares_fit():
+    laps = DriverLaps()
+    durations = [95.0, 91.2, 91.35, 91.31, 91.6, 91.72, 91.9]
+    for lap_number, duration in enumerate(durations, 1):
+        laps.add(lap_number, duration, False, (None, None, None))
+
+    start, stop = laps.range_of_laps(2, 7)
+    n, slope, mean = laps.fit(start, stop)
+    expected_slope, expected_mean = _least_squares(list(enumerate(durations, 1))[1:])
+    assert n == 6
+    assert slope == pytest.approx(expected_slope)
+    assert mean == pytest.approx(expected_mean)
+
+def test_pit_out_and_untimed_laps_are_left_out_of_the_fit():
+    laps = DriverLaps()
+    laps.add(1, 92.0, False, (None, None, None))
+    laps.add(2, None, False, (None, None, None))  # No time, e.g. under red flag
+    laps.add(3, 110.0, True, (None, None, None))  # Pit-out lap
+    laps.add(4, 92.5, False, (None, None, None))
+    laps.add(5, 93.0, False, (None, None, None))
+
+    n, slope, mean = laps.fit(0, len(laps))
+    assert n == 3
+    assert slope == pytest.approx(_least_squares([(1, 92.0), (4, 92.5), (5, 93.0)])[0])
+    assert mean == pytest.approx(92.5)
+    assert laps.rolling_pace(2) == [92.0, 92.0, None, 92.5, 92.75]
+    assert laps.fit(1, 3) == (0, None, None)
+
+def test_degradation_fits_each_stint_without_its_out_and_in_laps():
+    state_manager = StateManager()
+    state_manager.update_state("TimingAppData", {"Lines": {"44": {"Stints": [
+        {"Compound": "MEDIUM", "StartLaps": 0, "TotalLaps": 4},
+        {"Compound": "HARD", "StartLaps": 0, "TotalLaps": 3},
+    ]}}})
+    durations = [96.0, 91.0, 91.5, 99.0, 108.0, 92.0, 92.4, 92.8]
+    for lap_number, duration in enumerate(durations, 1):
+        state_manager.add_lap_to_history(_lap(44, lap_number, duration, pit_out=lap_number == 5))
+
+    medium, hard = state_manager.lap_analytics.get_degradation(44)
+    assert (medium["lap_start"], medium["lap_end"], medium["laps_used"]) == (1, 4, 2)
+    assert medium["degradation_per_lap"] is None  # Too few laps for a trend
+    assert (hard["lap_start"], hard["lap_end"], hard["laps_used"]) == (5, 8, 3)
+    assert hard["degradation_per_lap"] == pytest.approx(0.4)
+
+def test_sector_bests_and_theoretical_best():
+    analytics = LapAnalytics(StateManager(), [
+        _lap(1, 1, 90.5, sectors=(28.0, 32.0, 30.5)),
+        _lap(1, 2, 90.4, sectors=(28.2, 31.8, 30.4)),
+        _lap(44, 1, 90.6, sectors=(27.9, 32.2, 30.5)),
+    ])
+    bests = {(row["driver_number"], row["sector"]): row for row in analytics.get_sector_bests()}
+    assert bests[(1, 2)]["is_overall_best"] and bests[(1, 2)]["lap_number"] == 2
+    assert bests[(1, 1)]["gap_to_overall_best"] == pytest.approx(0.1)
+
+    theoretical = analytics.get_theoretical_best()
+    assert [row["driver_number"] for row in theoretical] == [1, 44]
+    assert theoretical[0]["theoretical_best"] == pytest.approx(90.2)
+    assert theoretical[0]["overall_theoretical_best"] == pytest.approx(90.1)
+
+def test_rebuild_after_an_eviction_matches_the_incremental_path():
+    laps = [_lap(driver_number, lap_number, 90.0 + (lap_number * 7 + driver_number) % 5 / 10,
+                 pit_out=lap_number == 12, sectors=(28.0 + lap_number % 3 / 10, 32.0, 30.0))
+            for lap_number in range(1, 21) for driver_number in (1, 44)]
+    state_manager = StateManager()
+    state_manager.retention = RetentionManager(state_manager, limits={"LapHistory": 20})
+    for lap in laps:
+        state_manager.add_lap_to_history(lap)
+    assert state_manager.retention.evicted["LapHistory"] > 0
+
+    incremental = LapAnalytics(state_manager)
+    for lap in state_manager.state["LapHistory"]:
+        incremental.add(lap)
+    rebuilt = state_manager.lap_analytics
+    assert rebuilt.get_pace() == incremental.get_pace()
+    assert rebuilt.get_sector_bests() == incremental.get_sector_bests()
+    assert rebuilt.get_theoretical_best() == incremental.get_theoretical_best()
+    assert rebuilt.get_degradation() == incremental.get_degradation()
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.state.persistence import StatePersistence
+from app.state.state_manager import StateManager
+from app.utils.helpers import json_dumps
+
+STARTED = datetime(2024, 5, 26, 13, 0, tzinfo=timezone.utc)
+
+class _FeedProcessor:
+    """Applies `{"feed": ..., "data": ...}` text frames, like the processor does for feed messages."""
+    def __init__(self, state_manager):
+        self.state_manager = state_manager
+
+    async def _process_log_entry(self, log_entry, message_time):
+        message = json.loads(log_entry["data"])
+        self.state_manager.update_state(message["feed"], message["data"])
+
+FRAMES = [
+    {"feed": "TimingData", "data": {"Lines": {"44": {"Position": "2", "GapToLeader": "+1.2"}}}},
+    {"feed": "LapCount", "data": {"CurrentLap": 3, "TotalLaps": 57}},
+    {"feed": "RaceControlMessages", "data": {"Messages": [{"Utc": "2024-05-26T13:01:00", "Category": "Flag", "Message": "GREEN"}]}},
+    {"feed": "TimingData", "data": {"Lines": {"44": {"Position": "1"}}}},
+    {"feed": "LapCount", "data": {"CurrentLap": 4, "TotalLaps": 57}},
+]
+
+async def _run_live(directory, frames, snapshot_after):
+    """Journals and applies `frames`, taking a snapshot after `snapshot_after` of them, then "crashes"."""
+    state_manager = StateManager()
+    persistence = StatePersistence(state_manager, directory)
+    persistence.open()
+    processor = _FeedProcessor(state_manager)
+    for i, frame in enumerate(frames):
+        if i == snapshot_after:
+            await persistence.snapshot()
+        received_time = STARTED + timedelta(seconds=i)
+        persistence.record_frame("text", json.dumps(frame), received_time)
+        await processor._process_log_entry({"type": "text", "data": json.dumps(frame)}, received_time)
+    persistence._journal.close()  # No final snapshot: the process died
+    return state_manager, persistence
+
+async def _restore(directory):
+    state_manager = StateManager()
+    persistence = StatePersistence(state_manager, directory)
+    restored = await persistence.restore(_FeedProcessor(state_manager))
+    return state_manager, persistence, restored
+
+def test_snapshot_plus_journal_restores_the_same_state(tmp_path):
+    live, _ = asyncio.run(_run_live(str(tmp_path), FRAMES, snapshot_after=3))
+    recovered, persistence, restored = asyncio.run(_restore(str(tmp_path)))
+    assert restored
+    assert persistence.frames_failed_on_restore == 0
+    assert json_dumps(recovered.get_full_state()) == json_dumps(live.get_full_state())
+    assert recovered.driver_timing.get(44).position == 1
+
+def test_a_torn_last_line_is_skipped_quietly(tmp_path):
+    live, persistence = asyncio.run(_run_live(str(tmp_path), FRAMES, snapshot_after=3))
+    with open(persistence._segment_path(persistence.segment), "a") as f:
+        f.write('{"timestamp": "2024-05-26T13:00:09+00:00", "type": "te')
+
+    recovered, persistence, restored = asyncio.run(_restore(str(tmp_path)))
+    assert restored
+    assert persistence.frames_failed_on_restore == 0
+    assert json_dumps(recovered.get_full_state()) == json_dumps(live.get_full_state())
+
+def test_failures_before_the_last_line_are_counted(tmp_path):
+    _, persistence = asyncio.run(_run_live(str(tmp_path), FRAMES, snapshot_after=3))
+    path = persistence._segment_path(persistence.segment)
+    with open(path) as f:
+        lines = f.readlines()
+    bad_frame = json.dumps({"timestamp": STARTED.isoformat(), "type": "text", "data": "not json"})
+    with open(path, "w") as f:
+        f.writelines([lines[0], "{torn\n", bad_frame + "\n", lines[1]])
+
+    recovered, persistence, _ = asyncio.run(_restore(str(tmp_path)))
+    assert persistence.frames_failed_on_restore == 2
+    assert recovered.state["LapCount"]["CurrentLap"] == 4
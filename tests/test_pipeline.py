@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from app.state.state_manager import StateManager
+from app.streaming.pipeline import OVERFLOW_DROP_NEWEST, IngestPipeline, PipelineStage
+
+class _CapturingSocket:
+    def __init__(self):
+        self.messages = []
+        self.client = None
+
+    async def send_text(self, text):
+        self.messages.append(json.loads(text))
+
+def test_client_added_with_publishes_pending_gets_each_message_once():
+    async def scenario():
+        state_manager = StateManager()
+        stage = PipelineStage("publish", state_manager._publish, 100)
+        stage.start()
+        state_manager.publish_stage = stage
+
+        # The processor has merged a lap into the state, but its broadcast is still queued
+        lap = {"driver_number": 1, "lap_number": 7}
+        state_manager.state["LapHistory"] = [lap]
+        await state_manager.broadcast({"type": "NewLap", "data": lap})
+        assert stage.queue.qsize() == 1
+
+        socket = _CapturingSocket()
+        await state_manager.add_client(socket, send_full_state=True)
+        await asyncio.sleep(0.05)
+        await stage.stop()
+        return socket.messages
+
+    messages = asyncio.run(scenario())
+    assert [m.get("type") for m in messages] == [None]
+    assert messages[0]["LapHistory"] == [{"driver_number": 1, "lap_number": 7}]
+
+class _CountingProcessor:
+    """Stands in for the F1StreamProcessor: counts persisted and processed frames."""
+    def __init__(self):
+        self.state_manager = StateManager()
+        self.pipeline = None
+        self.persisted = []
+        self.processed = []
+
+    async def _persist_raw_frame(self, message_type, raw_data, received_time):
+        self.persisted.append(raw_data)
+
+    async def _process_raw_frame(self, message_type, raw_data, received_time):
+        self.processed.append(raw_data)
+
+def test_frames_dropped_by_a_lossy_policy_are_still_persisted():
+    async def scenario():
+        processor = _CountingProcessor()
+        pipeline = IngestPipeline(processor, queue_size=2, overflow=OVERFLOW_DROP_NEWEST)
+        pipeline.start()
+        for i in range(5):  # Read faster than the process stage gets to run
+            await pipeline.submit_frame("text", str(i), None)
+        await pipeline.stop()
+        return processor
+
+    processor = asyncio.run(scenario())
+    assert processor.persisted == ["0", "1", "2", "3", "4"]
+    assert processor.processed == ["0", "1"]
@@ -0,0 +1,137 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.state.state_manager import StateManager
+from app.streaming.pubsub import BrokerPublisher, BrokerSubscriber, FeedBroker, FeedFollower, FeedSubscriber
+
+STARTED = datetime(2024, 5, 26, 13, 0, tzinfo=timezone.utc)
+
+class _FeedProcessor:
+    """Applies `{"feed": ..., "data": ...}` text frames, like the processor does for feed messages."""
+    def __init__(self, state_manager):
+        self.state_manager = state_manager
+
+    async def _process_log_entry(self, log_entry, message_time):
+        message = json.loads(log_entry["data"])
+        self.state_manager.update_state(message["feed"], message["data"])
+
+
+class _ListSubscriber(FeedSubscriber):
+    def __init__(self, events):
+        self._events = events
+
+    async def events(self):
+        for event in self._events:
+            yield event
+
+def _frame(feed_name, data, seconds=0):
+    return {
+        "kind": "frame",
+        "timestamp": (STARTED + timedelta(seconds=seconds)).isoformat(),
+        "type": "text",
+        "data": json.dumps({"feed": feed_name, "data": data}),
+    }
+
+async def _until(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+class _Leader:
+    """A leader node: applies frames locally and publishes them (preceded by a snapshot) to the broker."""
+    def __init__(self, address):
+        self.state_manager = StateManager()
+        self.processor = _FeedProcessor(self.state_manager)
+        self.publisher = BrokerPublisher(address)
+        self.frames = 0
+
+    async def apply(self, feed_name, data):
+        if self.publisher.snapshot_due():
+            self.publisher.publish_snapshot(self.state_manager.get_full_state())
+        received_time = STARTED + timedelta(seconds=self.frames)
+        entry = _frame(feed_name, data, self.frames)
+        self.frames += 1
+        self.publisher.publish_frame("text", entry["data"], received_time)
+        await self.processor._process_log_entry(entry, received_time)
+
+async def _start_follower(address):
+    state_manager = StateManager()
+    follower = FeedFollower(_FeedProcessor(state_manager), BrokerSubscriber(address))
+    return follower, asyncio.create_task(follower.run())
+
+def test_leader_broker_and_follower_round_trip():
+    async def run():
+        broker = FeedBroker("tcp://127.0.0.1:0")
+        address = await broker.start()
+        assert address != "tcp://127.0.0.1:0"
+        follower, task = await _start_follower(address)
+        await _until(lambda: broker.subscribers)
+
+        leader = _Leader(address)
+        await leader.publisher.start()
+        await leader.apply("TimingData", {"Lines": {"44": {"Position": "2"}}})
+        await leader.apply("LapCount", {"CurrentLap": 3, "TotalLaps": 57})
+        await leader.apply("TimingData", {"Lines": {"44": {"Position": "1"}}})
+        await _until(lambda: follower.events_applied == 4)  # The snapshot and three frames
+
+        assert follower.synced
+        assert follower.state_manager.state["TimingData"] == {"Lines": {"44": {"Position": "1"}}}
+        assert follower.state_manager.state["LapCount"] == {"CurrentLap": 3, "TotalLaps": 57}
+
+        task.cancel()
+        await leader.publisher.close()
+        await broker.stop()
+    asyncio.run(run())
+
+def test_late_joiner_gets_the_snapshot_and_the_backlog():
+    async def run():
+        broker = FeedBroker("tcp://127.0.0.1:0")
+        address = await broker.start()
+        leader = _Leader(address)
+        await leader.publisher.start()
+        await leader.apply("TimingData", {"Lines": {"44": {"Position": "2"}}})
+        await leader.apply("LapCount", {"CurrentLap": 3, "TotalLaps": 57})
+        await _until(lambda: broker.events_received == 3)
+        assert len(broker.backlog) == 2
+
+        follower, task = await _start_follower(address)
+        await _until(lambda: follower.events_applied == 3)
+        await leader.apply("LapCount", {"CurrentLap": 4, "TotalLaps": 57})
+        await _until(lambda: follower.events_applied == 4)
+
+        assert follower.state_manager.state["TimingData"] == leader.state_manager.state["TimingData"]
+        assert follower.state_manager.state["LapCount"] == {"CurrentLap": 4, "TotalLaps": 57}
+
+        task.cancel()
+        await leader.publisher.close()
+        await broker.stop()
+    asyncio.run(run())
+
+def test_snapshots_are_ignored_while_the_follower_is_in_sync():
+    state_manager = StateManager()
+    stale = {"LapCount": {"CurrentLap": 1, "TotalLaps": 57}}
+    follower = FeedFollower(_FeedProcessor(state_manager), _ListSubscriber([
+        {"kind": "snapshot", "state": stale},
+        _frame("LapCount", {"CurrentLap": 2, "TotalLaps": 57}),
+        {"kind": "snapshot", "state": stale},  # Periodic snapshot for late joiners
+    ]))
+    asyncio.run(follower.run())
+
+    assert follower.snapshots_skipped == 1
+    assert state_manager.state["LapCount"] == {"CurrentLap": 2, "TotalLaps": 57}
+
+def test_frames_are_ignored_until_the_snapshot_after_a_disconnect():
+    state_manager = StateManager()
+    follower = FeedFollower(_FeedProcessor(state_manager), _ListSubscriber([
+        {"kind": "snapshot", "state": {"LapCount": {"CurrentLap": 1}}},
+        {"kind": "disconnected"},
+        _frame("LapCount", {"CurrentLap": 5}),  # Its predecessors may have been missed
+        {"kind": "snapshot", "state": {"LapCount": {"CurrentLap": 2}}},
+    ]))
+    asyncio.run(follower.run())
+
+    assert follower.synced
+    assert follower.snapshots_skipped == 0
+    assert state_manager.state["LapCount"] == {"CurrentLap": 2}
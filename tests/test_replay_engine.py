@@ -0,0 +1,79 @@
+import asyncio
+import gzip
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.state.state_manager import StateManager
+from app.streaming import replay_engine
+from app.streaming.recorder import FeedRecorder, open_archive
+from app.streaming.replay_engine import ReplayEngine
+
+class _ForwardOnly(io.RawIOBase):
+    """A decompressed stream that can't seek, like zstandard's stream reader."""
+    def __init__(self, raw):
+        self.raw = raw
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+class _RecordingProcessor:
+    def __init__(self, state_manager, quiet=False):
+        self.state_manager = state_manager
+        self.entries = []
+
+    async def _process_log_entry(self, log_entry, message_time):
+        self.entries.append(log_entry["data"])
+
+def _write_archive(path, count):
+    started = datetime(2024, 5, 26, 13, 0, tzinfo=timezone.utc)
+    with gzip.open(path, "wb") as f:
+        for i in range(count):
+            timestamp = (started + timedelta(seconds=i)).isoformat()
+            f.write(json.dumps({"timestamp": timestamp, "type": "text", "data": f"frame {i}"}).encode() + b"\n")
+
+def test_seeking_in_a_compressed_archive_that_cannot_seek(tmp_path, monkeypatch):
+    path = str(tmp_path / "session.jsonl.gz")
+    _write_archive(path, 20)
+    monkeypatch.setattr(replay_engine, "open_archive",
+                        lambda filepath: io.BufferedReader(_ForwardOnly(open_archive(filepath))))
+
+    async def scenario():
+        processor = _RecordingProcessor(StateManager())
+        engine = ReplayEngine(processor, path)
+        await engine.build_index()
+        engine._file = replay_engine.open_archive(path)
+        assert not engine._file.seekable()
+        for line_index in (3, 4, 15, 2, 19):
+            await engine._process_line(line_index)
+        engine._file.close()
+        return processor.entries
+
+    assert asyncio.run(scenario()) == ["frame 3", "frame 4", "frame 15", "frame 2", "frame 19"]
+
+def test_recorder_rotates_long_sessions_into_uniquely_named_segments(tmp_path):
+    recorder = FeedRecorder(str(tmp_path), compression="gzip", max_segment_seconds=60)
+    started = datetime(2024, 5, 26, 13, 0, tzinfo=timezone.utc)
+    recorder._write_batch([("text", "first", started)])
+    recorder._write_batch([("text", "same segment", started + timedelta(seconds=30))])
+    recorder._write_batch([("text", "rotated", started + timedelta(seconds=60))])
+    recorder._open_segment(started + timedelta(seconds=60))  # e.g. a reconnect within the same second
+    recorder._write_batch([("text", "reconnected", started + timedelta(seconds=60))])
+    recorder._close_segment()
+
+    segments = sorted(path.name for path in tmp_path.iterdir())
+    assert len(segments) == 3
+    frames = []
+    for name in segments:
+        with open_archive(str(tmp_path / name)) as f:
+            frames.append([json.loads(line)["data"] for line in f])
+    assert frames == [["first", "same segment"], ["rotated"], ["reconnected"]]
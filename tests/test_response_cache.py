@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+from app.api.main import app, get_state_manager
+from app.state.state_manager import StateManager
+
+HAMILTON = {
+    "RacingNumber": "44", "BroadcastName": "L HAMILTON", "FullName": "Lewis HAMILTON", "Tla": "HAM",
+    "FirstName": "Lewis", "LastName": "Hamilton", "TeamName": "Mercedes", "TeamColour": "27F4D2",
+}
+
+@pytest.fixture
+def state_manager():
+    state_manager = StateManager()
+    state_manager.update_state("DriverList", {"44": dict(HAMILTON)})
+    app.dependency_overrides[get_state_manager] = lambda: state_manager
+    yield state_manager
+    app.dependency_overrides.pop(get_state_manager, None)
+
+@pytest.fixture
+def client(state_manager):
+    return TestClient(app)
+
+def test_unchanged_versions_are_served_from_the_cache(client, state_manager):
+    first = client.get("/api/drivers")
+    assert first.json()[0]["name_acronym"] == "HAM"
+
+    # Written without a version bump, so the cached body must still be served
+    state_manager.state["DriverList"]["44"]["Tla"] = "XXX"
+    second = client.get("/api/drivers")
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert state_manager.response_cache.hits == 1
+
+def test_matching_if_none_match_gets_a_304(client):
+    etag = client.get("/api/drivers").headers["etag"]
+    response = client.get("/api/drivers", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+def test_an_update_to_a_listed_feed_invalidates_the_entry(client, state_manager):
+    etag = client.get("/api/drivers").headers["etag"]
+    state_manager.update_state("DriverList", {"44": {"TeamColour": "00D2BE"}})
+
+    response = client.get("/api/drivers", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()[0]["team_colour"] == "00D2BE"
+
+def test_other_feeds_and_identical_rewrites_keep_the_entry(client, state_manager):
+    etag = client.get("/api/drivers").headers["etag"]
+    state_manager.update_state("TimingData", {"Lines": {"44": {"Position": "1"}}})
+    state_manager.update_state("DriverList", {"44": {"TeamName": "Mercedes", "Tla": "HAM"}})
+
+    response = client.get("/api/drivers", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert state_manager.response_cache.misses == 1
@@ -0,0 +1,87 @@
+import time
+
+from app.state.retention import RetentionManager, parse_limits
+from app.state.state_manager import StateManager
+
+def _lap(driver_number, lap_number, duration):
+    return {"driver_number": driver_number, "lap_number": lap_number, "lap_duration": duration,
+            "is_pit_out_lap": False, "duration_sector_1": None, "duration_sector_2": None,
+            "duration_sector_3": None}
+
+def _message(index):
+    return {"Utc": f"2024-07-07T14:{index // 60:02}:{index % 60:02}", "Category": "Other", "Message": str(index)}
+
+def _wait_for_spill(session):
+    deadline = time.monotonic() + 5
+    while session.state is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert session.state is None and session.path is not None
+
+def test_parse_limits_skips_malformed_entries():
+    assert parse_limits("LapHistory=5000, TeamRadio=200,Bad,Other=x") == {"LapHistory": 5000, "TeamRadio": 200}
+    assert parse_limits(None) == {}
+
+def test_feed_over_its_cap_loses_its_oldest_tenth():
+    state_manager = StateManager()
+    state_manager.retention = RetentionManager(state_manager, limits={"RaceControlMessages": 20})
+    for index in range(21):
+        state_manager.update_state("RaceControlMessages", {"Messages": [_message(index)]})
+
+    messages = state_manager.state["RaceControlMessages"]
+    assert [m["Message"] for m in messages] == [str(index) for index in range(3, 21)]
+    assert state_manager.retention.evicted["RaceControlMessages"] == 3
+
+def test_lap_index_and_analytics_are_rebuilt_after_an_eviction():
+    state_manager = StateManager()
+    state_manager.retention = RetentionManager(state_manager, limits={"LapHistory": 10})
+    for lap_number in range(1, 12):
+        state_manager.add_lap_to_history(_lap(44, lap_number, 90.0 + lap_number))
+
+    assert [lap["lap_number"] for lap in state_manager.state["LapHistory"]] == list(range(3, 12))
+    assert state_manager.lap_index.get_lap(44, 1) is None
+    assert state_manager.lap_index.get_fastest_lap(44)["lap_number"] == 3
+    assert list(state_manager.lap_analytics.drivers[44].lap_numbers) == list(range(3, 12))
+
+def test_same_session_is_not_closed():
+    state_manager = StateManager()
+    state_manager.update_state("SessionInfo", {"Key": 9558, "Name": "Race"})
+    assert not state_manager.begin_session({"Key": 9558})
+    assert not state_manager.begin_session({"Name": "No key"})
+    assert state_manager.state["SessionInfo"]["Key"] == 9558
+
+def test_new_session_closes_the_live_state():
+    state_manager = StateManager()
+    state_manager.update_state("SessionInfo", {"Key": 9558, "Name": "Race"})
+    state_manager.add_lap_to_history(_lap(44, 1, 91.0))
+    closed_state = state_manager.state
+
+    assert state_manager.begin_session({"Key": 9559, "Name": "Practice 1"})
+    assert state_manager.state["LapHistory"] == []
+    assert state_manager.lap_index.get_last_lap(44) is None
+    assert state_manager.retention.get_session_state(9558) is closed_state
+    assert state_manager.retention.get_session_state(1234) is None
+
+def test_sessions_without_an_archive_are_dropped_beyond_the_memory_limit():
+    state_manager = StateManager()
+    retention = state_manager.retention
+    for key in (1, 2, 3):
+        state_manager.update_state("SessionInfo", {"Key": key, "Name": f"Session {key}"})
+        retention.close_session()
+
+    assert list(retention.closed_sessions) == [3]
+    assert retention.sessions_dropped == 2
+    assert retention.get_session_state(1) is None
+
+def test_spilled_sessions_are_read_back_from_disk(tmp_path):
+    state_manager = StateManager()
+    retention = state_manager.retention = RetentionManager(
+        state_manager, archive_dir=str(tmp_path), sessions_in_memory=0)
+    state_manager.update_state("SessionInfo", {"Key": 9558, "Name": "Race"})
+    state_manager.add_lap_to_history(_lap(44, 1, 91.0))
+
+    session = retention.close_session()
+    _wait_for_spill(session)
+    assert session.path.endswith("session-9558.json.gz")
+    restored = retention.get_session_state(9558)
+    assert restored["SessionInfo"] == {"Key": 9558, "Name": "Race"}
+    assert restored["LapHistory"] == [_lap(44, 1, 91.0)]
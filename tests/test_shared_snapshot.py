@@ -0,0 +1,92 @@
+import struct
+from datetime import datetime, timezone
+
+from app.state.shared_snapshot import (
+    SEQUENCE_OFFSET, SnapshotFollower, SnapshotPublisher, SnapshotReader, SnapshotWriter,
+)
+from app.state.state_manager import StateManager
+
+def _publish_and_follow(tmp_path, ingest):
+    path = str(tmp_path / "state.snapshot")
+    writer = SnapshotWriter(path, initial_size=4096)
+    try:
+        SnapshotPublisher(ingest, writer).publish_if_changed()
+        worker = StateManager()
+        assert SnapshotFollower(SnapshotReader(path), worker).refresh()
+        return worker
+    finally:
+        writer.close()
+
+def test_worker_keeps_the_feed_times_of_the_ingest_process(tmp_path):
+    ingest = StateManager()
+    ingest.message_time = datetime(2024, 3, 2, 15, 4, 5, 123000, tzinfo=timezone.utc)
+    ingest.state["TimingData"] = {"Lines": {}}
+    ingest.bump_version("TimingData")
+    ingest.message_time = None
+
+    worker = _publish_and_follow(tmp_path, ingest)
+    assert worker.get_feed_time("TimingData") == "2024-03-02T15:04:05.123000+00:00"
+    assert worker.get_versions(["TimingData"]) == ingest.get_versions(["TimingData"])
+
+def test_reader_gets_the_latest_complete_body_and_follows_growth(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    writer = SnapshotWriter(path, initial_size=4096)
+    reader = SnapshotReader(path)
+    try:
+        assert reader.read() is None
+        writer.publish(b"first")
+        assert reader.read() == (2, b"first")
+
+        big_body = b"x" * 10000  # Grows the file past the reader's mapping
+        writer.publish(big_body)
+        assert reader.sequence() == 4
+        assert reader.read() == (4, big_body)
+    finally:
+        writer.close()
+
+def test_reader_never_waits_for_a_write_in_progress(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    writer = SnapshotWriter(path, initial_size=4096)
+    ingest = StateManager()
+    worker = StateManager()
+    follower = SnapshotFollower(SnapshotReader(path), worker)
+    try:
+        ingest.update_state("LapCount", {"CurrentLap": 3, "TotalLaps": 57})
+        SnapshotPublisher(ingest, writer).publish_if_changed()
+        assert follower.refresh()
+
+        # Freeze the writer halfway: the sequence is odd until the body is complete
+        writer.sequence += 1
+        struct.pack_into("<Q", writer._map, SEQUENCE_OFFSET, writer.sequence)
+        assert follower.reader.read() is None
+        assert not follower.refresh()
+        assert worker.state["LapCount"]["CurrentLap"] == 3  # Still serving the last complete state
+
+        # Once the write completes, the next request picks it up
+        writer.sequence -= 1
+        ingest.update_state("LapCount", {"CurrentLap": 4, "TotalLaps": 57})
+        SnapshotPublisher(ingest, writer).publish_if_changed()
+        assert follower.refresh()
+        assert worker.state["LapCount"]["CurrentLap"] == 4
+    finally:
+        writer.close()
+
+def test_follower_reloads_only_when_the_sequence_moved(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    writer = SnapshotWriter(path, initial_size=4096)
+    ingest = StateManager()
+    publisher = SnapshotPublisher(ingest, writer)
+    follower = SnapshotFollower(SnapshotReader(path), StateManager())
+    try:
+        ingest.update_state("LapCount", {"CurrentLap": 3, "TotalLaps": 57})
+        assert publisher.publish_if_changed()
+        assert follower.refresh()
+        assert not follower.refresh()
+        assert not publisher.publish_if_changed()  # Nothing changed
+
+        ingest.update_state("LapCount", {"CurrentLap": 4, "TotalLaps": 57})
+        publisher.publish_if_changed()
+        assert follower.refresh()
+        assert follower.state_manager.state["LapCount"]["CurrentLap"] == 4
+    finally:
+        writer.close()
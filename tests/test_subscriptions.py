@@ -0,0 +1,14 @@
+import pytest
+
+from app.ws.subscriptions import Subscription
+
+def test_feeds_and_drivers_accept_lists_and_comma_separated_strings():
+    subscription = Subscription(["TimingData", "LapCount"], "1, 44,")
+    assert subscription.to_dict()["feeds"] == ["LapCount", "TimingData"]
+    assert subscription.to_dict()["drivers"] == ["1", "44"]
+    assert Subscription([], "").is_default
+
+@pytest.mark.parametrize("drivers", [44, {"44": True}, 4.4])
+def test_malformed_driver_lists_are_rejected(drivers):
+    with pytest.raises(ValueError):
+        Subscription(None, drivers)
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.state.state_manager import StateManager
+from app.state.telemetry_store import (
+    POSITION_COLUMNS, ColumnarRingBuffer, TelemetryStore, epoch_to_iso, iso_to_epoch,
+)
+
+def test_feed_timestamps_with_seven_fractional_digits_are_parsed():
+    expected = datetime(2025, 5, 25, 13, 3, 21, 916374, tzinfo=timezone.utc).timestamp()
+    assert iso_to_epoch("2025-05-25T13:03:21.9163742Z") == expected
+    assert iso_to_epoch("2025-05-25T13:03:21.9163742+00:00") == expected
+    assert iso_to_epoch("2025-05-25T13:03:21.91Z") == pytest.approx(expected - 0.006374)
+    assert iso_to_epoch("2025-05-25T13:03:21") == pytest.approx(expected - 0.916374)
+    assert iso_to_epoch("not a date") is None
+
+def test_decoded_car_data_with_a_feed_timestamp_is_stored():
+    state_manager = StateManager()
+    state_manager.update_state("CarData", {"Entries": [{
+        "Utc": "2025-05-25T13:03:21.9163742Z",
+        "Cars": {"44": {"Channels": {"0": 11200, "2": 287, "3": 7, "4": 100, "5": 0, "45": 12}}},
+    }]})
+    state_manager.update_state("Position", {"Position": [{
+        "Timestamp": "2025-05-25T13:03:21.8790000Z",
+        "Entries": {"44": {"Status": "OnTrack", "X": -1502, "Y": 2087, "Z": 7}},
+    }]})
+
+    car = state_manager.telemetry.latest_car_data()[44]
+    assert (car["speed"], car["gear"], car["drs"]) == (287, 7, 12)
+    assert car["timestamp"] == iso_to_epoch("2025-05-25T13:03:21.916374+00:00")
+    assert state_manager.telemetry.latest_positions()[44]["x"] == -1502
+
+def _filled_buffer(count, capacity):
+    buffer = ColumnarRingBuffer(POSITION_COLUMNS, capacity)
+    for i in range(count):
+        buffer.append((1000.0 + i, i, -i, 0))
+    return buffer
+
+def test_ring_buffer_keeps_the_newest_samples_in_order():
+    buffer = _filled_buffer(13, capacity=8)  # Wrapped around
+    assert len(buffer) == 8
+    assert list(buffer.column("x")) == list(range(5, 13))
+    assert buffer.latest()["x"] == 12
+
+def test_ring_buffer_range_is_found_across_the_wrap():
+    buffer = _filled_buffer(13, capacity=8)
+    start, stop = buffer.index_range(1006.0, 1010.0)
+    assert [row["x"] for row in buffer.rows(start, stop)] == [6, 7, 8, 9, 10]
+    assert buffer.index_range(1006.5, 1006.7) == (2, 2)
+    assert buffer.index_range(None, 999.0) == (0, 0)
+    assert buffer.index_range(1011.0) == (6, 8)
+
+def test_car_data_query_downsamples_each_driver():
+    store = TelemetryStore(capacity=64)
+    store.add_car_data({"Entries": [
+        {"Utc": epoch_to_iso(2000.0 + i), "Cars": {"1": {"Channels": {"2": i % 7}}, "44": {"Channels": {"2": 100}}}}
+        for i in range(50)
+    ]})
+
+    window = store.query_car_data(None, 2010.0, 2039.0, max_points=10)
+    assert sorted(window) == [1, 44]
+    assert len(window[1]) == 10
+    assert window[1][0]["timestamp"] == 2010.0 and window[1][-1]["timestamp"] == 2039.0
+    assert [sample["timestamp"] for sample in store.query_car_data(44, 2048.0)[44]] == [2048.0, 2049.0]
@@ -0,0 +1,83 @@
+import json
+import struct
+import zlib
+
+from app.utils import wire
+from app.utils.wire import (
+    CAR_DATA_COLUMNS, ENCODING_JSON, ENCODING_MSGPACK, LOCATION_COLUMNS, WireFormat,
+    car_data_rows, negotiate_accept, negotiate_websocket, pack_columns, position_rows,
+)
+
+CAR_DATA = {"Entries": [{
+    "Utc": "2025-05-25T13:03:21.9163742Z",
+    "Cars": {"1": {"Channels": {"0": 11000, "2": 290, "3": 8, "4": 100, "5": 0, "45": 12}},
+             "44": {"Channels": {"0": 10500, "2": 281, "3": 7, "4": 98, "5": 0, "45": 8}}},
+}]}
+POSITION = {"Position": [{
+    "Timestamp": "2025-05-25T13:03:21.8790000Z",
+    "Entries": {"1": {"X": -1502, "Y": 2087, "Z": 7}, "44": {"X": 310, "Y": -45, "Z": 8}},
+}]}
+
+def _column(packed, name, fmt):
+    data = packed["columns"][name]["data"]
+    return list(struct.unpack(f"<{len(data) // struct.calcsize(fmt)}{fmt}", data))
+
+def test_pack_columns_packs_little_endian_arrays_and_constants():
+    rows = [dict(row, session_key=9158) for row in car_data_rows(CAR_DATA)]
+    packed = pack_columns(rows, CAR_DATA_COLUMNS)
+    assert packed["count"] == 2
+    assert packed["constants"] == {"session_key": 9158}
+    assert packed["columns"]["speed"]["type"] == "uint16"
+    assert _column(packed, "speed", "H") == [290, 281]
+    assert _column(packed, "driver_number", "H") == [1, 44]
+    assert _column(packed, "date", "d")[0] == wire.iso_to_epoch("2025-05-25T13:03:21.9163742Z")
+
+def test_position_messages_are_packed_too():
+    packed = pack_columns(position_rows(POSITION), LOCATION_COLUMNS)
+    assert packed["columns"]["x"]["type"] == "int32"
+    assert _column(packed, "x", "i") == [-1502, 310]
+    assert _column(packed, "z", "i") == [7, 8]
+    assert pack_columns([], LOCATION_COLUMNS) == {
+        "count": 0, "columns": {name: {"type": wire.TYPE_NAMES[t], "data": b""} for name, t in LOCATION_COLUMNS},
+        "constants": {},
+    }
+
+def test_msgpack_telemetry_messages_are_sent_as_columns(monkeypatch):
+    packed_messages = []
+    monkeypatch.setattr(wire, "msgpack_dumps", lambda data: packed_messages.append(data) or b"")
+    for message_type, data in (("CarData", CAR_DATA), ("Position", POSITION)):
+        WireFormat(ENCODING_MSGPACK).encode({"type": message_type, "data": data})
+    assert [message["data"]["count"] for message in packed_messages] == [2, 2]
+    assert set(packed_messages[1]["data"]["columns"]) == {"date", "driver_number", "x", "y", "z"}
+
+def test_deflate_compresses_each_message_on_its_own():
+    encoded = WireFormat(ENCODING_JSON, deflate=True).encode({"type": "LapCount", "data": {"CurrentLap": 3}})
+    assert json.loads(zlib.decompress(encoded, -zlib.MAX_WBITS)) == {"type": "LapCount", "data": {"CurrentLap": 3}}
+
+def test_websocket_negotiation(monkeypatch):
+    monkeypatch.setattr(wire, "msgpack", object())  # Installed
+    wire_format, subprotocol = negotiate_websocket(
+        {"sec-websocket-protocol": "f1.cbor, f1.msgpack+deflate, f1.json"}, {})
+    assert (wire_format.encoding, wire_format.deflate, subprotocol) == (ENCODING_MSGPACK, True, "f1.msgpack+deflate")
+
+    wire_format, subprotocol = negotiate_websocket({}, {"encoding": "msgpack", "deflate": "1"})
+    assert (wire_format.encoding, wire_format.deflate, subprotocol) == (ENCODING_MSGPACK, True, None)
+
+    # Delta clients can only choose deflate
+    wire_format, subprotocol = negotiate_websocket(
+        {"sec-websocket-protocol": "f1.msgpack, f1.json+deflate"}, {}, encodings=(ENCODING_JSON,))
+    assert (wire_format.encoding, wire_format.deflate, subprotocol) == (ENCODING_JSON, True, "f1.json+deflate")
+
+def test_websocket_negotiation_falls_back_to_json_without_msgpack(monkeypatch):
+    monkeypatch.setattr(wire, "msgpack", None)
+    wire_format, subprotocol = negotiate_websocket({"sec-websocket-protocol": "f1.msgpack"}, {"encoding": "msgpack"})
+    assert (wire_format.encoding, wire_format.deflate, subprotocol) == (ENCODING_JSON, False, None)
+    assert negotiate_accept("application/msgpack") == ENCODING_JSON
+
+def test_accept_negotiation(monkeypatch):
+    monkeypatch.setattr(wire, "msgpack", object())
+    assert negotiate_accept("application/json, application/msgpack") == ENCODING_MSGPACK
+    assert negotiate_accept("application/x-msgpack;q=0.9") == ENCODING_MSGPACK
+    assert negotiate_accept("application/msgpack; q=0") == ENCODING_JSON
+    assert negotiate_accept("*/*") == ENCODING_JSON
+    assert negotiate_accept(None) == ENCODING_JSON